@@ -1,77 +1,336 @@
+from functools import partial
+from typing import Any, Dict, Union
+
 from langgraph.graph import StateGraph, START, END
 
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
 
-from src.agent.nodes.experts import expert_math_agent, expert_code_agent, code_critic_agent, reflection_agent
-from src.agent.nodes.tool_nodes import code_executor_node, code_validator_node, save_model_node, end_execution_on_max_retries
-from src.agent.gates.gates import post_code_validation_gate, post_code_critic_gate, post_code_execution_gate, post_reflection_gate
-from src.agent.tools.tools import code_validator, code_executor, save_model_files
+from src.agent.nodes.experts import (
+    expert_math_agent, expert_code_agent, code_critic_agent, reflection_agent,
+    aexpert_math_agent, aexpert_code_agent, acode_critic_agent, areflection_agent,
+)
+from src.agent.nodes.tool_nodes import code_executor_node, acode_executor_node, code_validator_node, save_model_node, end_execution_on_max_retries, speculative_join_node, solution_verifier_node
+from src.agent.nodes.fanout_nodes import formulation_candidate_node, aformulation_candidate_node, select_candidate_node
+from src.agent.gates.gates import (
+    post_math_gate, post_code_validation_gate, post_code_critic_gate, post_code_execution_gate, post_verification_gate, post_reflection_gate,
+    post_code_validation_speculative_gate, post_speculative_execution_gate,
+    fan_out_formulations, post_candidate_selection_gate,
+)
+from src.agent.gates.retries import RetryBudget
+from src.agent.gates.critic_policy import CriticPolicy
 from src.agent.state import State
+from src.agent.llm.cache import DiskLLMCache
+from src.agent.prompts.budget import PromptBudget
+from src.agent.llm.scheduler import RequestScheduler
+from src.agent.llm.client import LLM_ROLES, ClientSettings, ModelConfig, build_role_llms
+from src.agent.tools.worker_pool import WorkerPool
+from src.agent.tools.execution import ExecutionLimits
+from src.agent.tools.exec_cache import ExecutionCache
+from src.agent.tools.cores import CoreAllocator
 
 
 
-def build_agent(verbose: bool = False, model: str = "o3-mini-2025-01-31", api_key: str = None):
-    # Build the workflow graph
-    llm = ChatOpenAI(model=model, api_key=api_key)
+def _node(func, afunc=None, **deps):
+    """
+    Wrap a node so the graph runs `func` on invoke/batch and `afunc` (when given) on ainvoke/abatch.
+    Keyword dependencies (e.g. the shared llm) are bound to both.
+    """
+    if deps:
+        func = partial(func, **deps)
+        afunc = partial(afunc, **deps) if afunc is not None else None
+    return RunnableLambda(func, afunc=afunc)
+
 
+def _build_workflow(
+    llm_deps,
+    exec_deps: dict,
+    speculative_execution: bool = False,
+    save_results: bool = True,
+    retry_budget: RetryBudget = None,
+    verify_solutions: bool = False,
+    critic_policy: CriticPolicy = None,
+    diff_repair: bool = False,
+) -> StateGraph:
+    """
+    Builds the single-formulation workflow (math -> code -> validation -> critic -> execution -> reflection).
+    With save_results=False an accepted solution ends the run instead of being saved to disk.
+    Every gate routes under `retry_budget`. With verify_solutions, executed solutions are checked
+    against their model first and only those that cannot be verified go to reflection.
+    With a critic_policy, the critic is skipped on code the policy is confident in. With
+    diff_repair, failed scripts are edited with a diff instead of being rewritten.
+    """
+    def gate(func):
+        return partial(func, budget=retry_budget)
+
+    # Build the workflow graph
     workflow = StateGraph(State)
     
     # Add nodes
-    workflow.add_node("expert_math_agent", expert_math_agent)
-    workflow.add_node("expert_code_agent", expert_code_agent)
-    workflow.add_node("code_critic_agent", code_critic_agent)
-    workflow.add_node("reflection_agent", reflection_agent)
-    workflow.add_node("code_exec_tool", code_executor_node)
+    workflow.add_node("expert_math_agent", _node(expert_math_agent, aexpert_math_agent, **llm_deps("math")))
+    workflow.add_node("expert_code_agent", _node(expert_code_agent, aexpert_code_agent, **llm_deps("code"), diff_repair=diff_repair))
+    # With speculative execution the join node records the critic or execution failure
+    record_failures = not speculative_execution
+    workflow.add_node("code_critic_agent", _node(code_critic_agent, acode_critic_agent, **llm_deps("critic"), record_failures=record_failures, critic_policy=critic_policy))
+    workflow.add_node("reflection_agent", _node(reflection_agent, areflection_agent, **llm_deps("reflection"), critic_policy=critic_policy))
+    workflow.add_node("code_exec_tool", _node(code_executor_node, acode_executor_node, **exec_deps, record_failures=record_failures, critic_policy=critic_policy))
     workflow.add_node("code_validation_tool", code_validator_node)
     workflow.add_node("abort_node", end_execution_on_max_retries)
-    workflow.add_node("save_revised_model", save_model_node)
+    if save_results:
+        workflow.add_node("save_revised_model", save_model_node)
+    if verify_solutions:
+        workflow.add_node("solution_verifier", _node(solution_verifier_node, critic_policy=critic_policy))
+    # Successful executions are reviewed by the verifier when enabled, by the reflection agent otherwise
+    review = "solution_verifier" if verify_solutions else "reflection_agent"
+    save = "save_revised_model" if save_results else END
 
     # Add edges to match the diagram
     workflow.add_edge(START, "expert_math_agent")
-    workflow.add_edge("expert_math_agent", "expert_code_agent")
-    workflow.add_edge("expert_code_agent", "code_validation_tool")
     workflow.add_conditional_edges(
-        "code_validation_tool",
-        post_code_validation_gate,
+        "expert_math_agent",
+        gate(post_math_gate),
         {
-            "Critic": "code_critic_agent", # follow happy path
-            "CodeExpert": "expert_code_agent", # correct
-            "Abort": "abort_node", # abort on max retries
-        },
-    )
-    workflow.add_conditional_edges(
-        "code_critic_agent",
-        post_code_critic_gate,
-        {
-            "Execute": "code_exec_tool", # follow happy path
-            "CodeExpert": "expert_code_agent", # correct
-            "Abort": "abort_node", # abort on max retries
-        },
-    )
-    workflow.add_conditional_edges(
-        "code_exec_tool",
-        post_code_execution_gate,
-        {
-            "Math": "expert_math_agent", # Infeasible solution
-            "Reflection": "reflection_agent", # Happy path
-            "CodeExpert": "expert_code_agent", # Correct execution errors
-            "Abort": "abort_node", # abort on max retries
+            "CodeExpert": "expert_code_agent", # follow happy path
+            "Abort": "abort_node", # abort when the LLM budget is spent
         },
     )
+    workflow.add_edge("expert_code_agent", "code_validation_tool")
+    if speculative_execution:
+        # Critic and execution run in the same step; the join routes once both have finished
+        workflow.add_node("speculative_join", speculative_join_node)
+        workflow.add_conditional_edges(
+            "code_validation_tool",
+            gate(post_code_validation_speculative_gate),
+            {
+                "Critic": "code_critic_agent", # happy path (together with Execute)
+                "Execute": "code_exec_tool", # happy path (together with Critic)
+                "CodeExpert": "expert_code_agent", # correct
+                "Abort": "abort_node", # abort on max retries
+            },
+        )
+        workflow.add_edge(["code_critic_agent", "code_exec_tool"], "speculative_join")
+        workflow.add_conditional_edges(
+            "speculative_join",
+            gate(post_speculative_execution_gate),
+            {
+                "Math": "expert_math_agent", # Infeasible solution
+                "Reflection": review, # Happy path
+                "CodeExpert": "expert_code_agent", # Critic rejection or execution errors
+                "Abort": "abort_node", # abort on max retries
+            },
+        )
+    else:
+        workflow.add_conditional_edges(
+            "code_validation_tool",
+            gate(post_code_validation_gate),
+            {
+                "Critic": "code_critic_agent", # follow happy path
+                "CodeExpert": "expert_code_agent", # correct
+                "Abort": "abort_node", # abort on max retries
+            },
+        )
+        workflow.add_conditional_edges(
+            "code_critic_agent",
+            gate(post_code_critic_gate),
+            {
+                "Execute": "code_exec_tool", # follow happy path
+                "CodeExpert": "expert_code_agent", # correct
+                "Abort": "abort_node", # abort on max retries
+            },
+        )
+        workflow.add_conditional_edges(
+            "code_exec_tool",
+            gate(post_code_execution_gate),
+            {
+                "Math": "expert_math_agent", # Infeasible solution
+                "Reflection": review, # Happy path
+                "CodeExpert": "expert_code_agent", # Correct execution errors
+                "Abort": "abort_node", # abort on max retries
+            },
+        )
+    if verify_solutions:
+        workflow.add_conditional_edges(
+            "solution_verifier",
+            gate(post_verification_gate),
+            {
+                "SaveResults": save, # Verified solution, no reflection call
+                "Reflection": "reflection_agent", # Could not be verified
+                "Abort": "abort_node", # abort when the LLM budget is spent
+            },
+        )
     workflow.add_conditional_edges(
         "reflection_agent",
-        post_reflection_gate,
+        gate(post_reflection_gate),
         {
             "Math": "expert_math_agent", # Non coherent solution
-            "SaveResults": "save_revised_model", # Happy path
+            "SaveResults": save, # Happy path
             "Abort": "abort_node", # abort on max retries
         },
     )
     workflow.add_edge("abort_node", END)
-    workflow.add_edge("save_revised_model", END)
+    if save_results:
+        workflow.add_edge("save_revised_model", END)
+    return workflow
+
+
+def build_agent(
+    verbose: bool = False,
+    model: str = "o3-mini-2025-01-31",
+    api_key: str = None,
+    llm_cache: DiskLLMCache = None,
+    max_concurrency: int = None,
+    client_settings: ClientSettings = None,
+    llm: BaseChatModel = None,
+    models: Dict[str, Union[str, Dict[str, Any], ModelConfig, BaseChatModel]] = None,
+    prompt_budgets: Dict[str, PromptBudget] = None,
+    scheduler: RequestScheduler = None,
+    speculative_execution: bool = False,
+    fanout: int = 1,
+    executor_pool: WorkerPool = None,
+    execution_limits: ExecutionLimits = None,
+    execution_cache: ExecutionCache = None,
+    parallel_variants: bool = False,
+    core_allocator: CoreAllocator = None,
+    retry_budget: RetryBudget = None,
+    verify_solutions: bool = False,
+    critic_policy: CriticPolicy = None,
+    diff_repair: bool = False,
+):
+    """
+    Builds and compiles the R.O.R.A agent graph.
+
+    Expert nodes get their chat model from `models`, a per-role map ("math", "code", "critic",
+    "reflection") of model names, ModelConfig/dicts (model, reasoning_effort, max_tokens) or chat
+    model instances, e.g. to send the pass/fail critic and reflection checks to a cheaper model:
+
+        build_agent(api_key=key, models={"critic": {"model": "o3-mini-2025-01-31", "reasoning_effort": "low"}})
+
+    Roles not in `models` use `llm` when given, otherwise a ChatOpenAI client for `model`. Clients
+    are backed by a process-wide HTTP connection pool configured by `client_settings` (max
+    connections, keep-alive, per-call timeout), so concurrent agents reuse TLS connections.
+
+    `prompt_budgets` maps the same roles to a PromptBudget: the token ceiling of that node's prompt
+    and how each placeholder (problem statement, formulation, code, ...) may be shortened to meet it.
+
+    `scheduler` is a RequestScheduler shared by all agents of the process; it paces every expert call
+    to the per-model RPM/TPM limits and retries 429s. The clients' own retries are disabled when it is
+    set (unless `client_settings` is given explicitly) so rate-limit retries happen in one place.
+
+    With `speculative_execution`, validated code is executed while the critic reviews it, and both
+    results are combined once they are in, taking one critic round-trip off every iteration.
+
+    With `fanout` > 1, that many formulations are generated concurrently, each one taken through
+    code, validation, execution and reflection (with its own retries) in a parallel branch. Among
+    the candidates the reflection accepted, the one whose objective value most candidates agree
+    on is saved. This spends extra tokens to cut the wall-clock time to a correct answer.
+
+    `executor_pool` is a WorkerPool of warm interpreters with OR-Tools and PuLP already imported;
+    when given, generated code runs in a child forked from one of its workers instead of a fresh
+    `python` process, which removes the interpreter start and solver imports from every attempt.
+
+    `execution_limits` sets the wall-clock timeout, memory (RLIMIT_AS, off by default, counted above
+    the address space a worker's child already maps) and CPU (RLIMIT_CPU) limits and the output cap of every execution (only the head and tail of longer output reach the state
+    and prompts); a script that exceeds them, writes more than kill_output_bytes or prints a line
+    matching one of kill_patterns is stopped and reported as an execution error. Each execution's wall/CPU time and peak RSS are kept in state["execution_metrics"].
+    With `ExecutionLimits(timeout_policy=TimeoutPolicy())` the fixed timeout is replaced by one
+    sized per solve from the model's variable and constraint counts; a solver that runs out of its
+    budget (or stops improving) returns its incumbent, reported as "feasible", instead of being killed.
+
+    `execution_cache` is an ExecutionCache: a script whose AST (without comments, docstrings or
+    formatting) was already run with the same solver versions and limits returns the stored result
+    instead of running again; `execution_cache.stats()` reports how many solver runs were skipped.
+
+    With `parallel_variants`, a script that implements several formulation variants as separate
+    functions called by main() has each variant run concurrently in its own process with the full
+    timeout, then main() with their results; every variant's status and objective is reported.
+
+    `core_allocator` is a CoreAllocator shared by all agents of the process: each execution gets a
+    fair share of the cores and its solvers (CP-SAT workers, linear_solver threads, CBC threads)
+    are capped to it, so concurrent executions, fan-out branches and variants do not oversubscribe
+    the machine (an execution waits when every core is taken). Set its expected_concurrency to the
+    number of executions usually running at once so early ones do not take every core.
+
+    `retry_budget` is a RetryBudget: how many failures of each type (validation error, critic
+    rejection, execution error, infeasible solution, incoherent reflection) and in total are
+    retried, and the cap on LLM calls and tokens after which the run aborts, so the worst-case cost
+    of a problem is bounded. The default only allows 4 retries in total, as before. Failures are recorded by the nodes in state["failure_counts"]. With
+    `fanout` > 1 the budget applies to each formulation branch.
+
+    With `verify_solutions`, a successful execution is first checked without an LLM: the solver
+    harness exports each solved model (constraint rows, bounds, objective) and right after the
+    execution every constraint, bound and integrality requirement is re-evaluated at the solution
+    with numpy; only that report is kept with the solve, not the model. A solution that
+    satisfies them all, whose objective matches the recomputed one and the printed one, is saved
+    without the reflection call; the others (violations, unsupported constraints, models too large
+    to export) are reviewed by the reflection agent as before. The check is kept in state["verification"].
+
+    `critic_policy` is a CriticPolicy shared by all agents of the process: it scores each validated
+    script from its static-analysis warnings, the failures earlier in the run and its similarity to
+    scripts whose solutions were accepted (by reflection or the verifier) for the same problem
+    statement, and skips the critic call when the score reaches its threshold (low-confidence
+    code, and the first run of a problem, are always reviewed). `critic_policy.stats()` reports the
+    skip rate and the execution failure rate of skipped and reviewed code, to tune the threshold.
+
+    With `diff_repair`, a script that failed execution or was rejected by the critic is repaired
+    instead of rewritten: the code expert gets the failing script, its traceback (library frames
+    removed) and the critic review, answers with a unified diff, and the patched script is
+    validated again. A diff that does not apply falls back to a full rewrite in the same step.
+
+    Every node has an async implementation, so many problems can share one event loop:
+    `await agent.abatch(initial_states, return_exceptions=True)` runs them concurrently,
+    at most `max_concurrency` at a time (no limit when None).
+    """
+    if scheduler is not None and client_settings is None:
+        client_settings = ClientSettings(max_retries=0)
+
+    # Chat model per expert role, optionally behind the persistent response cache
+    llms = build_role_llms(
+        model,
+        models={**({role: llm for role in LLM_ROLES} if llm is not None else {}), **(models or {})},
+        api_key=api_key,
+        settings=client_settings,
+        cache=llm_cache,
+    )
+    budgets = prompt_budgets or {}
+
+    def llm_deps(role: str):
+        return {"llm": llms[role], "budget": budgets.get(role), "scheduler": scheduler}
+
+    exec_deps = {"pool": executor_pool, "limits": execution_limits, "cache": execution_cache, "parallel_variants": parallel_variants, "cores": core_allocator}
+
+    if fanout > 1:
+        # Best-of-N: N independent formulation pipelines run in parallel, then the best candidate is saved
+        candidate_agent = _build_workflow(
+            llm_deps, exec_deps, speculative_execution, save_results=False, retry_budget=retry_budget, verify_solutions=verify_solutions,
+            critic_policy=critic_policy, diff_repair=diff_repair,
+        ).compile()
+        workflow = StateGraph(State)
+        workflow.add_node("formulation_candidate", _node(formulation_candidate_node, aformulation_candidate_node, agent=candidate_agent))
+        workflow.add_node("select_candidate", select_candidate_node)
+        workflow.add_node("abort_node", end_execution_on_max_retries)
+        workflow.add_node("save_revised_model", save_model_node)
+        workflow.add_conditional_edges(START, partial(fan_out_formulations, n=fanout), ["formulation_candidate"])
+        workflow.add_edge("formulation_candidate", "select_candidate")
+        workflow.add_conditional_edges(
+            "select_candidate",
+            post_candidate_selection_gate,
+            {
+                "SaveResults": "save_revised_model", # a candidate was accepted
+                "Abort": "abort_node", # no candidate reached a coherent solution
+            },
+        )
+        workflow.add_edge("abort_node", END)
+        workflow.add_edge("save_revised_model", END)
+    else:
+        workflow = _build_workflow(
+            llm_deps, exec_deps, speculative_execution, retry_budget=retry_budget, verify_solutions=verify_solutions, critic_policy=critic_policy,
+            diff_repair=diff_repair,
+        )
 
     # Compile the workflow
     agent = workflow.compile()
+    if max_concurrency is not None:
+        agent = agent.with_config(max_concurrency=max_concurrency)
     # Show the workflow graph
     if verbose:
         display(Image(agent_v1.get_graph(xray=True).draw_mermaid_png()))
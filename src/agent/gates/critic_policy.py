@@ -0,0 +1,223 @@
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Optional
+
+import xxhash
+
+from src.agent.state import State
+from src.agent.tools.exec_cache import normalize_code
+from src.agent.tools.tools import code_artifact
+
+# Tokens of the normalized AST, with numeric constants collapsed so scripts that only differ in data match
+_TOKEN = re.compile(r"[A-Za-z_]\w*|[-+]?\d+\.?\d*(?:[eE][-+]?\d+)?|\S")
+_NUMBER = re.compile(r"[-+]?\d")
+SHINGLE_SIZE = 6
+# Decisions and outcomes waiting for their counterpart (an execution never comes after a critic rejection)
+MAX_PENDING = 1024
+# Problems whose accepted scripts are kept as similarity references
+MAX_PROBLEMS = 1024
+
+
+def _shingles(source: str) -> frozenset:
+    normalized = normalize_code(source)
+    if normalized is None:
+        return frozenset()
+    tokens = ["0" if _NUMBER.match(token) else token for token in _TOKEN.findall(normalized)]
+    return frozenset(hash(tuple(tokens[i:i + SHINGLE_SIZE])) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1)))
+
+
+def _artifact(state: State) -> dict:
+    # States created outside expert_code_agent may only carry the raw code_result
+    return state.get("code_artifact") or code_artifact(state["code_result"])
+
+
+def _problem(state: State) -> str:
+    """References are scoped to the problem statement, which stays the same across runs (the formulation is regenerated by each run)."""
+    return xxhash.xxh3_64_hexdigest((state.get("problem_statement") or "").encode("utf-8"))
+
+
+def _warnings(validation_result: str) -> int:
+    """Number of static-analysis findings listed in a WARNING validation result."""
+    if not validation_result.startswith("WARNING"):
+        return 0
+    return sum(1 for line in validation_result.splitlines() if line.startswith("- "))
+
+
+class CriticPolicy:
+    """
+    Decides whether validated code needs the code critic, from a confidence score in [0, 1]:
+
+        static_weight     * (1 - warning_penalty per static-analysis warning)
+      + history_weight    * (1 - failure_penalty per code critic rejection, execution error or
+                             infeasible solution earlier in the run)
+      + similarity_weight * Jaccard similarity of the normalized AST to the closest script
+                             accepted before for the same problem (1 for the same script)
+
+    The critic is skipped, and the code accepted without an LLM call, when the score reaches
+    `threshold` and the code has at most `max_warnings` warnings; low-confidence code, and code
+    the critic already rejected, is always reviewed.
+
+    A script becomes a reference only once its solution is accepted (coherent reflection or a
+    verified solution, see record_acceptance), and only for the problem statement it solves, so
+    code for another problem is always reviewed. An accepted solution ends its run, so the critic
+    is skipped on later runs of a problem the policy saw solved (benchmark sweeps, repeated
+    requests, the other fan-out branches), never on the first script written for it: without a
+    reference the score is at most static_weight + history_weight.
+
+    Every decision is paired with the outcome of the execution that follows, so stats() reports
+    the skip rate and the execution failure rate of skipped and of reviewed code, overall and per
+    confidence band, to tune the threshold. Share one policy between the agents of a process.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        max_warnings: int = 0,
+        static_weight: float = 0.4,
+        history_weight: float = 0.2,
+        similarity_weight: float = 0.4,
+        warning_penalty: float = 0.25,
+        failure_penalty: float = 0.5,
+        max_accepted: int = 32,
+    ):
+        self.threshold = threshold
+        self.max_warnings = max_warnings
+        self.static_weight = static_weight
+        self.history_weight = history_weight
+        self.similarity_weight = similarity_weight
+        self.warning_penalty = warning_penalty
+        self.failure_penalty = failure_penalty
+        self.decisions = 0
+        self.skipped = 0
+        self.rejected = 0  # reviewed code the critic sent back
+        self.max_accepted = max_accepted  # per problem
+        self._accepted = OrderedDict()  # problem key -> deque of (ast_hash, shingles) of accepted scripts
+        self._rejected = OrderedDict()  # ast_hash of scripts the critic rejected, never skipped nor used as references
+        self._decisions = OrderedDict()  # ast_hash -> decisions waiting for their execution
+        self._outcomes = OrderedDict()  # ast_hash -> execution failures waiting for their decision
+        self._bands = {}  # confidence band -> counters
+        self._totals = {"skipped": [0, 0], "reviewed": [0, 0]}  # [executions, failures]
+        self._lock = threading.Lock()
+
+    def score(self, state: State) -> dict:
+        """Confidence in the state's code and its three components."""
+        artifact = _artifact(state)
+        warnings = _warnings(state.get("validation_result", ""))
+        counts = state.get("failure_counts") or {}
+        failures = sum(counts.get(failure, 0) for failure in ("code_critic", "execution_error", "infeasible_solution"))
+        static = max(0.0, 1 - self.warning_penalty * warnings)
+        history = max(0.0, 1 - self.failure_penalty * failures)
+
+        similarity = 0.0
+        with self._lock:
+            accepted = list(self._accepted.get(_problem(state), ()))
+        if any(ast_hash == artifact["ast_hash"] for ast_hash, _ in accepted):
+            similarity = 1.0
+        elif accepted:
+            shingles = _shingles(artifact["source"])
+            if shingles:
+                similarity = max(len(shingles & other) / len(shingles | other) for _, other in accepted)
+
+        confidence = self.static_weight * static + self.history_weight * history + self.similarity_weight * similarity
+        return {"confidence": confidence, "static": static, "history": history, "similarity": similarity, "warnings": warnings}
+
+    def decide(self, state: State) -> dict:
+        """Scores the state's code and records whether the critic is skipped ("skip") for it."""
+        score = self.score(state)
+        ast_hash = _artifact(state)["ast_hash"]
+        with self._lock:
+            skip = score["confidence"] >= self.threshold and score["warnings"] <= self.max_warnings and ast_hash not in self._rejected
+            decision = {**score, "skip": skip, "ast_hash": ast_hash, "problem": _problem(state)}
+            self.decisions += 1
+            self.skipped += skip
+            band = self._band(decision)
+            band["decisions"] += 1
+            band["skipped"] += skip
+            self._pend(self._decisions, ast_hash, decision)
+            self._settle(ast_hash)
+        return decision
+
+    def record_review(self, decision: dict, approved: bool):
+        """Records the critic's verdict on code it reviewed after `decision`."""
+        with self._lock:
+            if approved:
+                self._rejected.pop(decision["ast_hash"], None)
+                return
+            self.rejected += 1
+            self._band(decision)["rejected"] += 1
+            self._rejected[decision["ast_hash"]] = True
+            while len(self._rejected) > MAX_PENDING:
+                self._rejected.popitem(last=False)
+            references = self._accepted.get(decision["problem"])
+            if references is not None:
+                accepted = [entry for entry in references if entry[0] != decision["ast_hash"]]
+                references.clear()
+                references.extend(accepted)
+
+    def record_execution(self, state: State, failure: Optional[str]):
+        """Records the outcome of executing the state's code, paired with the decision taken on it."""
+        ast_hash = _artifact(state)["ast_hash"]
+        with self._lock:
+            self._pend(self._outcomes, ast_hash, failure)
+            self._settle(ast_hash)
+
+    def record_acceptance(self, state: State):
+        """Makes the state's code, whose solution was accepted, a reference for later code of the same problem."""
+        artifact = _artifact(state)
+        shingles = _shingles(artifact["source"])
+        key = _problem(state)
+        with self._lock:
+            if artifact["ast_hash"] in self._rejected:
+                return
+            references = self._accepted.setdefault(key, deque(maxlen=self.max_accepted))
+            self._accepted.move_to_end(key)
+            while len(self._accepted) > MAX_PROBLEMS:
+                self._accepted.popitem(last=False)
+            if all(ast_hash != artifact["ast_hash"] for ast_hash, _ in references):
+                references.append((artifact["ast_hash"], shingles))
+
+    def _band(self, decision: dict) -> dict:
+        """Counters of the 0.1-wide confidence band of a decision."""
+        band = f"{min(int(decision['confidence'] * 10), 9) / 10:.1f}"
+        return self._bands.setdefault(band, {"decisions": 0, "skipped": 0, "rejected": 0, "executions": 0, "failures": 0})
+
+    @staticmethod
+    def _pend(pending: OrderedDict, key, value):
+        # Fan-out branches may run the same script, so each key holds a FIFO of entries
+        pending.setdefault(key, deque()).append(value)
+        pending.move_to_end(key)
+        while len(pending) > MAX_PENDING:
+            pending.popitem(last=False)
+
+    def _settle(self, ast_hash):
+        """Pairs a decision with its execution outcome once both are in (with speculative execution they may come in either order)."""
+        if not self._decisions.get(ast_hash) or not self._outcomes.get(ast_hash):
+            return
+        decision = self._decisions[ast_hash].popleft()
+        failed = self._outcomes[ast_hash].popleft() is not None
+        for pending in (self._decisions, self._outcomes):
+            if not pending[ast_hash]:
+                del pending[ast_hash]
+        band = self._band(decision)
+        band["executions"] += 1
+        band["failures"] += failed
+        totals = self._totals["skipped" if decision["skip"] else "reviewed"]
+        totals[0] += 1
+        totals[1] += failed
+
+    def stats(self) -> dict:
+        with self._lock:
+            (skipped_runs, skipped_failures), (reviewed_runs, reviewed_failures) = self._totals["skipped"], self._totals["reviewed"]
+            return {
+                "decisions": self.decisions,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / self.decisions if self.decisions else 0.0,
+                "rejected": self.rejected,
+                "skipped_executions": skipped_runs,
+                "skipped_failure_rate": skipped_failures / skipped_runs if skipped_runs else 0.0,
+                "reviewed_executions": reviewed_runs,
+                "reviewed_failure_rate": reviewed_failures / reviewed_runs if reviewed_runs else 0.0,
+                "accepted_scripts": sum(len(references) for references in self._accepted.values()),
+                "by_confidence": {band: dict(counters) for band, counters in sorted(self._bands.items())},
+            }
@@ -1,68 +1,67 @@
+from langgraph.types import Send
+
 from src.agent.state import State
+from src.agent.gates.retries import (
+    DEFAULT_RETRY_BUDGET, RetryBudget,
+    critic_failure, execution_failure, reflection_failure, should_retry, validation_failure, within_llm_budget,
+)
 
 
-# aux functions
-def update_retry_count(state: State):
-    retries = state.get("global_retries", 0)
-    state["global_retries"] = retries + 1
+# Gates only read the state: the failure of each step is recorded by the node that produced it (see
+# retries.record_failure), since writes made by a conditional-edge router are not kept by LangGraph.
+def _retry(state: State, failure: str, route: str, budget: RetryBudget = None):
+    return route if should_retry(state, failure, budget or DEFAULT_RETRY_BUDGET) else "Abort"
 
-def should_retry(state: State):
-    MAX_GLOBAL_RETRIES = 5
-    retries = state.get("global_retries", 0)
-    if retries + 1 >= MAX_GLOBAL_RETRIES:
-        return False
-    else:
-        return True
+def _proceed(state: State, route: str, budget: RetryBudget = None):
+    """Routes to an LLM step unless the run has used up its LLM call or token budget."""
+    return route if within_llm_budget(state, budget or DEFAULT_RETRY_BUDGET) else "Abort"
     
 # gates
-def post_code_validation_gate(state: State):
+def post_math_gate(state: State, budget: RetryBudget = None):
+    """Starts the code expert, or aborts when the LLM budget is spent."""
+    return _proceed(state, "CodeExpert", budget)
+
+def post_code_validation_gate(state: State, budget: RetryBudget = None):
     """
     Determines the next step in the pipeline based on the result of code validation.
 
     Args:
         state (State): The current state object containing the validation result.
+        budget (RetryBudget): Retry and LLM usage limits of the run.
 
     Returns:
         str: The name of the next node in the pipeline. Returns "Critic" if the validation result starts with "VALID" or "WARNING",
              otherwise returns "CodeExpert" for further correction.
     """
-    if state["validation_result"].startswith("VALID") or state["validation_result"].startswith("WARNING"):
-        return "Critic"
-    else:
-        if should_retry(state=state):
-            update_retry_count(state=state)
-            state["last_failure_reason"] = "validation_error"
-            return "CodeExpert" # this a retry in code expert
-        else:
-            return "Abort"
-
-def post_code_critic_gate(state: State):
+    failure = validation_failure(state)
+    if failure is None:
+        return _proceed(state, "Critic", budget)
+    return _retry(state, failure, "CodeExpert", budget) # this a retry in code expert
+
+def post_code_critic_gate(state: State, budget: RetryBudget = None):
     """
     Determines the next step in the pipeline based on the result of the code critic's feedback.
 
     Args:
         state (State): The current state object containing the critic's result.
+        budget (RetryBudget): Retry and LLM usage limits of the run.
 
     Returns:
         str: The name of the next node in the pipeline. Returns "Execute" if the critic's result contains "OK",
              otherwise returns "CodeExpert" for further correction.
     """
-    if "OK" in state["code_feedback"]:
+    failure = critic_failure(state)
+    if failure is None:
         return "Execute"
-    else:
-        state["last_failure_reason"] = "code_critic"
-        if should_retry(state=state):
-            update_retry_count(state=state)
-            return "CodeExpert" # this a retry in code expert
-        else:
-            return "Abort"
-
-def post_code_execution_gate(state: State):
+    return _retry(state, failure, "CodeExpert", budget) # this a retry in code expert
+
+def post_code_execution_gate(state: State, budget: RetryBudget = None):
     """
     Determines the next step in the pipeline based on the result of code execution.
 
     Args:
         state (State): The current state object containing the execution result and error status.
+        budget (RetryBudget): Retry and LLM usage limits of the run.
 
     Returns:
         str: The name of the next node in the pipeline.
@@ -70,60 +69,60 @@ def post_code_execution_gate(state: State):
             - Returns "Math" if execution was successful but no optimal solution was found.
             - Returns "CodeExpert" if there was an execution error.
     """
-    execution_result = state["execution_result"]
-
-    # validate run execution and that optimal solution was found
-    has_optimal_solution = True
-    if state["execution_error"] == False:
-        # Check for indicators of no optimal solution
-        output_lower = execution_result.lower()
-        no_solution_indicators = [
-            "no solution",
-            "no optimal solution", 
-            "infeasible",
-            "unbounded",
-            "model is infeasible",
-            "no feasible solution",
-            "solution not found",
-            "optimal solution not found",
-            "the problem does not have an optimal solution.",
-            "did not find an optimal solution"
-        ]
-        
-        for indicator in no_solution_indicators:
-            if indicator in output_lower:
-                has_optimal_solution = False
-                break
-            # If theres an optimal solution found, send that to the reflect agent
-        if has_optimal_solution:
-            # Solution found and valid, sending to reflection agent
-            return "Reflection"
-        else:
-            # Infeasible solution, sending back to math formulator. This is a retry!
-            state["last_failure_reason"] = "infeasible_solution"
-            if should_retry(state=state):
-                update_retry_count(state=state)
-                return "Math"
-            else:
-                return "Abort"    
-    else:
-        # Execution error! (retry)
-        state["last_failure_reason"] = "execution_error"
-        if should_retry(state=state):
-            update_retry_count(state=state)
-            return "CodeExpert"
-        else:
-            return "Abort"  
+    failure = execution_failure(state)
+    if failure is None:
+        # Solution found and valid, sending to reflection agent
+        return _proceed(state, "Reflection", budget)
+    if failure == "infeasible_solution":
+        # Infeasible solution, sending back to math formulator. This is a retry!
+        return _retry(state, failure, "Math", budget)
+    # Execution error! (retry)
+    return _retry(state, failure, "CodeExpert", budget)
         
-def post_reflection_gate(state: State):
-    if state["coherent"]:
+def post_verification_gate(state: State, budget: RetryBudget = None):
+    """Saves a solution that satisfies every constraint of its model; otherwise the reflection agent reviews it."""
+    if state["verification"]["verified"]:
+        return "SaveResults"
+    return _proceed(state, "Reflection", budget)
+
+def post_reflection_gate(state: State, budget: RetryBudget = None):
+    failure = reflection_failure(state)
+    if failure is None:
         # everything ok! communicate and save
         return "SaveResults"
-    else:
-        state["last_failure_reason"] = "reflection_noncoherent"
-        # back to math expert to reformulate the entire problem.
-        if should_retry(state=state):
-            update_retry_count(state=state)
-            return "Math"
-        else:
-            return "Abort"    
\ No newline at end of file
+    # back to math expert to reformulate the entire problem.
+    return _retry(state, failure, "Math", budget)
+
+# speculative execution gates
+def post_code_validation_speculative_gate(state: State, budget: RetryBudget = None):
+    """
+    Variant of post_code_validation_gate for speculative execution: on the happy path the code
+    critic and the code execution are started together instead of one after the other.
+    """
+    route = post_code_validation_gate(state, budget)
+    if route == "Critic":
+        return ["Critic", "Execute"]
+    return route
+
+def post_speculative_execution_gate(state: State, budget: RetryBudget = None):
+    """
+    Joins the critic review and the speculative execution. A critic rejection sends the code back to
+    the code expert (the execution result is discarded); otherwise the execution result is routed as
+    in post_code_execution_gate.
+    """
+    critic_route = post_code_critic_gate(state, budget)
+    if critic_route != "Execute":
+        return critic_route
+    return post_code_execution_gate(state, budget)
+
+
+# best-of-N fan-out gates
+def fan_out_formulations(state: State, n: int):
+    """Starts `n` independent formulation branches, each one with its own candidate_id."""
+    return [Send("formulation_candidate", {**state, "candidate_id": i}) for i in range(n)]
+
+def post_candidate_selection_gate(state: State):
+    """Saves the selected candidate, or aborts when no branch reached a coherent solution."""
+    if state.get("candidate_id") is not None and state["coherent"]:
+        return "SaveResults"
+    return "Abort"
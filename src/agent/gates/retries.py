@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from src.agent.state import State
+from src.agent.tools.execution import best_solve
+
+# Failure types recorded in state["last_failure_reason"] and counted in state["failure_counts"]
+FAILURE_TYPES = ("validation_error", "code_critic", "execution_error", "infeasible_solution", "reflection_noncoherent")
+
+# Printed output that means the solver found no solution, checked when no solver call was intercepted
+NO_SOLUTION_INDICATORS = [
+    "no solution",
+    "no optimal solution",
+    "infeasible",
+    "unbounded",
+    "model is infeasible",
+    "no feasible solution",
+    "solution not found",
+    "optimal solution not found",
+    "the problem does not have an optimal solution.",
+    "did not find an optimal solution",
+]
+
+
+@dataclass(frozen=True)
+class RetryBudget:
+    """
+    Bounds the cost of one run: how many failures may be retried, in total and per failure type
+    (FAILURE_TYPES), and how many LLM calls and tokens it may spend. A failure past its budget, or
+    any LLM step once the call or token cap is reached, aborts the run. Tokens are only known after
+    a call, so a run ends at most one call past max_tokens.
+
+    The defaults keep the original behavior: up to 4 retries over all failure types and no other
+    cap. For example RetryBudget(max_retries_per_failure={"infeasible_solution": 2}, max_llm_calls=24)
+    stops reformulating early and bounds the cost of a problem.
+    """
+    max_retries: int = 4  # over all failure types
+    max_retries_per_failure: Dict[str, int] = field(default_factory=dict)  # failure type -> retries, unlisted types are only bounded by max_retries
+    max_llm_calls: Optional[int] = None  # None for no cap
+    max_tokens: Optional[int] = None  # input + output tokens of all calls, None for no cap
+
+
+DEFAULT_RETRY_BUDGET = RetryBudget()
+
+
+# failure classification, shared by the nodes that record a failure and the gates that route on it
+def validation_failure(state: State) -> Optional[str]:
+    result = state["validation_result"]
+    return None if result.startswith("VALID") or result.startswith("WARNING") else "validation_error"
+
+def critic_failure(state: State) -> Optional[str]:
+    return None if "OK" in state["code_feedback"] else "code_critic"
+
+def execution_failure(state: State) -> Optional[str]:
+    """
+    "execution_error" for a failed run, "infeasible_solution" when no solution was found. Feasibility
+    comes from the solver statuses reported by the execution harness; the printed output is only
+    scanned when no solver call was intercepted (e.g. an unsupported library).
+    """
+    if state["execution_error"]:
+        return "execution_error"
+    solver_results = state.get("solver_results") or []
+    if solver_results:
+        found = best_solve(solver_results) is not None
+    else:
+        output_lower = state["execution_result"].lower()
+        found = not any(indicator in output_lower for indicator in NO_SOLUTION_INDICATORS)
+    return None if found else "infeasible_solution"
+
+def reflection_failure(state: State) -> Optional[str]:
+    return None if state["coherent"] else "reflection_noncoherent"
+
+
+def failure_update(failure: Optional[str]) -> dict:
+    """State update recording one failure; global_retries and failure_counts are summed by their reducers."""
+    if failure is None:
+        return {}
+    return {"last_failure_reason": failure, "global_retries": 1, "failure_counts": {failure: 1}}
+
+def record_failure(state: State, update: dict, classify) -> dict:
+    """Adds the failure that `classify` finds in the state after `update` to the update."""
+    return {**update, **failure_update(classify({**state, **update}))}
+
+
+def llm_usage(state: State):
+    """Number of LLM calls and input + output tokens spent so far."""
+    calls = state.get("llm_calls") or []
+    return len(calls), sum(call.get("input_tokens", 0) + call.get("output_tokens", 0) for call in calls)
+
+def within_llm_budget(state: State, budget: RetryBudget) -> bool:
+    calls, tokens = llm_usage(state)
+    if budget.max_llm_calls is not None and calls >= budget.max_llm_calls:
+        return False
+    return budget.max_tokens is None or tokens < budget.max_tokens
+
+def should_retry(state: State, failure: str, budget: RetryBudget) -> bool:
+    """Whether the failure just recorded in the state may be retried (the counts include it)."""
+    if state.get("global_retries", 0) > budget.max_retries:
+        return False
+    limit = budget.max_retries_per_failure.get(failure)
+    if limit is not None and (state.get("failure_counts") or {}).get(failure, 0) > limit:
+        return False
+    return within_llm_budget(state, budget)
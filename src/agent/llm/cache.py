@@ -0,0 +1,120 @@
+import json
+import warnings
+from typing import Any, Dict, Optional, Sequence
+
+import xxhash
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from src.agent.lru_store import LRUStore
+
+
+CACHE_MODES = ("read_through", "record_only", "replay_only")
+# response_metadata flag of messages served from the cache, so callers can tell they cost no provider call
+CACHE_HIT = "llm_cache_hit"
+
+# Constructor kwargs that only affect how a request is sent, never what the model answers.
+_TRANSPORT_KWARGS = {
+    "openai_api_key",
+    "openai_api_base",
+    "openai_organization",
+    "openai_proxy",
+    "request_timeout",
+    "max_retries",
+    "http_client",
+    "http_async_client",
+    "default_headers",
+    "default_query",
+}
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay_only mode when a prompt was never recorded."""
+
+
+def _model_key(llm_string: str) -> str:
+    """Reduce LangChain's llm_string to the model name and generation settings."""
+    serialized, sep, call_params = llm_string.partition("---")
+    try:
+        data = json.loads(serialized)
+    except ValueError:
+        return llm_string
+    kwargs = {k: v for k, v in data.get("kwargs", {}).items() if k not in _TRANSPORT_KWARGS}
+    return json.dumps({"name": data.get("name"), "kwargs": kwargs}, sort_keys=True) + sep + call_params
+
+
+class DiskLLMCache(BaseCache):
+    """
+    Persistent, content-addressed cache for chat model responses.
+
+    Entries are keyed by an xxhash of the model settings plus the rendered prompt and stored
+    in a single SQLite file (an LRUStore). When the stored payload exceeds max_bytes the least
+    recently used entries are evicted.
+
+    Modes:
+        read_through: return cached responses, call the model and store on a miss.
+        record_only: always call the model and (over)write the stored response.
+        replay_only: only return cached responses, raise LLMCacheMiss on a miss.
+    """
+
+    def __init__(self, path: str = ".rora_cache/llm_cache.sqlite", max_bytes: int = 512 * 1024 * 1024, mode: str = "read_through"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._store = LRUStore(path, "llm_cache", max_bytes)
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        h = xxhash.xxh3_128()
+        h.update(_model_key(llm_string).encode("utf-8"))
+        h.update(b"\x00")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if self.mode == "record_only":
+            self.misses += 1
+            return None
+
+        key = self._key(prompt, llm_string)
+        value = self._store.get(key)
+        if value is None:
+            self.misses += 1
+            if self.mode == "replay_only":
+                raise LLMCacheMiss(f"No recorded response for prompt (key {key}) in {self.path}")
+            return None
+
+        self.hits += 1
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            generations = [loads(g) for g in json.loads(value)]
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is not None:
+                message.response_metadata[CACHE_HIT] = True
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if self.mode == "replay_only":
+            return
+
+        self._store.put(self._key(prompt, llm_string), json.dumps([dumps(g) for g in return_val]))
+
+    def clear(self, **kwargs: Any) -> None:
+        self._store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current on-disk footprint."""
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            **self._store.stats(),
+        }
@@ -0,0 +1,127 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Tuple, Union
+
+import httpx
+from langchain_core.caches import BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+
+@dataclass(frozen=True)
+class ClientSettings:
+    """HTTP connection pool and timeout settings shared by every LLM call of an agent."""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0  # seconds an idle connection is kept open
+    timeout: float = 120.0  # per-call timeout in seconds
+    max_retries: int = 2
+
+
+@dataclass(frozen=True)
+class ModelConfig:
+    """Chat model used for one agent role."""
+    model: str
+    reasoning_effort: str = None  # "low" | "medium" | "high", reasoning models only
+    max_tokens: int = None  # cap on completion tokens (includes reasoning tokens for o-series models)
+
+
+# Agent roles that can be routed to different models
+LLM_ROLES = ("math", "code", "critic", "reflection")
+
+
+_pools: Dict[ClientSettings, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+_pools_lock = threading.Lock()
+
+
+def get_http_clients(settings: ClientSettings) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Returns the process-wide sync/async httpx clients for the given settings.
+
+    Agents built with the same settings reuse the same pools, so concurrent runs share
+    keep-alive TLS connections instead of opening new ones.
+    """
+    with _pools_lock:
+        if settings not in _pools:
+            limits = httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            )
+            timeout = httpx.Timeout(settings.timeout)
+            _pools[settings] = (
+                httpx.Client(limits=limits, timeout=timeout),
+                httpx.AsyncClient(limits=limits, timeout=timeout),
+            )
+        return _pools[settings]
+
+
+def build_llm(
+    model: str,
+    api_key: str = None,
+    settings: ClientSettings = None,
+    cache: BaseCache = None,
+    reasoning_effort: str = None,
+    max_tokens: int = None,
+) -> ChatOpenAI:
+    """Creates a ChatOpenAI client backed by the shared connection pool."""
+    settings = settings or ClientSettings()
+    http_client, http_async_client = get_http_clients(settings)
+    optional = {}
+    if reasoning_effort is not None:
+        optional["reasoning_effort"] = reasoning_effort
+    if max_tokens is not None:
+        optional["max_tokens"] = max_tokens
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        timeout=settings.timeout,
+        max_retries=settings.max_retries,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        cache=cache,
+        **optional,
+    )
+
+
+def build_role_llms(
+    default_model: str,
+    models: Mapping[str, Union[str, Mapping[str, Any], ModelConfig, BaseChatModel]] = None,
+    api_key: str = None,
+    settings: ClientSettings = None,
+    cache: BaseCache = None,
+) -> Dict[str, BaseChatModel]:
+    """
+    Resolves the chat model of every role in LLM_ROLES.
+
+    `models` maps a role to a model name, a ModelConfig (or an equivalent dict) or a ready chat
+    model instance. Roles that are not listed use `default_model`. Roles with the same
+    configuration share a single client.
+    """
+    models = dict(models or {})
+    unknown = set(models) - set(LLM_ROLES)
+    if unknown:
+        raise ValueError(f"Unknown model roles {sorted(unknown)}, expected a subset of {LLM_ROLES}")
+
+    clients: Dict[ModelConfig, BaseChatModel] = {}
+    role_llms = {}
+    for role in LLM_ROLES:
+        spec = models.get(role, default_model)
+        if isinstance(spec, BaseChatModel):
+            role_llms[role] = spec
+            continue
+        if isinstance(spec, str):
+            spec = ModelConfig(model=spec)
+        elif isinstance(spec, Mapping):
+            spec = ModelConfig(**spec)
+        if spec not in clients:
+            clients[spec] = build_llm(
+                spec.model,
+                api_key=api_key,
+                settings=settings,
+                cache=cache,
+                reasoning_effort=spec.reasoning_effort,
+                max_tokens=spec.max_tokens,
+            )
+        role_llms[role] = clients[spec]
+    return role_llms
@@ -0,0 +1,241 @@
+import asyncio
+import glob
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import xxhash
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from src.agent.llm.cache import CACHE_HIT
+from src.agent.prompts.loader import load_prompt
+
+
+ROLE_TEMPLATES = {
+    "math": "expert_math_agent.txt",
+    "code": "expert_code_agent.txt",
+    "repair": "code_repair_agent.txt",
+    "critic": "code_critic_agent.txt",
+    "reflection": "reflection_agent.txt",
+}
+# Roles without recorded replies of their own: a diff repair replays the next recorded script,
+# which expert_code_agent accepts in place of a diff
+REPLY_ROLES = {"repair": "code"}
+
+_RULE = "=" * 50
+_LOG_STOP = ("📐 [DEBUG]", "💻 [DEBUG]", "🔍 [DEBUG]", "🚀 [DEBUG]", "✂️ [DEBUG]", "Succesfully reached", "Max Retries", "-" * 60)
+
+
+@lru_cache(maxsize=None)
+def _role_markers() -> Dict[str, str]:
+    """The first line of each role's template that no other template has (the code and repair templates share their first line)."""
+    lines = {role: [line for line in load_prompt(filename).splitlines() if line.strip()] for role, filename in ROLE_TEMPLATES.items()}
+    return {
+        role: next(line for line in own if not any(line in lines[other] for other in lines if other != role))
+        for role, own in lines.items()
+    }
+
+
+def _section(text: str, start: str, end: str) -> Optional[str]:
+    if start not in text:
+        return None
+    return text.split(start, 1)[1].split(end, 1)[0].strip()
+
+
+def _log_replies(block: str, marker: str) -> List[str]:
+    """Collects every reply printed after `marker` in a log block (the reply starts on the next line)."""
+    replies = []
+    for chunk in block.split(marker)[1:]:
+        lines = []
+        for line in chunk.split("\n")[1:]:
+            if line.startswith(_LOG_STOP):
+                break
+            lines.append(line)
+        replies.append("\n".join(lines).strip())
+    return replies
+
+
+def _parse_log(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    problems = {}
+    for block in re.split(r"={60}\nProblema \d+\n={60}\n", text)[1:]:
+        statement = _section(block, "🤖 PROMPT GENERADO:\n" + _RULE + "\n", "\n" + _RULE)
+        if not statement:
+            continue  # problem skipped as already solved
+        name = re.search(r"Nombre: (\S+)", block)
+        math = [
+            chunk.split("\n" + "-" * 120, 1)[0].strip()
+            for chunk in block.split("--> Mathematical Problem Formulation:\n")[1:]
+        ]
+        problems[statement] = {
+            "name": name.group(1) if name else None,
+            "math": math,
+            "critic": _log_replies(block, "code_critic_agent: Generated code feedback:"),
+            "reflection": _log_replies(block, "reflection_agent: Generated solution reflection:"),
+            "code": [],
+        }
+    return problems
+
+
+def _parse_result_dir(path: str) -> Optional[Dict[str, Any]]:
+    name = os.path.basename(path.rstrip(os.sep))
+    files = glob.glob(os.path.join(path, "*.py"))
+    if not files:
+        return None
+    with open(files[0], "r", encoding="utf-8") as f:
+        text = f.read()
+    code = _section(text, "# Generated Code:\n", "\n\n'''Execution Results:")
+    if code is None:
+        return None
+    return {
+        "name": name,
+        "statement": _section(text, "# Problem Description:\n'''", "'''\n"),
+        "math": _section(text, "# Mathematical Formulation:\n'''", "'''\n"),
+        "code": f"```python\n{code}\n```",
+    }
+
+
+def load_recorded_runs(
+    logs_dir: str = "outputs/nlp4lp_logs",
+    results_dirs: tuple = ("outputs/nlp4lp_results", "outputs/text2zinc_results"),
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads recorded agent runs, keyed by problem statement.
+
+    The run logs (logs_*.txt) provide every math, critic and reflection reply in order. Logs only
+    record the length of generated code, so code replies come from the saved results directories
+    (`<id>_<name>/<id>_<name>.py`), which also cover solved problems without a log. Results saved
+    without their problem description cannot be matched to a prompt and are only used as
+    fallback code.
+    """
+    problems = {}
+    for path in sorted(glob.glob(os.path.join(logs_dir, "logs_*.txt"))):
+        problems.update(_parse_log(path))
+
+    by_name = {p["name"]: p for p in problems.values() if p["name"]}
+    orphan_code = []
+    for results_dir in results_dirs:
+        for path in sorted(glob.glob(os.path.join(results_dir, "*"))):
+            result = _parse_result_dir(path) if os.path.isdir(path) else None
+            if result is None:
+                continue
+            problem = problems.get(result["statement"]) or next(
+                (p for n, p in by_name.items() if result["name"].endswith("_" + n)), None
+            )
+            if problem is None and result["statement"]:
+                problem = problems[result["statement"]] = {
+                    "name": result["name"],
+                    "math": [result["math"]] if result["math"] else [],
+                    "critic": ["OK"],
+                    "reflection": ["OK"],
+                    "code": [],
+                }
+            if problem is None:
+                orphan_code.append(result["code"])
+            else:
+                problem["code"].append(result["code"])
+
+    if orphan_code:
+        problems[""] = {"name": None, "math": [], "critic": [], "reflection": [], "code": orphan_code}
+    return problems
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model that replays recorded R.O.R.A runs.
+
+    The role of a prompt (math, code, repair, critic, reflection) is detected from its template and
+    the problem from the problem statement (or, for the critic, from a recorded formulation) found
+    in it. Each (problem, role) pair replays its recorded replies in order and repeats the last one
+    once they run out; diff repairs replay the problem's recorded scripts. Prompts that match no
+    recording get a reply from a recorded problem chosen by prompt hash, so a replay never needs
+    the network. `latency` (+ up to `latency_jitter` seconds, seeded) is slept per call to emulate
+    the provider.
+
+    Usage:
+        agent = build_agent(llm=ReplayChatModel.from_outputs(latency=1.5))
+    """
+
+    recordings: Dict[str, Dict[str, Any]]
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    seed: int = 0
+    model_name: str = "replay"
+
+    _positions: Dict[tuple, int] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _random: Any = PrivateAttr(default=None)
+
+    @classmethod
+    def from_outputs(cls, logs_dir: str = "outputs/nlp4lp_logs", results_dirs: tuple = ("outputs/nlp4lp_results", "outputs/text2zinc_results"), **kwargs):
+        return cls(recordings=load_recorded_runs(logs_dir, results_dirs), **kwargs)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "rora-replay"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    @staticmethod
+    def _role(prompt: str) -> str:
+        for role, line in _role_markers().items():
+            if line in prompt:
+                return role
+        return "reflection"
+
+    def _problem(self, prompt: str, role: str) -> Dict[str, Any]:
+        for statement, problem in self.recordings.items():
+            if statement and statement in prompt:
+                return problem
+        if role == "critic":
+            for problem in self.recordings.values():
+                if any(math and math in prompt for math in problem["math"]):
+                    return problem
+        candidates = [p for _, p in sorted(self.recordings.items()) if p[role]]
+        if not candidates:
+            return {"name": None, role: ["OK"]}
+        return candidates[xxhash.xxh64_intdigest(prompt.encode("utf-8")) % len(candidates)]
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        role = self._role(prompt)
+        role = REPLY_ROLES.get(role, role)
+        problem = self._problem(prompt, role)
+        replies = problem[role] or ["OK"]
+        key = (id(problem), role)
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        return replies[min(position, len(replies) - 1)]
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.latency_jitter)
+
+    def reset(self):
+        """Restarts every replay sequence."""
+        with self._lock:
+            self._positions.clear()
+            self._random = random.Random(self.seed)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages), response_metadata={CACHE_HIT: True}))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages), response_metadata={CACHE_HIT: True}))])
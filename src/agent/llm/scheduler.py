@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+from langchain_core.language_models import BaseChatModel
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+from src.agent.llm.cache import CACHE_HIT
+from src.agent.prompts.budget import count_tokens
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Provider limits for one model."""
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after(error: BaseException) -> float:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+def _model_name(llm: BaseChatModel) -> str:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or "default"
+
+
+class _Bucket:
+    """Request and token buckets of one model. Refill speed shrinks after 429s and recovers on success."""
+
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self.requests = float(limit.requests_per_minute)
+        self.tokens = float(limit.tokens_per_minute)
+        self.rate_factor = 1.0
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self.updated) / 60.0
+        self.updated = now
+        self.requests = min(self.limit.requests_per_minute, self.requests + elapsed_minutes * self.limit.requests_per_minute * self.rate_factor)
+        self.tokens = min(self.limit.tokens_per_minute, self.tokens + elapsed_minutes * self.limit.tokens_per_minute * self.rate_factor)
+
+    def try_take(self, tokens: int) -> float:
+        """Takes one request and `tokens` tokens, or returns the seconds to wait until they are available."""
+        self.refill()
+        tokens = min(tokens, self.limit.tokens_per_minute)
+        if self.requests >= 1 and self.tokens >= tokens:
+            self.requests -= 1
+            self.tokens -= tokens
+            return 0.0
+        request_wait = max(0.0, 1 - self.requests) / (self.limit.requests_per_minute * self.rate_factor)
+        token_wait = max(0.0, tokens - self.tokens) / (self.limit.tokens_per_minute * self.rate_factor)
+        return max(request_wait, token_wait) * 60.0
+
+    def give_back(self, tokens: int):
+        """Returns a request and `tokens` tokens taken for a call that never reached the provider."""
+        self.requests = min(self.limit.requests_per_minute, self.requests + 1)
+        self.tokens = min(self.limit.tokens_per_minute, self.tokens + min(tokens, self.limit.tokens_per_minute))
+
+
+class RequestScheduler:
+    """
+    Process-wide token-bucket scheduler in front of every expert LLM call.
+
+    Each model has a request bucket and a token bucket sized to its per-minute limits. A call
+    first waits until both have room for one request plus the estimated prompt and completion
+    tokens, and the token bucket is corrected with the real usage afterwards. Replies served by
+    the DiskLLMCache or a ReplayChatModel (flagged with CACHE_HIT) and 429 responses give their
+    reservation back. 429 responses are retried with tenacity (exponential backoff with jitter,
+    honoring Retry-After) and halve the model's refill speed, which then recovers gradually on
+    successful calls. Share one instance
+    between all agents of a process so concurrent runs stay under the provider limits together.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, RateLimit],
+        default_limit: RateLimit = None,
+        expected_completion_tokens: int = 2000,
+        max_attempts: int = 6,
+    ):
+        self.limits = dict(limits)
+        self.default_limit = default_limit
+        self.expected_completion_tokens = expected_completion_tokens
+        self.max_attempts = max_attempts
+        self.rate_limited = 0
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, model: str) -> _Bucket:
+        limit = self.limits.get(model, self.default_limit)
+        if limit is None:
+            return None
+        if model not in self._buckets:
+            self._buckets[model] = _Bucket(limit)
+        return self._buckets[model]
+
+    def estimate_tokens(self, llm: BaseChatModel, prompt: str) -> int:
+        """Prompt tokens plus the completion allowance (the model's max_tokens when set)."""
+        completion = getattr(llm, "max_tokens", None) or self.expected_completion_tokens
+        return count_tokens(prompt) + completion
+
+    def _reserve(self, model: str, tokens: int) -> float:
+        with self._lock:
+            bucket = self._bucket(model)
+            return 0.0 if bucket is None else bucket.try_take(tokens)
+
+    def acquire(self, model: str, tokens: int):
+        """Blocks until the model's buckets admit a request of `tokens` tokens."""
+        while (wait := self._reserve(model, tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, model: str, tokens: int):
+        """Async variant of acquire, waits without blocking the event loop."""
+        while (wait := self._reserve(model, tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def _refund(self, model: str, estimated: int):
+        with self._lock:
+            bucket = self._bucket(model)
+            if bucket is not None:
+                bucket.give_back(estimated)
+
+    def _settle(self, model: str, estimated: int, msg):
+        if (getattr(msg, "response_metadata", None) or {}).get(CACHE_HIT):
+            # The chat model checks its cache after the reservation was taken
+            self._refund(model, estimated)
+            return
+        usage = getattr(msg, "usage_metadata", None) or {}
+        with self._lock:
+            bucket = self._bucket(model)
+            if bucket is None:
+                return
+            if usage.get("total_tokens"):
+                bucket.tokens = min(bucket.limit.tokens_per_minute, bucket.tokens + estimated - usage["total_tokens"])
+            bucket.rate_factor = min(1.0, bucket.rate_factor + 0.05)
+
+    def _on_rate_limit(self, model: str):
+        with self._lock:
+            self.rate_limited += 1
+            bucket = self._bucket(model)
+            if bucket is not None:
+                bucket.rate_factor = max(0.1, bucket.rate_factor / 2)
+
+    def _retry_kwargs(self, model: str) -> dict:
+        backoff = wait_exponential_jitter(initial=1, max=60)
+        return {
+            "retry": retry_if_exception(_is_rate_limit),
+            "wait": lambda retry_state: max(backoff(retry_state), _retry_after(retry_state.outcome.exception())),
+            "stop": stop_after_attempt(self.max_attempts),
+            "before_sleep": lambda retry_state: self._on_rate_limit(model),
+            "reraise": True,
+        }
+
+    def invoke(self, llm: BaseChatModel, prompt: str):
+        """Calls llm.invoke(prompt) within the rate limits of its model."""
+        model = _model_name(llm)
+        estimated = self.estimate_tokens(llm, prompt)
+        for attempt in Retrying(**self._retry_kwargs(model)):
+            with attempt:
+                self.acquire(model, estimated)
+                try:
+                    msg = llm.invoke(prompt)
+                except Exception as error:
+                    if _is_rate_limit(error):
+                        self._refund(model, estimated)  # the next attempt takes its own reservation
+                    raise
+        self._settle(model, estimated, msg)
+        return msg
+
+    async def ainvoke(self, llm: BaseChatModel, prompt: str):
+        """Async variant of invoke."""
+        model = _model_name(llm)
+        estimated = self.estimate_tokens(llm, prompt)
+        async for attempt in AsyncRetrying(**self._retry_kwargs(model)):
+            with attempt:
+                await self.aacquire(model, estimated)
+                try:
+                    msg = await llm.ainvoke(prompt)
+                except Exception as error:
+                    if _is_rate_limit(error):
+                        self._refund(model, estimated)  # the next attempt takes its own reservation
+                    raise
+        self._settle(model, estimated, msg)
+        return msg
@@ -1,17 +1,49 @@
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from src.agent.state import State
-from src.agent.tools.tools import code_validator, code_executor, save_model_files
-from src.agent.prompts.loader import load_prompt, render_prompt
-import os
+from src.agent.gates.retries import critic_failure, reflection_failure, record_failure
+from src.agent.gates.critic_policy import CriticPolicy
+from src.agent.tools.tools import code_artifact
+from src.agent.tools.repair import PatchError, apply_unified_diff, extract_diff, trim_traceback
+from src.agent.prompts.loader import load_prompt, render_prompt, render_prompt_with_budget
+from src.agent.prompts.budget import PromptBudget
+from src.agent.llm.scheduler import RequestScheduler
 
+# Every LLM node receives its chat model (plus optional prompt budget and request scheduler) from
+# build_agent, bound with functools.partial, so all nodes of an agent share one pooled client
+# instead of an import-time global.
 
-api_key = os.getenv("OPENAI_API_KEY")
-llm = ChatOpenAI(model="o3-mini-2025-01-31", api_key=api_key)
+def _invoke(llm: BaseChatModel, prompt: str, scheduler: RequestScheduler = None):
+    return llm.invoke(prompt) if scheduler is None else scheduler.invoke(llm, prompt)
+
+async def _ainvoke(llm: BaseChatModel, prompt: str, scheduler: RequestScheduler = None):
+    return await (llm.ainvoke(prompt) if scheduler is None else scheduler.ainvoke(llm, prompt))
+
+def _render(node: str, template: str, context: dict, budget: PromptBudget = None):
+    """Render a node prompt, trimming it to the node's token budget when one is configured."""
+    if budget is None:
+        return render_prompt(template, context), {}
+    prompt, report = render_prompt_with_budget(template, context, budget)
+    if report["tokens_saved"]:
+        print(f"✂️ [DEBUG] {node}: prompt trimmed from {report['tokens_before']} to {report['tokens_after']} tokens")
+    return prompt, {"prompt_tokens_saved": report["tokens_saved"]}
+
+def _call_update(node: str, llm: BaseChatModel, msg, budget_update: dict):
+    """State update recording the call's token usage, including prompt tokens served from the provider's prefix cache."""
+    usage = getattr(msg, "usage_metadata", None) or {}
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    if cached_tokens:
+        print(f"🧠 [DEBUG] {node}: {cached_tokens}/{usage.get('input_tokens', 0)} prompt tokens served from the provider cache")
+    call = {
+        "node": node,
+        "model": getattr(llm, "model_name", None) or type(llm).__name__,
+        "input_tokens": usage.get("input_tokens", 0),
+        "cached_tokens": cached_tokens,
+        "output_tokens": usage.get("output_tokens", 0),
+    }
+    return {**budget_update, "llm_calls": [call]}
 
 # Node: expert_math_agent (formulates mathematical model)
-def expert_math_agent(state: State):
-    print("📐 [DEBUG] expert_math_agent: Starting mathematical formulation")
-    
+def _math_prompt(state: State, budget: PromptBudget = None):
     # Check if this is a reformulation attempt
     is_coherent = state["coherent"]
     reformulation_context = ""
@@ -25,19 +57,24 @@ def expert_math_agent(state: State):
                 "reflection_status": state.get("reflection_status", ""),
             },
         )
+
+    # Best-of-N branches other than the first get a marker so their formulations (and cache keys) differ
+    if state.get("candidate_id"):
+        candidate_block = load_prompt("candidate_block.txt")
+        reformulation_context += "\n" + render_prompt(candidate_block, {"candidate_number": state["candidate_id"] + 1})
     
     template = load_prompt("expert_math_agent.txt")
-    prompt = render_prompt(
+    return _render(
+        "expert_math_agent",
         template,
         {
             "problem_statement": state["problem_statement"],
             "reformulation_context": reformulation_context,
         },
+        budget,
     )
 
-    msg = llm.invoke(prompt)
-    math_result = msg.content
-    
+def _math_update(state: State, math_result: str):
     print("--"*60)
     print("--> Problem Description")
     print(state['problem_statement'])
@@ -48,61 +85,213 @@ def expert_math_agent(state: State):
 
     return {"math_result": math_result}
 
+def expert_math_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None):
+    print("📐 [DEBUG] expert_math_agent: Starting mathematical formulation")
+    prompt, budget_update = _math_prompt(state, budget)
+    msg = _invoke(llm, prompt, scheduler)
+    return {**_math_update(state, msg.content), **_call_update("expert_math_agent", llm, msg, budget_update)}
+
+async def aexpert_math_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None):
+    print("📐 [DEBUG] expert_math_agent: Starting mathematical formulation")
+    prompt, budget_update = _math_prompt(state, budget)
+    msg = await _ainvoke(llm, prompt, scheduler)
+    return {**_math_update(state, msg.content), **_call_update("expert_math_agent", llm, msg, budget_update)}
+
 # Node: expert_code_agent (writes implementation code)
-def expert_code_agent(state: State):
-    print("💻 [DEBUG] expert_code_agent: Starting code implementation")
+def _code_prompt(state: State, budget: PromptBudget = None):
+    # Code rejected by the static analysis comes back with its findings
+    validation_context = ""
+    if state.get("validation_result", "").startswith("ERROR"):
+        validation_block = load_prompt("validation_block.txt")
+        validation_context = render_prompt(validation_block, {"validation_result": state["validation_result"]})
 
     template = load_prompt("expert_code_agent.txt")
-    prompt = render_prompt(
+    return _render(
+        "expert_code_agent",
         template,
         {
             "problem_statement": state["problem_statement"],
             "math_result": state["math_result"],
+            "validation_context": validation_context,
         },
+        budget,
     )
 
-    msg = llm.invoke(prompt)
-    code_result = msg.content
-    
+def _code_update(state: State, code_result: str):
     print(f"💻 [DEBUG] expert_code_agent: Generated code implementation (length: {len(code_result)} chars)")
-    return {"code_result": code_result}
+    return {"code_result": code_result, "code_artifact": code_artifact(code_result)}
 
-# Node: code_critic_agent (reviews code)
-def code_critic_agent(state: State):
-    print("💻 [DEBUG] code_critic_agent: Starting code critic")
+# Repair mode: failures the code expert fixes by editing the failing script with a diff
+REPAIRABLE_FAILURES = ("execution_error", "code_critic")
+
+def _repairable(state: State) -> bool:
+    return state.get("last_failure_reason") in REPAIRABLE_FAILURES and bool(state.get("code_result"))
+
+def _failing_source(state: State) -> str:
+    return (state.get("code_artifact") or code_artifact(state["code_result"]))["source"]
+
+def _repair_prompt(state: State, budget: PromptBudget = None):
+    if state["last_failure_reason"] == "execution_error":
+        traceback = trim_traceback(state.get("execution_result", ""))
+    else:
+        traceback = "The script was not run: the code critic rejected it."
+    template = load_prompt("code_repair_agent.txt")
+    return _render(
+        "code_repair_agent",
+        template,
+        {
+            "math_result": state["math_result"],
+            "failing_code": _failing_source(state),
+            "traceback": traceback,
+            "critic_feedback": state.get("code_feedback") or "No review.",
+        },
+        budget,
+    )
 
+def _repaired_code(state: State, reply: str):
+    """The repaired script as a code_result, or None when the reply cannot be applied to the failing script."""
+    diff = extract_diff(reply)
+    if diff is None:
+        # A complete script instead of a diff is accepted as is
+        return reply if "```python" in reply else None
+    try:
+        source = apply_unified_diff(_failing_source(state), diff)
+    except PatchError as e:
+        print(f"🩹 [DEBUG] expert_code_agent: Could not apply the repair diff ({e}), regenerating the script")
+        return None
+    print(f"🩹 [DEBUG] expert_code_agent: Applied a {len(diff.splitlines())}-line repair diff")
+    return f"```python\n{source}\n```"
+
+def _merge_updates(first: dict, second: dict) -> dict:
+    """Both LLM calls of a repair that fell back to a full rewrite, for the summed state fields."""
+    return {
+        **second,
+        "llm_calls": first["llm_calls"] + second["llm_calls"],
+        "prompt_tokens_saved": first.get("prompt_tokens_saved", 0) + second.get("prompt_tokens_saved", 0),
+    }
+
+def expert_code_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None, diff_repair: bool = False):
+    print("💻 [DEBUG] expert_code_agent: Starting code implementation")
+    repair_update = None
+    if diff_repair and _repairable(state):
+        print(f"🩹 [DEBUG] expert_code_agent: Repairing the script after {state['last_failure_reason']}")
+        prompt, budget_update = _repair_prompt(state, budget)
+        msg = _invoke(llm, prompt, scheduler)
+        repair_update = _call_update("code_repair_agent", llm, msg, budget_update)
+        code_result = _repaired_code(state, msg.content)
+        if code_result is not None:
+            return {**_code_update(state, code_result), **repair_update}
+    prompt, budget_update = _code_prompt(state, budget)
+    msg = _invoke(llm, prompt, scheduler)
+    update = {**_code_update(state, msg.content), **_call_update("expert_code_agent", llm, msg, budget_update)}
+    return _merge_updates(repair_update, update) if repair_update is not None else update
+
+async def aexpert_code_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None, diff_repair: bool = False):
+    print("💻 [DEBUG] expert_code_agent: Starting code implementation")
+    repair_update = None
+    if diff_repair and _repairable(state):
+        print(f"🩹 [DEBUG] expert_code_agent: Repairing the script after {state['last_failure_reason']}")
+        prompt, budget_update = _repair_prompt(state, budget)
+        msg = await _ainvoke(llm, prompt, scheduler)
+        repair_update = _call_update("code_repair_agent", llm, msg, budget_update)
+        code_result = _repaired_code(state, msg.content)
+        if code_result is not None:
+            return {**_code_update(state, code_result), **repair_update}
+    prompt, budget_update = _code_prompt(state, budget)
+    msg = await _ainvoke(llm, prompt, scheduler)
+    update = {**_code_update(state, msg.content), **_call_update("expert_code_agent", llm, msg, budget_update)}
+    return _merge_updates(repair_update, update) if repair_update is not None else update
+
+# Node: code_critic_agent (reviews code)
+def _critic_prompt(state: State, budget: PromptBudget = None):
     template = load_prompt("code_critic_agent.txt")
-    prompt = render_prompt(
+    return _render(
+        "code_critic_agent",
         template,
         {
             "math_result": state["math_result"],
             "code_result": state["code_result"],
         },
+        budget,
     )
 
-    msg = llm.invoke(prompt)
-    feedback = msg.content
-    
+def _critic_update(state: State, feedback: str):
     print(f"💻 [DEBUG] code_critic_agent: Generated code feedback:\n {feedback}")
     return {"code_feedback": feedback}
 
-# Node: reflection_agent (reflects on solution)
-def reflection_agent(state: State):
-    print("💻 [DEBUG] reflection_agent: Starting reflection step")
+def _critic_decision(state: State, critic_policy: CriticPolicy = None):
+    """The policy's decision on the state's code, or None when every script is reviewed."""
+    if critic_policy is None:
+        return None
+    decision = critic_policy.decide(state)
+    print(f"💻 [DEBUG] code_critic_agent: Confidence {decision['confidence']:.2f} (static {decision['static']:.2f}, history {decision['history']:.2f}, similarity {decision['similarity']:.2f})"
+          + (", skipping the critic" if decision["skip"] else ""))
+    return decision
+
+def _skipped_update(decision: dict):
+    return {"code_feedback": f"OK - critic skipped, confidence {decision['confidence']:.2f}", "critic_confidence": decision["confidence"]}
+
+def _reviewed_update(state: State, update: dict, decision: dict, critic_policy: CriticPolicy = None, record_failures: bool = True):
+    if decision is not None:
+        critic_policy.record_review(decision, approved=critic_failure({**state, **update}) is None)
+        update["critic_confidence"] = decision["confidence"]
+    return record_failure(state, update, critic_failure) if record_failures else update
 
+# With speculative execution the failure is recorded by speculative_join_node (record_failures=False)
+def code_critic_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None, record_failures: bool = True, critic_policy: CriticPolicy = None):
+    print("💻 [DEBUG] code_critic_agent: Starting code critic")
+    decision = _critic_decision(state, critic_policy)
+    if decision is not None and decision["skip"]:
+        return _skipped_update(decision)
+    prompt, budget_update = _critic_prompt(state, budget)
+    msg = _invoke(llm, prompt, scheduler)
+    update = {**_critic_update(state, msg.content), **_call_update("code_critic_agent", llm, msg, budget_update)}
+    return _reviewed_update(state, update, decision, critic_policy, record_failures)
+
+async def acode_critic_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None, record_failures: bool = True, critic_policy: CriticPolicy = None):
+    print("💻 [DEBUG] code_critic_agent: Starting code critic")
+    decision = _critic_decision(state, critic_policy)
+    if decision is not None and decision["skip"]:
+        return _skipped_update(decision)
+    prompt, budget_update = _critic_prompt(state, budget)
+    msg = await _ainvoke(llm, prompt, scheduler)
+    update = {**_critic_update(state, msg.content), **_call_update("code_critic_agent", llm, msg, budget_update)}
+    return _reviewed_update(state, update, decision, critic_policy, record_failures)
+
+# Node: reflection_agent (reflects on solution)
+def _reflection_prompt(state: State, budget: PromptBudget = None):
     template = load_prompt("reflection_agent.txt")
-    prompt = render_prompt(
+    return _render(
+        "reflection_agent",
         template,
         {
             "problem_statement": state["problem_statement"],
             "math_result": state["math_result"],
             "code_result": state["code_result"],
         },
+        budget,
     )
 
-    msg = llm.invoke(prompt)
-    reflection = msg.content
-    
+def _reflection_update(state: State, reflection: str):
     print(f"💻 [DEBUG] reflection_agent: Generated solution reflection:\n {reflection}")
     coherent = "OK" in reflection
-    return {"reflection_status": reflection, "coherent": coherent}
\ No newline at end of file
+    return {"reflection_status": reflection, "coherent": coherent}
+
+def _reflected_update(state: State, update: dict, critic_policy: CriticPolicy = None):
+    if critic_policy is not None and update["coherent"]:
+        critic_policy.record_acceptance(state)
+    return record_failure(state, update, reflection_failure)
+
+def reflection_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None, critic_policy: CriticPolicy = None):
+    print("💻 [DEBUG] reflection_agent: Starting reflection step")
+    prompt, budget_update = _reflection_prompt(state, budget)
+    msg = _invoke(llm, prompt, scheduler)
+    update = {**_reflection_update(state, msg.content), **_call_update("reflection_agent", llm, msg, budget_update)}
+    return _reflected_update(state, update, critic_policy)
+
+async def areflection_agent(state: State, llm: BaseChatModel, budget: PromptBudget = None, scheduler: RequestScheduler = None, critic_policy: CriticPolicy = None):
+    print("💻 [DEBUG] reflection_agent: Starting reflection step")
+    prompt, budget_update = _reflection_prompt(state, budget)
+    msg = await _ainvoke(llm, prompt, scheduler)
+    update = {**_reflection_update(state, msg.content), **_call_update("reflection_agent", llm, msg, budget_update)}
+    return _reflected_update(state, update, critic_policy)
@@ -0,0 +1,111 @@
+from collections import Counter
+
+from src.agent.state import State
+from src.agent.tools.tools import extract_objective_value
+from src.agent.tools.execution import best_solve
+
+# Fields copied from the winning branch into the parent state
+CANDIDATE_FIELDS = [
+    "math_result",
+    "code_result",
+    "code_artifact",
+    "code_feedback",
+    "validation_result",
+    "execution_result",
+    "execution_error",
+    "solver_results",
+    "reflection_status",
+    "coherent",
+    "verification",
+    "last_failure_reason",
+]
+
+# Failure counters of every branch, accounted to the parent run (see _branch_failures)
+FAILURE_FIELDS = ["global_retries", "failure_counts"]
+
+# Per-call records of every branch that are accounted to the parent run
+USAGE_FIELDS = ["llm_calls", "execution_metrics"]
+
+
+def _candidate_summary(candidate_id: int, final_state: dict = None, error: Exception = None):
+    if error is not None:
+        return {"candidate_id": candidate_id, "accepted": False, "objective": None, "error": str(error), **{field: [] for field in USAGE_FIELDS}}
+    summary = {field: final_state.get(field) for field in CANDIDATE_FIELDS + FAILURE_FIELDS}
+    summary.update({field: final_state.get(field, []) for field in USAGE_FIELDS})
+    # A branch only ends with a coherent reflection when the reflection agent accepted its solution
+    accepted = bool(final_state.get("reflection_status")) and bool(final_state.get("coherent")) and not final_state.get("execution_error")
+    objective = None
+    if accepted:
+        # Prefer the objective reported by the solver over the one printed by the generated code
+        solve = best_solve(final_state.get("solver_results"))
+        objective = solve.get("objective") if solve is not None else None
+        if objective is None:
+            objective = extract_objective_value(final_state.get("execution_result", ""))
+    return {**summary, "candidate_id": candidate_id, "accepted": accepted, "objective": objective}
+
+
+def formulation_candidate_node(state: State, agent, config=None):
+    candidate_id = state["candidate_id"]
+    print(f"🌿 [DEBUG] formulation_candidate_node: Starting formulation branch {candidate_id}")
+    try:
+        final_state = agent.invoke(state, config)
+    except Exception as e:
+        print(f"🌿 [DEBUG] formulation_candidate_node: Branch {candidate_id} failed: {e}")
+        return {"candidates": [_candidate_summary(candidate_id, error=e)]}
+    return {"candidates": [_candidate_summary(candidate_id, final_state)]}
+
+
+async def aformulation_candidate_node(state: State, agent, config=None):
+    candidate_id = state["candidate_id"]
+    print(f"🌿 [DEBUG] formulation_candidate_node: Starting formulation branch {candidate_id}")
+    try:
+        final_state = await agent.ainvoke(state, config)
+    except Exception as e:
+        print(f"🌿 [DEBUG] formulation_candidate_node: Branch {candidate_id} failed: {e}")
+        return {"candidates": [_candidate_summary(candidate_id, error=e)]}
+    return {"candidates": [_candidate_summary(candidate_id, final_state)]}
+
+
+def _objective_key(objective):
+    # Objectives agree when they match to 6 significant digits
+    return None if objective is None else float(f"{objective:.6g}")
+
+
+def _branch_failures(state: State) -> dict:
+    """
+    Failures of all branches, as an update of the parent's counters: each branch started from the
+    parent's counts, so only what it added on top of them is summed.
+    """
+    retries = state.get("global_retries") or 0
+    counts = state.get("failure_counts") or {}
+    update = {"global_retries": 0, "failure_counts": {}}
+    for candidate in state["candidates"]:
+        update["global_retries"] += max(0, (candidate.get("global_retries") or retries) - retries)
+        for failure, count in (candidate.get("failure_counts") or {}).items():
+            added = count - counts.get(failure, 0)
+            if added > 0:
+                update["failure_counts"][failure] = update["failure_counts"].get(failure, 0) + added
+    return update
+
+
+def select_candidate_node(state: State):
+    """
+    Picks the winner among the formulation branches: only candidates accepted by the reflection
+    agent compete, and the one whose objective value is shared by most of them wins (lowest
+    candidate_id on ties). The failures of every branch are added to the parent's counters; when
+    no candidate is accepted, the most common last failure of the branches is reported.
+    """
+    accepted = sorted((c for c in state["candidates"] if c["accepted"]), key=lambda c: c["candidate_id"])
+    print(f"🏁 [DEBUG] select_candidate_node: {len(accepted)}/{len(state['candidates'])} candidates accepted")
+    usage = {field: [record for c in state["candidates"] for record in c[field]] for field in USAGE_FIELDS}
+    usage.update(_branch_failures(state))
+    if not accepted:
+        candidates = sorted(state["candidates"], key=lambda c: c["candidate_id"])
+        reasons = Counter(c["last_failure_reason"] for c in candidates if c.get("last_failure_reason"))
+        reason = max(reasons, key=reasons.get) if reasons else state.get("last_failure_reason")
+        return {"coherent": False, "last_failure_reason": reason, **usage}
+
+    votes = Counter(_objective_key(c["objective"]) for c in accepted)
+    winner = max(accepted, key=lambda c: (votes[_objective_key(c["objective"])], c["objective"] is not None, -c["candidate_id"]))
+    print(f"🏁 [DEBUG] select_candidate_node: Selected candidate {winner['candidate_id']} (objective {winner['objective']}, {votes[_objective_key(winner['objective'])]} votes)")
+    return {**{field: winner[field] for field in CANDIDATE_FIELDS}, "candidate_id": winner["candidate_id"], **usage}
@@ -1,35 +1,83 @@
+import asyncio
+
 from src.agent.state import State
-from src.agent.tools.tools import code_validator, code_executor, save_model_files
+from src.agent.gates.retries import execution_failure, critic_failure, validation_failure, record_failure, failure_update, llm_usage
+from src.agent.tools.tools import save_model_files, validate_code, code_artifact, extract_objective_value
+from src.agent.tools.execution import ExecutionResult, execute_code
+from src.agent.tools.variants import execute_variants
+from src.agent.tools.verifier import verify_solution
+from src.agent.gates.critic_policy import CriticPolicy
+
+def _source(state: State) -> str:
+    # States created outside expert_code_agent may only carry the raw code_result
+    artifact = state.get("code_artifact") or code_artifact(state["code_result"])
+    return artifact["source"]
 
 def code_validator_node(state: State):
     print("🔍 [DEBUG] code_validator_node: Validating code")
-    validation_result = code_validator.invoke({"code": state['code_result']})
+    validation_result = validate_code(_source(state))
     print(f"🔍 [DEBUG] code_validator_node: Validation result: {validation_result}")
-    return {"validation_result": validation_result}
+    return record_failure(state, {"validation_result": validation_result}, validation_failure)
 
-def code_executor_node(state: State):
-    print("🚀 [DEBUG] code_executor_node: Executing code")
-    execution_result = code_executor.invoke({"code": state['code_result']})
+def _execution_update(result: ExecutionResult):
+    execution_result = result.to_text()
     print(f"🚀 [DEBUG] code_executor_node: Execution result: {execution_result}...")
-    execution_success = execution_result.startswith("SUCCESS")
-
-    if not execution_success:
-        return {
-            "execution_result": execution_result,
-            "execution_error": True
-        }
-    else:
-        return {
-            "execution_result": execution_result,
-            "execution_error": False
-        }
+    for variant in result.variants:
+        print(f"🚀 [DEBUG] code_executor_node: Variant {variant['name']}: status {variant['status']}, objective {variant['objective']}")
+    if result.cached:
+        print("🚀 [DEBUG] code_executor_node: Reused the result of an equivalent script from the execution cache")
+    print(f"🚀 [DEBUG] code_executor_node: wall {result.wall_time:.2f}s, cpu {result.cpu_time:.2f}s, peak RSS {result.peak_rss_mb:.0f} MB"
+          + (f", {result.threads} solver threads" if result.threads else "")
+          + (f", {result.limit_exceeded} limit exceeded" if result.limit_exceeded else ""))
+    return {
+        "execution_result": execution_result,
+        "execution_error": not result.success,
+        "solver_results": result.solves,
+        "execution_metrics": [result.metrics()],
+    }
+
+def _execute(state: State, **deps):
+    # deps: pool, limits, cache, cores and parallel_variants, bound by build_agent
+    parallel_variants = deps.pop("parallel_variants", False)
+    if parallel_variants:
+        return execute_variants(_source(state), **deps)
+    return execute_code(_source(state), **deps)
+
+def _executed_update(state: State, update: dict, record_failures: bool = True, critic_policy: CriticPolicy = None):
+    if critic_policy is not None:
+        # Outcome of the critic policy's decision on this code
+        critic_policy.record_execution(state, execution_failure({**state, **update}))
+    return record_failure(state, update, execution_failure) if record_failures else update
+
+# With speculative execution the failure is recorded by speculative_join_node (record_failures=False)
+def code_executor_node(state: State, record_failures: bool = True, critic_policy: CriticPolicy = None, **deps):
+    print("🚀 [DEBUG] code_executor_node: Executing code")
+    update = _execution_update(_execute(state, **deps))
+    return _executed_update(state, update, record_failures, critic_policy)
+
+async def acode_executor_node(state: State, record_failures: bool = True, critic_policy: CriticPolicy = None, **deps):
+    print("🚀 [DEBUG] code_executor_node: Executing code")
+    update = _execution_update(await asyncio.to_thread(_execute, state, **deps))
+    return _executed_update(state, update, record_failures, critic_policy)
     
+def solution_verifier_node(state: State, critic_policy: CriticPolicy = None):
+    print("✅ [DEBUG] solution_verifier_node: Checking the solution against the model constraints")
+    verification = verify_solution(state.get("solver_results"), extract_objective_value(state["execution_result"]))
+    print(f"✅ [DEBUG] solution_verifier_node: {'Verified' if verification['verified'] else 'Not verified'}: {verification['reason']}")
+    update = {"verification": verification}
+    if verification["verified"]:
+        if critic_policy is not None:
+            critic_policy.record_acceptance(state)
+        # Accepted without the reflection LLM call
+        update.update({"reflection_status": f"OK - solution verified against the model ({verification['reason']})", "coherent": True})
+    return update
+
 def save_model_node(state: State):
     print("Succesfully reached a feasible solution, saving results.")
     params = {
         "description": state["problem_statement"],
         "model_name": state["problem_name"],
-        "code":state["code_result"],
+        "code":_source(state),
         "math_formulation":state["math_result"],
         "execution_results":state["execution_result"],
         "expected_output":state["expected_output"]
@@ -39,4 +87,12 @@ def save_model_node(state: State):
     )
 
 def end_execution_on_max_retries(state: State):
-    print("Max Retries reached. Ending agent execution.")
\ No newline at end of file
+    calls, tokens = llm_usage(state)
+    print("Max Retries reached. Ending agent execution.")
+    print(f"🛑 [DEBUG] abort_node: last failure {state.get('last_failure_reason')}, failures {state.get('failure_counts') or {}}, {calls} LLM calls, {tokens} tokens")
+
+
+def speculative_join_node(state: State):
+    print("🔀 [DEBUG] speculative_join_node: Critic review and code execution finished")
+    # A critic rejection discards the execution, so only one of the two failures is counted
+    return failure_update(critic_failure(state) or execution_failure(state))
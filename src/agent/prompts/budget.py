@@ -0,0 +1,142 @@
+import warnings
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple, Union
+
+import tiktoken
+
+# Room left for the "[... N tokens omitted ...]" marker when a field is shortened
+_MARKER_TOKENS = 16
+
+# A summarizer receives the field text and the number of tokens it must fit in.
+Summarizer = Callable[[str, int], str]
+
+
+@dataclass(frozen=True)
+class FieldPolicy:
+    """How a single placeholder value may be shortened."""
+    strategy: Union[str, Summarizer] = "head_tail"  # "keep" | "head" | "tail" | "head_tail" | summarizer
+    max_tokens: int = None  # always cap the field at this size, even if the prompt fits
+    min_tokens: int = 256  # never shrink below this when enforcing the prompt ceiling
+
+
+# Fields listed first are shrunk first when a prompt is over its ceiling.
+DEFAULT_FIELD_POLICIES = {
+    "traceback": FieldPolicy("tail", min_tokens=256),
+    "critic_feedback": FieldPolicy("head_tail", min_tokens=256),
+    "reformulation_context": FieldPolicy("head_tail", min_tokens=512),
+    "validation_context": FieldPolicy("head_tail", min_tokens=256),
+    "code_result": FieldPolicy("head_tail", min_tokens=1024),
+    "math_result": FieldPolicy("head_tail", min_tokens=1024),
+    "problem_statement": FieldPolicy("head_tail", min_tokens=2048),
+    "failing_code": FieldPolicy("keep"),  # a repair diff must match the script line for line
+}
+
+
+@dataclass
+class PromptBudget:
+    """Token ceiling for the prompt of one agent node, with per-placeholder shortening policies."""
+    max_tokens: int
+    policies: Dict[str, FieldPolicy] = field(default_factory=lambda: dict(DEFAULT_FIELD_POLICIES))
+    encoding: str = "o200k_base"
+
+
+class _ApproximateEncoding:
+    """Stand-in for a tiktoken encoding that cannot be loaded: one token per 4 characters."""
+    CHARS_PER_TOKEN = 4
+
+    def encode(self, text: str, disallowed_special=()) -> list:
+        return [text[i:i + self.CHARS_PER_TOKEN] for i in range(0, len(text), self.CHARS_PER_TOKEN)]
+
+    def decode(self, tokens: list) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    # tiktoken downloads an encoding the first time it is used, which fails offline
+    try:
+        return tiktoken.get_encoding(name)
+    except (OSError, ValueError) as e:
+        warnings.warn(f"tiktoken encoding '{name}' is unavailable ({e}), token counts are estimated from the text length")
+        return _ApproximateEncoding()
+
+
+def count_tokens(text: str, encoding: str = "o200k_base") -> int:
+    """Number of tokens of `text` under the given tiktoken encoding (estimated when it cannot be loaded)."""
+    return len(_encoding(encoding).encode(text, disallowed_special=()))
+
+
+def _shorten(text: str, max_tokens: int, strategy: Union[str, Summarizer], encoding: str) -> str:
+    if strategy == "keep":
+        return text
+    if callable(strategy):
+        return strategy(text, max_tokens)
+
+    enc = _encoding(encoding)
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    omitted = len(tokens) - max_tokens
+    marker = f"\n[... {omitted} tokens omitted ...]\n"
+    if strategy == "head":
+        return enc.decode(tokens[:max_tokens]) + marker
+    if strategy == "tail":
+        return marker + enc.decode(tokens[-max_tokens:])
+    if strategy == "head_tail":
+        head = max_tokens // 2
+        return enc.decode(tokens[:head]) + marker + enc.decode(tokens[len(tokens) - (max_tokens - head):])
+    raise ValueError(f"Unknown truncation strategy '{strategy}'")
+
+
+def fit_context(template: str, context: Dict[str, Any], budget: PromptBudget) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    Shortens placeholder values so the rendered prompt stays under budget.max_tokens.
+
+    Per-field max_tokens caps are applied first. If the prompt is still over the ceiling, the
+    fields with a policy are shrunk in policy order, each down to its min_tokens, until it fits.
+
+    Returns:
+        Tuple[Dict[str, str], Dict[str, Any]]: the shortened context and a report with the
+        prompt size before/after, the tokens saved and the per-field token counts.
+    """
+    values = {k: "" if v is None else str(v) for k, v in context.items()}
+    sizes = {k: count_tokens(v, budget.encoding) for k, v in values.items()}
+    before = dict(sizes)
+
+    fixed = template
+    for k in values:
+        fixed = fixed.replace(f"[[{k}]]", "")
+    fixed_tokens = count_tokens(fixed, budget.encoding)
+    occurrences = {k: max(template.count(f"[[{k}]]"), 1) for k in values}
+
+    def shrink(key: str, target: int):
+        policy = budget.policies[key]
+        values[key] = _shorten(values[key], target, policy.strategy, budget.encoding)
+        sizes[key] = count_tokens(values[key], budget.encoding)
+
+    for key, policy in budget.policies.items():
+        if key in values and policy.max_tokens is not None and sizes[key] > policy.max_tokens:
+            shrink(key, policy.max_tokens)
+
+    def total() -> int:
+        return fixed_tokens + sum(sizes[k] * occurrences[k] for k in values)
+
+    for key, policy in budget.policies.items():
+        overflow = total() - budget.max_tokens
+        if overflow <= 0:
+            break
+        if key not in values or policy.strategy == "keep" or sizes[key] <= policy.min_tokens:
+            continue
+        shrink(key, max(policy.min_tokens, sizes[key] - -(-overflow // occurrences[key]) - _MARKER_TOKENS))
+
+    tokens_before = fixed_tokens + sum(before[k] * occurrences[k] for k in values)
+    tokens_after = total()
+    report = {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "over_budget": tokens_after > budget.max_tokens,
+        "fields": {k: {"before": before[k], "after": sizes[k]} for k in values},
+    }
+    return values, report
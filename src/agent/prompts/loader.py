@@ -1,5 +1,11 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+from src.agent.prompts.budget import PromptBudget, fit_context
+
+# Templates put their long static instructions first and the per-call data after this marker line,
+# so every call of a node shares a byte-identical prefix that the provider can cache.
+DYNAMIC_MARKER = "[[#dynamic]]\n"
 
 def _prompts_dir() -> str:
     """Returns the directory where prompt files are stored."""
@@ -11,10 +17,26 @@ def load_prompt(filename: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
+def split_prompt(template: str) -> Tuple[str, str]:
+    """Split a template into its static prefix and dynamic suffix (the prefix is empty if there is no marker)."""
+    if DYNAMIC_MARKER not in template:
+        return "", template
+    static, dynamic = template.split(DYNAMIC_MARKER, 1)
+    if "[[" in static:
+        raise ValueError("Placeholders are only allowed after the [[#dynamic]] marker")
+    return static, dynamic
+
 def render_prompt(template: str, context: Dict[str, Any]) -> str:
-    """Render a prompt template by replacing placeholders like [[key]] with values from context."""
-    text = template
+    """
+    Render a prompt template by replacing placeholders like [[key]] with values from context.
+    Only the dynamic section is rendered; the static prefix is returned untouched.
+    """
+    static, text = split_prompt(template)
     for k, v in context.items():
         text = text.replace(f"[[{k}]]", "" if v is None else str(v))
-    return text
+    return static + text
 
+def render_prompt_with_budget(template: str, context: Dict[str, Any], budget: PromptBudget) -> Tuple[str, Dict[str, Any]]:
+    """Render a prompt template after shortening context values to fit the token budget (see fit_context)."""
+    fitted, report = fit_context("".join(split_prompt(template)), context, budget)
+    return render_prompt(template, fitted), report
@@ -1,4 +1,14 @@
-from typing_extensions import TypedDict
+import operator
+
+from typing_extensions import Annotated, TypedDict
+
+
+def merge_counts(left: dict, right: dict) -> dict:
+    """Reducer summing per-key counters."""
+    merged = dict(left or {})
+    for key, count in (right or {}).items():
+        merged[key] = merged.get(key, 0) + count
+    return merged
 
 
 # Define the state for the workflow
@@ -9,13 +19,25 @@ class State(TypedDict):
     
     math_result: str
     code_result: str
+    code_artifact: dict  # Extracted source of code_result and its normalized AST hash, shared by validation, execution and saving
     code_feedback: str
+    critic_confidence: float  # CriticPolicy confidence in the last reviewed or skipped code
     validation_result: str
     execution_result: str
     execution_error: bool = False
+    solver_results: list  # Solver calls intercepted in the last execution (status, objective, bound, solve time, variable values, exported model)
+    verification: dict  # Constraint-by-constraint check of the last execution's solutions, see tools/verifier.py
+    execution_metrics: Annotated[list, operator.add]  # Resource usage of every execution (wall/CPU time, peak RSS, output size, limits hit)
     reflection_status: str
     coherent: bool = True
-    last_failure_reason: str
+    last_failure_reason: str  # Failure type of the last failed step, written by the node that failed
+
+    global_retries: Annotated[int, operator.add]  # Failures recorded over the run, all types
+    failure_counts: Annotated[dict, merge_counts]  # Failures recorded over the run, per failure type
+    model_saved: bool  # Track if model was successfully saved
+    prompt_tokens_saved: Annotated[int, operator.add]  # Tokens removed by prompt budgets over the whole run
+    llm_calls: Annotated[list, operator.add]  # Token usage of every LLM call (node, model, input/cached/output tokens)
 
-    global_retries: int = 0
-    model_saved: bool  # Track if model was successfully saved
\ No newline at end of file
+    # Best-of-N fan-out
+    candidate_id: int  # Index of the formulation branch this state belongs to
+    candidates: Annotated[list, operator.add]  # Final results of every formulation branch
\ No newline at end of file
@@ -0,0 +1,70 @@
+import os
+import threading
+from contextlib import contextmanager
+
+
+class CoreAllocator:
+    """
+    Process-wide budget of CPU cores for solver threads.
+
+    Each execution is granted a share of the free cores (total_cores divided by the executions
+    running or waiting at that moment, capped at max_threads_per_execution) and returns it when it
+    finishes. Grants never exceed the free cores: when every core is taken an execution waits for
+    one to be released, so solver threads never outnumber the cores. With `expected_concurrency`,
+    max_threads_per_execution defaults to total_cores // expected_concurrency, so the first
+    executions do not take the whole machine and leave later ones waiting.
+    Share one allocator between all agents of a process.
+    """
+
+    def __init__(self, total_cores: int = None, max_threads_per_execution: int = None, expected_concurrency: int = None):
+        if total_cores is None:
+            total_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+        if max_threads_per_execution is None and expected_concurrency:
+            max_threads_per_execution = max(1, total_cores // expected_concurrency)
+        self.total_cores = total_cores
+        self.max_threads_per_execution = max_threads_per_execution
+        self.free_cores = self.total_cores
+        self.active = 0  # executions holding or waiting for a grant
+        self.peak_active = 0
+        self.waits = 0  # executions that had to wait for a free core
+        self._available = threading.Condition()
+
+    def acquire(self) -> int:
+        """Reserves the thread budget of one execution and returns it, waiting while no core is free."""
+        with self._available:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            if self.free_cores < 1:
+                self.waits += 1
+                self._available.wait_for(lambda: self.free_cores >= 1)
+            share = max(1, self.total_cores // self.active)
+            if self.max_threads_per_execution:
+                share = min(share, self.max_threads_per_execution)
+            threads = min(share, self.free_cores)
+            self.free_cores -= threads
+            return threads
+
+    def release(self, threads: int):
+        with self._available:
+            self.active -= 1
+            self.free_cores += threads
+            self._available.notify_all()
+
+    @contextmanager
+    def allocate(self):
+        """Context manager around acquire/release, yields the thread budget."""
+        threads = self.acquire()
+        try:
+            yield threads
+        finally:
+            self.release(threads)
+
+    def stats(self) -> dict:
+        with self._available:
+            return {
+                "total_cores": self.total_cores,
+                "free_cores": self.free_cores,
+                "active": self.active,
+                "peak_active": self.peak_active,
+                "waits": self.waits,
+            }
@@ -0,0 +1,130 @@
+import ast
+import json
+import subprocess
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Any, Collection, Dict, Optional
+
+import xxhash
+
+from src.agent.lru_store import LRUStore
+
+# Distributions whose version changes what generated code computes
+SOLVER_DISTRIBUTIONS = ("ortools", "PuLP")
+
+_VERSIONS_SCRIPT = (
+    "import importlib.metadata as m, json, sys\n"
+    "versions = {}\n"
+    "for name in sys.argv[1:]:\n"
+    "    try:\n"
+    "        versions[name] = m.version(name)\n"
+    "    except m.PackageNotFoundError:\n"
+    "        versions[name] = None\n"
+    "print(json.dumps(versions))\n"
+)
+
+
+@lru_cache(maxsize=None)
+def solver_versions(python: str = "python") -> str:
+    """Versions of SOLVER_DISTRIBUTIONS installed for the interpreter that runs generated code."""
+    try:
+        output = subprocess.run([python, "-c", _VERSIONS_SCRIPT, *SOLVER_DISTRIBUTIONS], capture_output=True, text=True, timeout=30).stdout
+        return json.dumps(json.loads(output), sort_keys=True)
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return "unknown"
+
+
+class _StripDocstrings(ast.NodeTransformer):
+    def _strip(self, node):
+        self.generic_visit(node)
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]
+        return node
+
+    visit_Module = visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _strip
+
+
+@lru_cache(maxsize=256)
+def normalize_code(code: str) -> Optional[str]:
+    """
+    Canonical form of a script: its AST without docstrings, so comments, formatting and
+    docstring edits do not change it. Returns None when the code does not parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    return ast.dump(_StripDocstrings().visit(tree), include_attributes=False)
+
+
+class ExecutionCache:
+    """
+    Persistent cache of execution results keyed by the normalized code.
+
+    The key is an xxhash of the script's AST (comments, docstrings and whitespace removed), the
+    installed solver library versions and the execution limits, so regenerated code that only
+    differs in comments or formatting is not run again. Results are stored in a single SQLite
+    file (an LRUStore) and evicted least recently used once max_bytes is exceeded. Executions
+    stopped by the timeout or CPU limit or with a solver stopped by its adaptive time budget,
+    and executor failures, are not cached since a rerun may behave differently.
+    """
+
+    def __init__(self, path: str = ".rora_cache/exec_cache.sqlite", max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0  # wall time of the executions served from the cache
+        self._store = LRUStore(path, "exec_cache", max_bytes)
+
+    @staticmethod
+    def key(code: str, limits, python: str = "python", entry: str = None) -> Optional[str]:
+        """Cache key of `code` (or its `entry` function) run under `limits` by `python`, or None when the code does not parse."""
+        normalized = normalize_code(code)
+        if normalized is None:
+            return None
+        h = xxhash.xxh3_128()
+        for part in (normalized, solver_versions(python), repr(limits), entry or ""):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def lookup(self, key: str, fields: Collection[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        The stored result fields for `key`, or None on a miss. With `fields`, a result stored with
+        other fields (by another version of ExecutionResult) is a miss, to be run and stored again.
+        """
+        value = self._store.get(key)
+        stored = json.loads(value) if value is not None else None
+        if stored is None or (fields is not None and set(stored) != set(fields)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.seconds_saved += stored.get("wall_time", 0.0)
+        return stored
+
+    def update(self, key: str, result) -> None:
+        """Stores an ExecutionResult under `key` unless its outcome may change on a rerun."""
+        if result.error is not None or result.limit_exceeded in ("timeout", "cpu"):
+            return
+        if any(solve.get("soft_timeout") for solve in result.solves):
+            return
+        fields = asdict(result)
+        fields.pop("limits")
+        fields.pop("cached", None)
+        self._store.put(key, json.dumps(fields))
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process (hits are skipped solver runs) plus the current on-disk footprint."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "seconds_saved": self.seconds_saved,
+            **self._store.stats(),
+        }
@@ -0,0 +1,354 @@
+"""
+Warm execution worker started by WorkerPool (src/agent/tools/worker_pool.py).
+
+The worker imports the solver libraries given on its command line once, then serves execution
+requests read from its request pipe: for every script it forks a child that runs the code in a
+fresh __main__ module and reports the child's exit code, stdout and stderr back. Children inherit
+the already imported libraries copy-on-write, so a script starts in a few milliseconds while still
+running in its own process.
+
+This file runs under the interpreter that executes generated code, so it only uses the standard
+library and must not import anything from src.
+
+Requests are {"code", "timeout", "memory_mb", "cpu_seconds", "max_output_bytes", "kill_output_bytes",
+"kill_patterns", "entry", "threads", "timeout_policy"}; the limits are applied to the child with
+setrlimit and its CPU time and peak RSS are read with wait4. Output is read as it is written and
+only the first and last max_output_bytes / 2 of each stream are kept; the child is killed as soon
+as a stream matches one of "kill_patterns" (regular expressions) or exceeds "kill_output_bytes". The child runs under solver_harness.py, which caps every solver at "threads"
+threads and reports every solver call on a third pipe; the replies carry them as "solves". With an
+"entry" the script is imported as a module instead of run as __main__ and only that function is
+called; its return value is pickled and sent on the report pipe, and replied as "returned" (base64,
+None when it cannot be pickled).
+
+With a "timeout_policy" the fixed "timeout" is replaced by a deadline that follows the reports:
+setup_seconds outside solver calls, each solve's budget plus grace_seconds while it runs, and
+never more than max_total_seconds. When the child is killed during a solve that had already
+found an incumbent, it is returned as an interrupted "feasible" solve.
+"""
+import base64
+import importlib
+import json
+import linecache
+import os
+import pickle
+import re
+import resource
+import selectors
+import signal
+import struct
+import sys
+import time
+import traceback
+import types
+
+SCRIPT_NAME = "generated_model.py"
+_HEADER = struct.Struct("!I")
+
+
+def _read_exact(fd: int, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+def read_message(fd: int) -> dict:
+    (size,) = _HEADER.unpack(_read_exact(fd, _HEADER.size))
+    return json.loads(_read_exact(fd, size))
+
+
+def write_message(fd: int, message: dict):
+    payload = json.dumps(message).encode()
+    data = _HEADER.pack(len(payload)) + payload
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _report_return(report_fd: int, value):
+    try:
+        payload = base64.b64encode(pickle.dumps(value)).decode()
+    except Exception:
+        payload = None
+    line = (json.dumps({"event": "return", "value": payload}) + "\n").encode()
+    while line:
+        line = line[os.write(report_fd, line):]
+
+
+def _run_script(code: str, entry: str = None, report_fd: int = None):
+    """Runs in the forked child: executes `code` as __main__ (or calls its `entry` function and reports its return value) and exits with its status."""
+    status = 0
+    try:
+        linecache.cache[SCRIPT_NAME] = (len(code), None, code.splitlines(True), SCRIPT_NAME)
+        module = types.ModuleType("__main__" if entry is None else "generated_model")
+        module.__file__ = SCRIPT_NAME
+        sys.modules["__main__"] = module
+        sys.argv = [SCRIPT_NAME]
+        exec(compile(code, SCRIPT_NAME, "exec"), module.__dict__)
+        if entry is not None:
+            _report_return(report_fd, module.__dict__[entry]())
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            status = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        # Hide this function's frame so the traceback starts at the generated script
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, tb.tb_next)
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(status)
+
+
+class _Capture:
+    """One output stream of the child: keeps its head and tail within max_bytes and watches for kill patterns."""
+
+    _WINDOW = 4096  # bytes of earlier output kept to match patterns that span two reads
+
+    def __init__(self, max_bytes: int = None, patterns: list = ()):
+        self.max_bytes = max_bytes
+        self.patterns = patterns
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.size = 0
+        self._window = b""
+
+    def feed(self, data: bytes):
+        """Stores `data` and returns the kill pattern it matched, if any."""
+        self.size += len(data)
+        if self.max_bytes is None:
+            self.head += data
+        else:
+            room = max(0, self.max_bytes // 2 - len(self.head))
+            self.head += data[:room]
+            self.tail += data[room:]
+            excess = len(self.tail) - (self.max_bytes - self.max_bytes // 2)
+            if excess > 0:
+                del self.tail[:excess]
+        if self.patterns:
+            text = self._window + data
+            self._window = text[-self._WINDOW:]
+            for pattern in self.patterns:
+                if pattern.search(text):
+                    return pattern.pattern.decode(errors="replace")
+        return None
+
+    @property
+    def truncated(self) -> bool:
+        return self.max_bytes is not None and self.size > self.max_bytes
+
+    def text(self) -> str:
+        if not self.truncated:
+            return (self.head + self.tail).decode(errors="replace")
+        omitted = self.size - len(self.head) - len(self.tail)
+        return f"{self.head.decode(errors='replace')}\n[... {omitted} bytes of output omitted ...]\n{self.tail.decode(errors='replace')}"
+
+
+class _Reports:
+    """Parses the solver harness reports as they arrive and moves the execution deadline with them."""
+
+    def __init__(self, start: float, timeout: float, policy: dict = None):
+        self.policy = policy
+        self.limit = start + (policy["max_total_seconds"] if policy else timeout)
+        self.deadline = min(self.limit, start + policy["setup_seconds"]) if policy else self.limit
+        self.solves = []
+        self.incumbent = None  # last incumbent of the solve in progress
+        self.returned = None  # return value of the entry function
+        self._buffer = b""
+
+    def feed(self, data: bytes):
+        *lines, self._buffer = (self._buffer + data).split(b"\n")
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            event = record.pop("event", None)
+            if event == "incumbent":
+                self.incumbent = record
+                continue
+            if event == "return":
+                self.returned = record["value"]
+                continue
+            if event != "start":
+                self.solves.append(record)
+                self.incumbent = None
+            if self.policy is None:
+                continue
+            if event == "start":
+                self.deadline = min(self.limit, time.monotonic() + record["budget"] + self.policy["grace_seconds"])
+            else:
+                self.deadline = min(self.limit, time.monotonic() + self.policy["setup_seconds"])
+
+    def finish(self, timed_out: bool) -> list:
+        if timed_out and self.incumbent is not None:
+            self.solves.append({**self.incumbent, "status": "feasible", "interrupted": True})
+        return self.solves
+
+
+def _address_space() -> int:
+    """Bytes of address space already mapped by this process (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _set_limits(memory_mb: int = None, cpu_seconds: int = None):
+    # (limit, soft, hard); the hard CPU limit is one second above the soft one so SIGXCPU comes before SIGKILL
+    limits = []
+    if memory_mb:
+        # On top of what the child inherited: a warm worker has already mapped the solver libraries
+        # and their thread arenas, often more address space than the script itself needs
+        memory = _address_space() + memory_mb * 1024 * 1024
+        limits.append((resource.RLIMIT_AS, memory, memory))
+    if cpu_seconds:
+        limits.append((resource.RLIMIT_CPU, int(cpu_seconds), int(cpu_seconds) + 1))
+    for limit, soft, hard in limits:
+        _, current_hard = resource.getrlimit(limit)
+        if current_hard != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current_hard), min(hard, current_hard)
+        resource.setrlimit(limit, (soft, hard))
+
+
+def execute(
+    code: str,
+    timeout: float,
+    memory_mb: int = None,
+    cpu_seconds: int = None,
+    max_output_bytes: int = None,
+    kill_output_bytes: int = None,
+    kill_patterns: list = (),
+    entry: str = None,
+    threads: int = None,
+    timeout_policy: dict = None,
+    private_fds: tuple = (),
+) -> dict:
+    """Runs `code` in a forked child under the given limits and returns its exit status, output and resource usage."""
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    report_r, report_w = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    start = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setpgid(0, 0)
+            for fd in (out_r, err_r, report_r, *private_fds):
+                os.close(fd)
+            os.dup2(out_w, 1)
+            os.dup2(err_w, 2)
+            os.close(out_w)
+            os.close(err_w)
+            _set_limits(memory_mb, cpu_seconds)
+            sys.modules["solver_harness"].install(report_w, threads, timeout_policy)
+            _run_script(code, entry, report_w)
+        finally:
+            os._exit(1)
+    os.close(out_w)
+    os.close(err_w)
+    os.close(report_w)
+
+    patterns = [re.compile(pattern.encode()) for pattern in kill_patterns or ()]
+    output = {out_r: _Capture(max_output_bytes, patterns), err_r: _Capture(max_output_bytes, patterns)}
+    reports = _Reports(start, timeout, timeout_policy)
+    selector = selectors.DefaultSelector()
+    for fd in (out_r, err_r, report_r):
+        selector.register(fd, selectors.EVENT_READ)
+    timed_out = False
+    stopped_on = None  # "output_cap" or the kill pattern that matched
+    while selector.get_map() and stopped_on is None:
+        remaining = reports.deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in selector.select(remaining):
+            data = os.read(key.fd, 65536)
+            if not data:
+                selector.unregister(key.fd)
+            elif key.fd == report_r:
+                reports.feed(data)  # the solver reports are never cut
+            else:
+                stopped_on = output[key.fd].feed(data)
+                if stopped_on is None and kill_output_bytes is not None and output[key.fd].size > kill_output_bytes:
+                    stopped_on = "output_cap"
+                if stopped_on is not None:
+                    break
+    selector.close()
+
+    # The child may close its output and keep running, so the deadline also applies to its exit
+    while not timed_out and stopped_on is None:
+        done, status, usage = os.wait4(pid, os.WNOHANG)
+        if done:
+            break
+        if time.monotonic() >= reports.deadline:
+            timed_out = True
+        else:
+            time.sleep(0.005)
+    if timed_out or stopped_on is not None:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        _, status, usage = os.wait4(pid, 0)
+    wall_time = time.monotonic() - start
+    for fd in (out_r, err_r, report_r):
+        os.close(fd)
+
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "stdout": output[out_r].text(),
+        "stderr": output[err_r].text(),
+        "timed_out": timed_out,
+        "stopped_on": stopped_on,
+        "wall_time": wall_time,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "peak_rss_mb": usage.ru_maxrss / 1024,  # ru_maxrss is in KB on Linux
+        "stdout_bytes": output[out_r].size,
+        "stderr_bytes": output[err_r].size,
+        "truncated": output[out_r].truncated or output[err_r].truncated,
+        "solves": reports.finish(timed_out),
+        "returned": reports.returned,
+    }
+
+
+def main():
+    # Keep the request/reply pipes private and send anything the libraries print to stderr
+    request_fd, reply_fd = os.dup(0), os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    import solver_harness  # next to this file, which is sys.path[0] of the worker
+
+    preloaded = []
+    for name in sys.argv[1:]:
+        try:
+            importlib.import_module(name)
+            preloaded.append(name)
+        except Exception:
+            pass
+    write_message(reply_fd, {"ready": True, "pid": os.getpid(), "preloaded": preloaded})
+
+    while True:
+        try:
+            request = read_message(request_fd)
+        except EOFError:
+            return  # the pool closed the pipe
+        write_message(reply_fd, execute(**request, private_fds=(request_fd, reply_fd)))
+
+
+if __name__ == "__main__":
+    main()
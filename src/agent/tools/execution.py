@@ -0,0 +1,228 @@
+import signal
+from dataclasses import asdict, dataclass, field, fields
+from typing import List, Optional, Tuple
+
+from src.agent.tools.cores import CoreAllocator
+from src.agent.tools.exec_cache import ExecutionCache
+from src.agent.tools.verifier import verify_solve
+from src.agent.tools.worker_pool import WorkerError, WorkerPool, run_once
+
+
+@dataclass(frozen=True)
+class TimeoutPolicy:
+    """
+    Adaptive wall-clock budget that replaces the fixed ExecutionLimits.timeout.
+
+    Every solver call gets min_solve_seconds plus a share per thousand variables and constraints
+    (at most max_solve_seconds), set as the solver's own time limit so it returns its incumbent
+    when the budget runs out. CP-SAT searches that found a solution are also stopped once neither
+    the incumbent nor the bound improved for stall_seconds. The process is killed grace_seconds
+    after a solve's budget, after setup_seconds outside solver calls, or after max_total_seconds.
+    """
+    setup_seconds: float = 15.0  # model building and printing, from the start or the end of the last solve
+    min_solve_seconds: float = 5.0
+    seconds_per_1k_variables: float = 2.0
+    seconds_per_1k_constraints: float = 1.0
+    max_solve_seconds: float = 120.0
+    stall_seconds: Optional[float] = 20.0  # None to let CP-SAT use its whole budget
+    grace_seconds: float = 5.0
+    max_total_seconds: float = 300.0
+
+
+@dataclass(frozen=True)
+class ExecutionLimits:
+    """Resource limits enforced on the process that runs generated code."""
+    timeout: float = 30.0  # wall-clock seconds before the process group is killed
+    timeout_policy: Optional[TimeoutPolicy] = None  # adaptive timeout used instead of `timeout`
+    memory_mb: Optional[int] = None  # RLIMIT_AS (address space) above the process's own at start, None for no limit
+    cpu_seconds: Optional[int] = None  # RLIMIT_CPU, None for no limit (solvers may use several cores)
+    max_output_bytes: Optional[int] = 64_000  # per stream, only its first and last halves are kept
+    kill_output_bytes: Optional[int] = None  # stop the process once a stream wrote more, None for no limit
+    kill_patterns: Tuple[str, ...] = ()  # regular expressions that stop the process when its output matches
+    python: str = "python"  # interpreter used when no WorkerPool is given
+
+
+# Solver statuses reported by the solver harness
+SOLVED_STATUSES = ("optimal", "feasible")
+NO_SOLUTION_STATUSES = ("infeasible", "unbounded", "invalid", "not_solved")
+
+
+def best_solve(solves: List[dict]) -> Optional[dict]:
+    """The first optimal solve, else the first feasible one, or None when no solve found a solution."""
+    for status in SOLVED_STATUSES:
+        for solve in solves or []:
+            if solve.get("status") == status:
+                return solve
+    return None
+
+
+@dataclass
+class ExecutionResult:
+    """Outcome of one execution of generated code."""
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    timed_out: bool = False
+    stopped_on: Optional[str] = None  # "output_cap" or the kill pattern that stopped the process
+    wall_time: float = 0.0  # seconds
+    cpu_time: float = 0.0  # user + system seconds of the process and its children
+    peak_rss_mb: float = 0.0
+    stdout_bytes: int = 0  # bytes written, including those omitted from stdout by the output cap
+    stderr_bytes: int = 0
+    truncated: bool = False
+    limit_exceeded: Optional[str] = None  # "timeout" | "cpu" | "memory" | "output" | "pattern"
+    error: Optional[str] = None  # the executor itself failed
+    solves: List[dict] = field(default_factory=list)  # one record per intercepted solver call, see solver_harness.py and _verified
+    cached: bool = False  # served from the ExecutionCache instead of being run
+    variants: List[dict] = field(default_factory=list)  # per formulation variant run in parallel (name, success, status, objective)
+    returned: Optional[str] = None  # with an entry function, its pickled return value (base64), see exec_worker.py
+    threads: Optional[int] = None  # solver thread budget granted by the CoreAllocator
+    limits: ExecutionLimits = field(default_factory=ExecutionLimits, repr=False)
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0 and self.limit_exceeded is None and self.error is None
+
+    def to_text(self) -> str:
+        """The execution result in the SUCCESS/ERROR text format used by the gates and prompts."""
+        if self.error is not None:
+            return f"ERROR: Execution error - {self.error}"
+        if self.limit_exceeded == "timeout":
+            if self.limits.timeout_policy is None:
+                text = f"ERROR: Code execution timed out ({self.limits.timeout:g} seconds)"
+            else:
+                text = f"ERROR: Code execution timed out after {self.wall_time:.0f} seconds (adaptive timeout)"
+            for solve in self.solves:
+                if solve.get("interrupted"):
+                    text += (
+                        f"\nThe {solve['library']} solve was interrupted with a feasible, not proven optimal, solution:"
+                        f" objective {solve.get('objective')}, best bound {solve.get('bound')}"
+                    )
+            return text
+        # Output beyond max_output_bytes is already cut from the middle of stdout/stderr with a marker
+        if self.limit_exceeded == "memory":
+            return f"ERROR: Code execution exceeded the memory limit ({self.limits.memory_mb} MB)\n{self.stderr}"
+        if self.limit_exceeded == "cpu":
+            return f"ERROR: Code execution exceeded the CPU time limit ({self.limits.cpu_seconds} seconds)\n{self.stderr}"
+        if self.limit_exceeded == "output":
+            return f"ERROR: Code execution stopped after writing more than {self.limits.kill_output_bytes} bytes of output\n{self.stdout}\n{self.stderr}"
+        if self.limit_exceeded == "pattern":
+            return f"ERROR: Code execution stopped because its output matched {self.stopped_on!r}\n{self.stdout}\n{self.stderr}"
+        if self.returncode == 0:
+            budget = "".join(
+                f"\n[{solve['library']} stopped at its {solve['budget']:.0f}s time budget ({solve['soft_timeout']}), status {solve['status']}]"
+                for solve in self.solves
+                if solve.get("soft_timeout")
+            )
+            return f"SUCCESS:\n{self.stdout}{budget}"
+        return f"ERROR:\n{self.stderr}"
+
+    def metrics(self) -> dict:
+        """Resource usage of the execution and its solver statuses, without the captured output or variable values."""
+        metrics = asdict(self)
+        for key in ("stdout", "stderr", "limits", "returned"):
+            metrics.pop(key)
+        metrics["solves"] = [{k: v for k, v in solve.items() if k != "variables"} for solve in self.solves]
+        metrics["success"] = self.success
+        return metrics
+
+
+def _limit_exceeded(result: dict, limits: ExecutionLimits) -> Optional[str]:
+    if result["timed_out"]:
+        return "timeout"
+    if result["stopped_on"] == "output_cap":
+        return "output"
+    if result["stopped_on"] is not None:
+        return "pattern"
+    if limits.cpu_seconds and (
+        result["returncode"] == -signal.SIGXCPU
+        or (result["returncode"] == -signal.SIGKILL and result["cpu_time"] >= limits.cpu_seconds)
+    ):
+        return "cpu"
+    if limits.memory_mb and result["returncode"] != 0 and ("MemoryError" in result["stderr"] or "bad_alloc" in result["stderr"]):
+        return "memory"
+    return None
+
+
+def _request(limits: ExecutionLimits) -> dict:
+    return {
+        "timeout": limits.timeout,
+        "memory_mb": limits.memory_mb,
+        "cpu_seconds": limits.cpu_seconds,
+        "max_output_bytes": limits.max_output_bytes,
+        "kill_output_bytes": limits.kill_output_bytes,
+        "kill_patterns": list(limits.kill_patterns),
+        "timeout_policy": asdict(limits.timeout_policy) if limits.timeout_policy is not None else None,
+    }
+
+
+def _result(result: dict, limits: ExecutionLimits) -> ExecutionResult:
+    return ExecutionResult(**result, limit_exceeded=_limit_exceeded(result, limits), limits=limits)
+
+
+# Fields of an ExecutionResult stored by the ExecutionCache
+_CACHED_FIELDS = [f.name for f in fields(ExecutionResult) if f.name not in ("limits", "cached")]
+
+
+def _verified(solve: dict) -> dict:
+    """
+    A solver record without its exported model: a solved record carries the verify_solve report
+    instead, so the model (up to MAX_EXPORTED_NONZEROS coefficients) never reaches the state, the
+    fan-out candidates or the ExecutionCache.
+    """
+    record = {k: v for k, v in solve.items() if k != "model"}
+    if solve.get("status") in SOLVED_STATUSES:
+        record["verification"] = verify_solve(solve)
+    return record
+
+
+def _run(code: str, limits: ExecutionLimits, pool: WorkerPool = None, entry: str = None, threads: int = None) -> ExecutionResult:
+    try:
+        if pool is not None:
+            result = _result(pool.run(code, entry=entry, threads=threads, **_request(limits)), limits)
+        else:
+            result = _result(run_once(code, limits.python, entry=entry, threads=threads, **_request(limits)), limits)
+        result.solves = [_verified(solve) for solve in result.solves]
+        result.threads = threads
+        return result
+    except (WorkerError, OSError) as e:
+        return ExecutionResult(returncode=-1, error=str(e), limits=limits)
+
+
+def execute_code(
+    code: str,
+    limits: ExecutionLimits = None,
+    pool: WorkerPool = None,
+    cache: ExecutionCache = None,
+    entry: str = None,
+    cores: CoreAllocator = None,
+) -> ExecutionResult:
+    """
+    Executes a Python script in its own process under `limits`.
+
+    The script runs in a child forked from a warm worker of `pool` when given, otherwise from a
+    fresh `limits.python` interpreter. Memory (RLIMIT_AS, opt-in, counted above the address space
+    the child starts with) and CPU (RLIMIT_CPU) limits are applied to the child, its output is streamed and capped per stream (head and tail kept), and its CPU
+    time and peak RSS are measured. With a
+    `cache`, a script whose normalized code was already run returns the stored result instead.
+    With `entry`, the script is imported instead of run as __main__ and only that function is called
+    (its pickled return value is kept in `returned`).
+    With `cores`, every solver of the script is limited to the thread budget the allocator grants.
+    """
+    limits = limits or ExecutionLimits()
+    python = pool.python if pool is not None else limits.python
+    key = cache.key(code, limits, python, entry) if cache is not None else None
+    if key is not None:
+        stored = cache.lookup(key, _CACHED_FIELDS)
+        if stored is not None:
+            return ExecutionResult(**stored, cached=True, limits=limits)
+
+    if cores is None:
+        result = _run(code, limits, pool, entry)
+    else:
+        with cores.allocate() as threads:
+            result = _run(code, limits, pool, entry, threads)
+    if key is not None:
+        cache.update(key, result)
+    return result
+
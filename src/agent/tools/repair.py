@@ -0,0 +1,147 @@
+import re
+from typing import List, Optional, Tuple
+
+from src.agent.tools.exec_worker import SCRIPT_NAME
+
+MAX_TRACEBACK_LINES = 40
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+_FRAME = re.compile(r'^\s*File "([^"]+)", line \d+')
+_INDENT = re.compile(r"^\s*")
+
+
+class PatchError(ValueError):
+    """A diff that cannot be applied to the code it was written for."""
+
+
+def trim_traceback(execution_result: str, max_lines: int = MAX_TRACEBACK_LINES) -> str:
+    """
+    The last traceback of a failed execution, without the frames inside libraries (solver and
+    standard library internals), so only the generated script's frames and the exception remain.
+    Output without a traceback is reduced to its last `max_lines` lines.
+    """
+    lines = execution_result.splitlines()
+    start = max((i for i, line in enumerate(lines) if line.startswith("Traceback (most recent call last)")), default=None)
+    if start is None:
+        return "\n".join(lines[-max_lines:])
+
+    kept, skipping = [lines[start]], False
+    for line in lines[start + 1:]:
+        frame = _FRAME.match(line)
+        if frame:
+            library = frame.group(1) != SCRIPT_NAME
+            if library and not skipping:
+                kept.append(0)  # count of the run of library frames starting here
+            if library:
+                kept[-1] += 1
+            skipping = library
+        elif not line.startswith("    "):
+            skipping = False  # the exception line and any chained message
+        if not skipping:
+            kept.append(line)
+    kept = [f"  [... {line} library frames omitted ...]" if isinstance(line, int) else line for line in kept]
+    if len(kept) > max_lines:
+        kept = kept[:1] + ["  [...]"] + kept[-(max_lines - 2):]
+    return "\n".join(kept)
+
+
+def extract_diff(reply: str) -> Optional[str]:
+    """The unified diff of a repair reply (a ```diff block or bare hunks), or None when it has none."""
+    match = re.search(r"```(?:diff|patch|udiff)\s*\n(.*?)```", reply, re.DOTALL)
+    if match:
+        return match.group(1)
+    if re.search(r"^@@ ", reply, re.MULTILINE):
+        return reply
+    return None
+
+
+def _parse(diff: str) -> List[Tuple[Optional[int], List[Tuple[str, str]]]]:
+    """Hunks of a single-file diff as (old start line or None, [(op, text)]) with op in " ", "-", "+"."""
+    hunks = []
+    for line in diff.splitlines():
+        if line.startswith("@@"):
+            header = _HUNK_HEADER.match(line)
+            hunks.append((int(header.group(1)) if header else None, []))
+        elif not hunks or line.startswith("\\"):
+            continue  # file headers before the first hunk, "\ No newline at end of file"
+        elif line[:1] in (" ", "-", "+"):
+            hunks[-1][1].append((line[0], line[1:]))
+        else:
+            # Models often drop the leading space of blank or unchanged lines
+            hunks[-1][1].append((" ", line))
+    if not hunks or not any(op != " " for _, ops in hunks for op, _ in ops):
+        raise PatchError("the diff has no changes")
+    # Blank context lines around a hunk are mostly padding left by the model
+    for _, ops in hunks:
+        while ops and ops[-1] == (" ", ""):
+            ops.pop()
+        while ops and ops[0] == (" ", ""):
+            ops.pop(0)
+    return hunks
+
+
+def _find(lines: List[str], old: List[str], start: int, expected: Optional[int], normalize) -> Optional[int]:
+    """Index at or after `start` where `old` matches, the one closest to `expected` when it matches several times."""
+    target = [normalize(line) for line in old]
+    matches = [
+        i for i in range(start, len(lines) - len(old) + 1)
+        if [normalize(line) for line in lines[i:i + len(old)]] == target
+    ]
+    if not matches:
+        return None
+    return min(matches, key=lambda i: abs(i - expected)) if expected is not None else matches[0]
+
+
+def _reindent(text: str, hunk_indent: str, file_indent: str) -> str:
+    if hunk_indent != file_indent and text.startswith(hunk_indent):
+        return file_indent + text[len(hunk_indent):]
+    return text
+
+
+def apply_unified_diff(source: str, diff: str) -> str:
+    """
+    Applies a unified diff written by a model to `source`.
+
+    Hunks are located by their content rather than trusted line numbers: the context and removed
+    lines must match the code, ignoring trailing whitespace, or failing that any indentation (the
+    added lines are then re-indented to match). Hunks apply in order; when a hunk matches at
+    several places the one closest to its header's line number is used. Raises PatchError when a
+    hunk matches nowhere.
+    """
+    lines = source.splitlines()
+    position, shift = 0, 0  # where the next hunk may start, lines added minus removed so far
+    for number, (old_start, ops) in enumerate(_parse(diff), 1):
+        old = [text for op, text in ops if op != "+"]
+        expected = old_start - 1 + shift if old_start is not None else None
+        if not old:
+            # Pure insertion after line old_start
+            if old_start is None:
+                raise PatchError(f"hunk {number} adds lines without context or a line number")
+            index, fuzzy = min(max(old_start + shift, position), len(lines)), False
+        else:
+            index, fuzzy = _find(lines, old, position, expected, str.rstrip), False
+            if index is None:
+                index, fuzzy = _find(lines, old, position, expected, str.strip), True
+            if index is None:
+                first = next((text for text in old if text.strip()), old[0])
+                raise PatchError(f"hunk {number} does not match the code (near {first.strip()!r})")
+
+        hunk_indent = file_indent = ""
+        if fuzzy:
+            pairs = [(text, lines[index + j]) for j, text in enumerate(old) if text.strip()]
+            if pairs:
+                hunk_indent, file_indent = (_INDENT.match(pairs[0][0]).group(), _INDENT.match(pairs[0][1]).group())
+
+        replacement, j = [], 0
+        for op, text in ops:
+            if op == " ":
+                replacement.append(lines[index + j])  # unchanged lines are kept exactly as in the code
+                j += 1
+            elif op == "-":
+                j += 1
+            else:
+                replacement.append(_reindent(text, hunk_indent, file_indent))
+        lines[index:index + len(old)] = replacement
+        position = index + len(replacement)
+        shift += len(replacement) - len(old)
+    return "\n".join(lines) + ("\n" if source.endswith("\n") else "")
@@ -0,0 +1,492 @@
+"""
+Solver harness installed by exec_worker.py in the child process before generated code runs.
+
+It wraps the solve entry points of the libraries generated models use:
+
+    ortools.linear_solver.pywraplp.Solver.Solve
+    ortools.sat.python.cp_model.CpSolver.solve (Solve and SolveWithSolutionCallback delegate to it)
+    pulp.LpProblem.solve
+
+and writes one JSON line per solve to the report pipe with the normalized status, objective value,
+best bound, solve time, model size and variable values. Solved models of at most
+MAX_EXPORTED_NONZEROS coefficients also carry their constraint rows, variable bounds, objective
+and full solution vector (the "model" field, see _export_linear), which the agent checks right after
+the execution against every constraint without trusting the generated code's output. When a thread budget is given, every
+solver is limited to it before solving (CP-SAT num_workers, linear_solver SetNumThreads, CBC
+threads), whatever the generated code configured. Libraries the worker has already imported
+are patched right away; the others are patched as soon as the generated code imports them.
+
+With an adaptive timeout policy (the TimeoutPolicy fields of src/agent/tools/execution.py), each
+solve gets a time budget sized from its variable and constraint counts. It is reported to the
+worker in a "start" event, so the worker can move its kill deadline, and set as the solver's own
+time limit, so a solver that runs out of time returns its best incumbent instead of being killed.
+CP-SAT searches also report every incumbent in an "incumbent" event and are stopped once neither
+the incumbent nor the bound improved for the policy's stall_seconds.
+
+Like exec_worker.py this file only uses the standard library and must not import anything from src.
+"""
+import importlib.abc
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+# Variable values reported per solve; larger models are cut to keep the report small
+MAX_REPORTED_VARIABLES = 1000
+# Constraint coefficients of the largest model exported for verification
+MAX_EXPORTED_NONZEROS = 50_000
+
+# Normalized statuses: "optimal" | "feasible" | "infeasible" | "unbounded" | "invalid" | "not_solved" | "error"
+_LINEAR_STATUSES = {0: "optimal", 1: "feasible", 2: "infeasible", 3: "unbounded", 4: "error", 5: "invalid", 6: "not_solved"}
+_CP_SAT_STATUSES = {0: "not_solved", 1: "invalid", 2: "feasible", 3: "infeasible", 4: "optimal"}
+_PULP_STATUSES = {1: "optimal", 0: "not_solved", -1: "infeasible", -2: "unbounded", -3: "error"}
+_PULP_SOLUTION_STATUSES = {2: "feasible"}  # pulp.LpSolutionIntegerFeasible
+
+_report_fd = None
+_threads = None  # per-execution solver thread budget, None to leave solvers at their defaults
+_policy = None  # adaptive timeout settings, None for the fixed timeout enforced by the worker
+_started = None
+
+
+def _number(value):
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _report(record: dict):
+    if _report_fd is not None:
+        os.write(_report_fd, (json.dumps(record) + "\n").encode())
+
+
+def _variables(pairs) -> dict:
+    values = {}
+    for name, value in pairs:
+        if len(values) >= MAX_REPORTED_VARIABLES:
+            break
+        values[name] = _number(value)
+    return values
+
+
+def _bound(value):
+    """A finite bound, or None for an infinite one (CP-SAT marks them with the int64 extremes)."""
+    value = _number(value)
+    return value if value is not None and abs(value) < 2**62 else None
+
+
+def _export(export, *args):
+    """The exported model, or None when it is too large or could not be read."""
+    try:
+        return export(*args)
+    except Exception:
+        return None
+
+
+def _solved(record: dict) -> bool:
+    return record["status"] in ("optimal", "feasible")
+
+
+def _solve_budget(num_variables: int, num_constraints: int) -> float:
+    """Seconds a solve of this size may take under the policy, within what is left of the total budget."""
+    budget = (
+        _policy["min_solve_seconds"]
+        + _policy["seconds_per_1k_variables"] * num_variables / 1000
+        + _policy["seconds_per_1k_constraints"] * num_constraints / 1000
+    )
+    remaining = _policy["max_total_seconds"] - _policy["grace_seconds"] - (time.monotonic() - _started)
+    return max(0.1, min(budget, _policy["max_solve_seconds"], remaining))
+
+
+def _intercept(cls, method_name: str, library: str, describe, size, prepare):
+    """
+    Replaces cls.method_name with a wrapper that calls prepare(self, args, kwargs, budget) ->
+    (args, kwargs, monitor) before and reports describe(self, args, kwargs, result) after every
+    call. size(self, args, kwargs) -> (num_variables, num_constraints) sizes the time budget.
+    """
+    original = getattr(cls, method_name)
+    if getattr(original, "_rora_harness", False):
+        return
+
+    def wrapper(self, *args, **kwargs):
+        budget = None
+        if _policy is not None:
+            num_variables, num_constraints = size(self, args, kwargs)
+            budget = _solve_budget(num_variables, num_constraints)
+            _report({"event": "start", "library": library, "budget": budget, "num_variables": num_variables, "num_constraints": num_constraints})
+        args, kwargs, monitor = prepare(self, args, kwargs, budget)
+        start = time.monotonic()
+        try:
+            result = original(self, *args, **kwargs)
+        except Exception as e:
+            _report({"library": library, "status": "error", "error": f"{type(e).__name__}: {e}", "solve_time": time.monotonic() - start})
+            raise
+        finally:
+            stopped = monitor.close() if monitor is not None else None
+        solve_time = time.monotonic() - start
+        try:
+            record = {"library": library, "solve_time": solve_time, **describe(self, args, kwargs, result)}
+            # Stopped by the budget rather than by proving optimality or infeasibility
+            if budget is not None and record["status"] in ("feasible", "not_solved") and (stopped or solve_time >= 0.95 * budget):
+                record["soft_timeout"] = stopped or "time_limit"
+                record["budget"] = budget
+        except Exception as e:
+            record = {"library": library, "status": "unknown", "error": f"harness: {type(e).__name__}: {e}", "solve_time": solve_time}
+        _report(record)
+        return result
+
+    wrapper._rora_harness = True
+    setattr(cls, method_name, wrapper)
+
+
+def _describe_linear(solver, args, kwargs, status):
+    record = {
+        "status": _LINEAR_STATUSES.get(status, "unknown"),
+        "num_variables": solver.NumVariables(),
+        "num_constraints": solver.NumConstraints(),
+    }
+    if _solved(record):
+        objective = solver.Objective()
+        record["objective"] = _number(objective.Value())
+        record["bound"] = _number(objective.BestBound())
+        record["variables"] = _variables((v.name(), v.solution_value()) for v in solver.variables())
+        record["model"] = _export(_export_linear, solver)
+    return record
+
+
+def _describe_cp_sat(solver, args, kwargs, status):
+    model = args[0] if args else kwargs["model"]
+    proto = model.Proto()
+    record = {
+        "status": _CP_SAT_STATUSES.get(int(status), "unknown"),
+        "num_variables": len(proto.variables),
+        "num_constraints": len(proto.constraints),
+    }
+    if _solved(record):
+        if proto.HasField("objective") or proto.HasField("floating_point_objective"):
+            record["objective"] = _number(solver.ObjectiveValue())
+            record["bound"] = _number(solver.BestObjectiveBound())
+        solution = solver.ResponseProto().solution
+        record["variables"] = _variables(
+            (var.name or f"x{i}", solution[i]) for i, var in enumerate(proto.variables) if i < len(solution)
+        )
+        record["model"] = _export(_export_cp_sat, proto, solution)
+    return record
+
+
+def _describe_pulp(problem, args, kwargs, status):
+    import pulp
+
+    record = {
+        "status": _PULP_SOLUTION_STATUSES.get(getattr(problem, "sol_status", None)) or _PULP_STATUSES.get(status, "unknown"),
+        "num_variables": len(problem.variables()),
+        "num_constraints": len(problem.constraints),
+    }
+    if _solved(record):
+        record["objective"] = _number(pulp.value(problem.objective)) if problem.objective is not None else None
+        record["variables"] = _variables((v.name, v.varValue) for v in problem.variables())
+        record["model"] = _export(_export_pulp, problem)
+    return record
+
+
+def _export_linear(solver):
+    """
+    The solved model in the form checked by src/agent/tools/verifier.py:
+
+        variables    [{"name", "lb", "ub", "integer"}], None for an infinite bound
+        values       solution value of every variable, in the same order
+        constraints  [{"name", "vars", "coeffs", "offset", "domain", "enforcement"}]: the row is
+                     satisfied when sum(coeffs * x[vars]) + offset lies in one of the [lo, hi]
+                     intervals of the flat `domain`, or when one of its enforcement literals is false.
+                     A negative reference -i-1 stands for -x[i] in vars and for 1 - x[i] as a literal.
+                     Rows with kind "all_different" instead list `exprs` whose values must differ.
+        objective    {"vars", "coeffs", "offset", "scale"}: scale * (sum(coeffs * x[vars]) + offset)
+        unchecked    constraints of kinds the verifier cannot evaluate
+    """
+    from ortools.linear_solver import linear_solver_pb2
+
+    proto = linear_solver_pb2.MPModelProto()
+    solver.ExportModelToProto(proto)
+    if sum(len(c.var_index) for c in proto.constraint) > MAX_EXPORTED_NONZEROS:
+        return None
+    objective = [(i, v.objective_coefficient) for i, v in enumerate(proto.variable) if v.objective_coefficient]
+    return {
+        "variables": [
+            {"name": v.name, "lb": _bound(v.lower_bound), "ub": _bound(v.upper_bound), "integer": v.is_integer}
+            for v in proto.variable
+        ],
+        "values": [_number(v.solution_value()) for v in solver.variables()],
+        "constraints": [
+            {"name": c.name, "vars": list(c.var_index), "coeffs": list(c.coefficient), "domain": [_bound(c.lower_bound), _bound(c.upper_bound)]}
+            for c in proto.constraint
+        ],
+        "objective": {"vars": [i for i, _ in objective], "coeffs": [c for _, c in objective], "offset": proto.objective_offset, "scale": 1.0},
+        "unchecked": len(proto.general_constraint) + int(proto.HasField("quadratic_objective")),
+    }
+
+
+def _literal_row(name: str, literals, domain, enforcement) -> dict:
+    """Linear row over boolean literals: a negated literal -i-1 adds 1 - x[i]."""
+    return {
+        "name": name,
+        "vars": list(literals),  # -i-1 reads as -x[i], the offset adds the 1
+        "coeffs": [1] * len(literals),
+        "offset": sum(1 for l in literals if l < 0),
+        "domain": domain,
+        "enforcement": enforcement,
+    }
+
+
+def _export_cp_sat(proto, solution):
+    """The solved CP-SAT model, see _export_linear. Linear, boolean and all_different constraints are exported."""
+    if sum(len(c.linear.vars) for c in proto.constraints) > MAX_EXPORTED_NONZEROS or len(solution) != len(proto.variables):
+        return None
+    constraints, unchecked = [], 0
+    for i, ct in enumerate(proto.constraints):
+        name = ct.name or f"c{i}"
+        kind = ct.WhichOneof("constraint")
+        enforcement = list(ct.enforcement_literal)
+        if kind == "linear":
+            constraints.append({
+                "name": name, "vars": list(ct.linear.vars), "coeffs": list(ct.linear.coeffs), "offset": 0,
+                "domain": [_bound(d) for d in ct.linear.domain], "enforcement": enforcement,
+            })
+        elif kind == "bool_or":
+            constraints.append(_literal_row(name, ct.bool_or.literals, [1, None], enforcement))
+        elif kind == "bool_and":
+            constraints.extend(_literal_row(name, [l], [1, 1], enforcement) for l in ct.bool_and.literals)
+        elif kind == "at_most_one":
+            constraints.append(_literal_row(name, ct.at_most_one.literals, [None, 1], enforcement))
+        elif kind == "exactly_one":
+            constraints.append(_literal_row(name, ct.exactly_one.literals, [1, 1], enforcement))
+        elif kind == "all_diff":
+            exprs = [{"vars": list(e.vars), "coeffs": list(e.coeffs), "offset": e.offset} for e in ct.all_diff.exprs]
+            constraints.append({"name": name, "kind": "all_different", "exprs": exprs, "enforcement": enforcement})
+        else:
+            unchecked += 1
+    if proto.HasField("floating_point_objective"):
+        objective = proto.floating_point_objective
+        objective = {"vars": list(objective.vars), "coeffs": list(objective.coeffs), "offset": objective.offset, "scale": 1.0}
+    else:
+        objective = proto.objective
+        objective = {"vars": list(objective.vars), "coeffs": list(objective.coeffs), "offset": objective.offset, "scale": objective.scaling_factor or 1.0}
+    return {
+        "variables": [
+            {"name": v.name or f"x{i}", "lb": _bound(v.domain[0]), "ub": _bound(v.domain[-1]), "integer": True}
+            for i, v in enumerate(proto.variables)
+        ],
+        "values": [float(value) for value in solution],
+        "constraints": constraints,
+        "objective": objective,
+        "unchecked": unchecked,
+    }
+
+
+def _export_pulp(problem):
+    """The solved PuLP model, see _export_linear."""
+    variables = problem.variables()
+    if sum(len(c) for c in problem.constraints.values()) > MAX_EXPORTED_NONZEROS or any(v.varValue is None for v in variables):
+        return None
+    index = {v.name: i for i, v in enumerate(variables)}
+    constraints = []
+    for name, constraint in problem.constraints.items():
+        # expression (sense) 0, with sense 1 for >=, -1 for <= and 0 for ==
+        items = list(constraint.items())
+        rhs = -constraint.constant
+        domain = {1: [rhs, None], -1: [None, rhs], 0: [rhs, rhs]}[constraint.sense]
+        constraints.append({"name": name, "vars": [index[v.name] for v, _ in items], "coeffs": [c for _, c in items], "domain": domain})
+    objective = problem.objective
+    items = list(objective.items()) if objective is not None else []
+    return {
+        "variables": [
+            {"name": v.name, "lb": _bound(v.lowBound), "ub": _bound(v.upBound), "integer": v.cat == "Integer"}
+            for v in variables
+        ],
+        "values": [float(v.varValue) for v in variables],
+        "constraints": constraints,
+        "objective": {
+            "vars": [index[v.name] for v, _ in items], "coeffs": [c for _, c in items],
+            "offset": objective.constant if objective is not None else 0.0, "scale": 1.0,
+        },
+        "unchecked": 0,
+    }
+
+
+def _size_linear(solver, args, kwargs):
+    return solver.NumVariables(), solver.NumConstraints()
+
+
+def _size_cp_sat(solver, args, kwargs):
+    proto = (args[0] if args else kwargs["model"]).Proto()
+    return len(proto.variables), len(proto.constraints)
+
+
+def _size_pulp(problem, args, kwargs):
+    return len(problem.variables()), len(problem.constraints)
+
+
+class _CpSatMonitor:
+    """Reports CP-SAT incumbents and stops the search once neither the incumbent nor the bound improves."""
+
+    def __init__(self, solver, size):
+        self.solver = solver
+        self.size = size
+        self.start = time.monotonic()
+        self.stalled = False
+        self._has_incumbent = False
+        self._progress = self.start
+        self._done = threading.Event()
+        self._max_time = solver.parameters.max_time_in_seconds
+        self._bound_callback = solver.best_bound_callback
+        solver.best_bound_callback = self._on_bound
+        if _policy.get("stall_seconds"):
+            threading.Thread(target=self._watch, args=(_policy["stall_seconds"],), daemon=True).start()
+
+    def _on_bound(self, bound):
+        self._progress = time.monotonic()
+        if self._bound_callback is not None:
+            self._bound_callback(bound)
+
+    def on_solution(self, objective, bound):
+        self._has_incumbent = True
+        self._progress = time.monotonic()
+        _report({
+            "event": "incumbent",
+            "library": "ortools.sat",
+            "objective": _number(objective),
+            "bound": _number(bound),
+            "num_variables": self.size[0],
+            "num_constraints": self.size[1],
+            "solve_time": self._progress - self.start,
+        })
+
+    def _watch(self, stall_seconds: float):
+        while not self._done.wait(0.25):
+            if self._has_incumbent and time.monotonic() - self._progress > stall_seconds:
+                self.stalled = True
+                self.solver.stop_search()
+                return
+
+    def close(self):
+        self._done.set()
+        self.solver.parameters.max_time_in_seconds = self._max_time
+        self.solver.best_bound_callback = self._bound_callback
+        return "stalled" if self.stalled else None
+
+
+def _incumbent_callback(monitor: _CpSatMonitor):
+    from ortools.sat.python import cp_model
+
+    class IncumbentCallback(cp_model.CpSolverSolutionCallback):
+        def on_solution_callback(self):
+            monitor.on_solution(self.ObjectiveValue(), self.BestObjectiveBound())
+
+    return IncumbentCallback()
+
+
+def _limit_linear(solver, args, kwargs, budget):
+    if _threads is not None:
+        solver.SetNumThreads(_threads)  # ignored by single-threaded backends such as GLOP
+    if budget is not None:
+        solver.SetTimeLimit(int(budget * 1000))  # replaces a limit set by the code, which cannot be read back
+    return args, kwargs, None
+
+
+def _limit_cp_sat(solver, args, kwargs, budget):
+    params = solver.parameters
+    if _threads is not None:
+        # CP-SAT rejects num_search_workers (deprecated) and num_workers set together; keep a smaller requested count
+        requested = params.num_workers or params.num_search_workers
+        params.num_search_workers = 0
+        params.num_workers = min(requested, _threads) if requested else _threads
+    if budget is None:
+        return args, kwargs, None
+
+    model = args[0] if args else kwargs["model"]
+    monitor = _CpSatMonitor(solver, _size_cp_sat(solver, (model,), {}))
+    params.max_time_in_seconds = min(params.max_time_in_seconds, budget)
+    # Incumbents are only observed when the code does not pass its own solution callback
+    callback = args[1] if len(args) > 1 else kwargs.get("solution_callback")
+    if callback is None and model.HasObjective():
+        args, kwargs = (model, _incumbent_callback(monitor)), {}
+    return args, kwargs, monitor
+
+
+def _limit_pulp(problem, args, kwargs, budget):
+    import pulp
+
+    if args:
+        solver, args = args[0], args[1:]
+    else:
+        solver = kwargs.pop("solver", None)
+    solver = solver or problem.solver or pulp.LpSolverDefault
+    if _threads is not None and isinstance(getattr(solver, "optionsDict", None), dict):
+        solver.optionsDict["threads"] = _threads  # passed to CBC as -threads
+    if budget is not None and hasattr(solver, "timeLimit"):
+        solver.timeLimit = min(solver.timeLimit or budget, budget)
+    return (solver, *args), kwargs, None
+
+
+def _patch_linear_solver(module):
+    _intercept(module.Solver, "Solve", "ortools.linear_solver", _describe_linear, _size_linear, _limit_linear)
+
+
+def _patch_cp_sat(module):
+    _intercept(module.CpSolver, "solve", "ortools.sat", _describe_cp_sat, _size_cp_sat, _limit_cp_sat)
+
+
+def _patch_pulp(module):
+    _intercept(module.LpProblem, "solve", "pulp", _describe_pulp, _size_pulp, _limit_pulp)
+
+
+PATCHES = {
+    "ortools.linear_solver.pywraplp": _patch_linear_solver,
+    "ortools.sat.python.cp_model": _patch_cp_sat,
+    "pulp.pulp": _patch_pulp,
+}
+
+
+class _PostImportHook(importlib.abc.MetaPathFinder):
+    """Patches a target module right after it has been executed by its loader."""
+
+    def find_spec(self, name, path=None, target=None):
+        if name not in PATCHES:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        exec_module = spec.loader.exec_module
+
+        def exec_and_patch(module):
+            exec_module(module)
+            PATCHES[name](module)
+
+        spec.loader.exec_module = exec_and_patch
+        return spec
+
+
+def install(report_fd: int, threads: int = None, timeout_policy: dict = None):
+    """
+    Intercepts solver calls in this process, reporting them on `report_fd`, limiting them to
+    `threads` and giving each one a time budget under `timeout_policy`.
+    """
+    global _report_fd, _threads, _policy, _started
+    _report_fd = report_fd
+    _threads = threads
+    _policy = timeout_policy
+    _started = time.monotonic()
+    if threads is not None:
+        # Native libraries that read these at startup (OpenMP, BLAS) follow the same budget
+        for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[variable] = str(threads)
+    for name, patch in PATCHES.items():
+        if name in sys.modules:
+            patch(sys.modules[name])
+    sys.meta_path.insert(0, _PostImportHook())
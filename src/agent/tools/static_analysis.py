@@ -0,0 +1,333 @@
+import ast
+import builtins
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Set
+
+# Method names that solve a model in OR-Tools and PuLP
+SOLVE_METHODS = {"Solve", "solve", "SolveWithSolutionCallback", "Solve_With_Solution_Callback", "SearchForAllSolutions"}
+
+# Fully qualified constructors of a solver or model, after import aliases are resolved
+SOLVER_CONSTRUCTORS = {
+    "ortools.linear_solver.pywraplp.Solver",
+    "ortools.linear_solver.pywraplp.Solver.CreateSolver",
+    "ortools.sat.python.cp_model.CpModel",
+    "pulp.LpProblem",
+    "pulp.pulp.LpProblem",
+}
+# Modules whose ways of creating a solver or model are all in SOLVER_CONSTRUCTORS; other OR-Tools
+# APIs (model_builder, math_opt, ...) build models the analyzer does not recognize
+UNDERSTOOD_MODULES = ("ortools.linear_solver.pywraplp", "ortools.sat.python.cp_model", "pulp")
+PULP_PROBLEM = {"pulp.LpProblem", "pulp.pulp.LpProblem"}
+PULP_VARIABLES = {"pulp.LpVariable", "pulp.LpVariable.dicts", "pulp.LpVariable.dict", "pulp.LpVariable.matrix"}
+
+# Methods that create decision variables (linear_solver and CP-SAT, both naming styles)
+VARIABLE_METHODS = {
+    "IntVar", "NumVar", "BoolVar", "Var", "IntVarArray", "NumVarArray", "BoolVarArray",
+    "NewIntVar", "NewBoolVar", "NewIntVarFromDomain", "NewIntervalVar", "NewOptionalIntervalVar",
+    "new_int_var", "new_bool_var", "new_int_var_from_domain", "new_interval_var", "new_optional_interval_var",
+}
+OBJECTIVE_METHODS = {"Minimize", "Maximize", "minimize", "maximize", "SetMinimization", "SetMaximization", "setObjective"}
+# Methods and attributes that read the solution
+SOLUTION_READS = {
+    "solution_value", "SolutionValue", "Value", "value", "Values", "BooleanValue", "boolean_value",
+    "ObjectiveValue", "objective_value", "BestObjectiveBound", "best_objective_bound", "varValue",
+}
+
+_MODULE_NAMES = {"__name__", "__file__", "__doc__", "__builtins__", "__spec__", "__loader__", "__package__", "__annotations__"}
+
+
+@dataclass(frozen=True)
+class Finding:
+    """A problem found in generated code; errors are certain failures, warnings are likely ones."""
+    severity: str  # "error" | "warning"
+    message: str
+    line: Optional[int] = None
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}" if self.line else self.message
+
+
+def _scope_nodes(body: List[ast.stmt]) -> Iterator[ast.AST]:
+    """Walks a function or module body without entering nested functions, classes or lambdas."""
+    stack = list(reversed(body))
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        stack.extend(reversed(list(ast.iter_child_nodes(node))))
+
+
+def _names(node: ast.AST) -> Set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Subscript, ast.Attribute, ast.Starred)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_solution_read(node: ast.AST) -> bool:
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in SOLUTION_READS) or (
+        isinstance(node, ast.Attribute) and node.attr == "varValue"
+    )
+
+
+def _read_names(node: ast.AST) -> Set[str]:
+    """Names read in an expression, except those whose solution value is read (x.solution_value(), solver.Value(x))."""
+    names, stack = set(), [node]
+    while stack:
+        node = stack.pop()
+        if _is_solution_read(node):
+            continue
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        stack.extend(ast.iter_child_nodes(node))
+    return names
+
+
+def _call_names(call: ast.Call) -> Set[str]:
+    """Names read in the arguments of a call."""
+    names = set()
+    for arg in [*call.args, *(keyword.value for keyword in call.keywords)]:
+        names |= _read_names(arg)
+    return names
+
+
+def _target_names(target: ast.AST) -> Set[str]:
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return set().union(*(_target_names(t) for t in target.elts)) if target.elts else set()
+    name = _root_name(target)
+    return {name} if name else set()
+
+
+class _Analyzer:
+    def __init__(self, tree: ast.Module):
+        self.tree = tree
+        self.findings: List[Finding] = []
+        self.aliases: Dict[str, str] = {}  # local name -> fully qualified module or attribute
+        self.star_modules: List[str] = []
+        self.imported: List[str] = []  # fully qualified modules and attributes the script imports
+        self.calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call)]
+
+    def run(self) -> List[Finding]:
+        self._resolve_imports()
+        if not any(q.split(".")[0] in ("ortools", "pulp") for q in [*self.aliases.values(), *self.star_modules]):
+            self._error("Code must import either OR-Tools or PuLP library")
+        self._check_undefined_names()
+        self._check_solver()
+        self._check_reads_before_solve()
+        self._check_unused_variables()
+        return sorted(self.findings, key=lambda f: (f.severity != "error", f.line or 0))
+
+    def _error(self, message: str, node: ast.AST = None):
+        self.findings.append(Finding("error", message, getattr(node, "lineno", None)))
+
+    def _warning(self, message: str, node: ast.AST = None):
+        self.findings.append(Finding("warning", message, getattr(node, "lineno", None)))
+
+    def _resolve_imports(self):
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    self.imported.append(alias.name)
+                    if alias.asname:
+                        self.aliases[alias.asname] = alias.name
+                    else:
+                        root = alias.name.split(".")[0]
+                        self.aliases[root] = root
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                for alias in node.names:
+                    if alias.name == "*":
+                        self.star_modules.append(node.module)
+                        self.imported.append(node.module)
+                    else:
+                        self.aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+                        self.imported.append(f"{node.module}.{alias.name}")
+        # Local names for imported attributes, e.g. Solver = pywraplp.Solver
+        for node in ast.walk(self.tree):
+            if (
+                isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, (ast.Name, ast.Attribute)) and _root_name(node.value) in self.aliases
+            ):
+                self.aliases[node.targets[0].id] = self.qualified(node.value)
+
+    def qualified(self, node: ast.AST) -> Optional[str]:
+        """Dotted name of a Name/Attribute chain with its root resolved through the imports."""
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        if node.id in self.aliases:
+            root = self.aliases[node.id]
+        elif self.star_modules:
+            root = f"{self.star_modules[0]}.{node.id}"
+        else:
+            root = node.id
+        return ".".join([root, *reversed(parts)])
+
+    def _understands_imports(self) -> bool:
+        """Every solver library the script imports is one whose solver and model constructors are known."""
+        return all(
+            any(name == module or name.startswith(f"{module}.") for module in UNDERSTOOD_MODULES)
+            for name in self.imported if name.split(".")[0] in ("ortools", "pulp")
+        )
+
+    def _is_constructor(self, call: ast.Call, names: Set[str]) -> bool:
+        return self.qualified(call.func) in names
+
+    def _check_undefined_names(self):
+        if self.star_modules:
+            return  # names may come from the star import
+        bound = set(dir(builtins)) | _MODULE_NAMES
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+                bound.add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                bound.add(node.name)
+            elif isinstance(node, ast.arg):
+                bound.add(node.arg)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                bound.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                bound.add(node.name)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                bound.update(node.names)
+            elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+                bound.add(node.name)
+            elif isinstance(node, ast.MatchMapping) and node.rest:
+                bound.add(node.rest)
+        reported = set()
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in bound and node.id not in reported:
+                reported.add(node.id)
+                self._error(f"name '{node.id}' is used but never defined or imported", node)
+
+    def _check_solver(self):
+        constructors = [call for call in self.calls if self._is_constructor(call, SOLVER_CONSTRUCTORS)]
+        if not constructors:
+            message = "no solver or model is created (pywraplp.Solver.CreateSolver, cp_model.CpModel or pulp.LpProblem)"
+            if self._understands_imports():
+                self._error(message)
+            else:
+                # The model may be built through an API the analyzer does not know
+                self._warning(f"{message}; check that the model built with the other solver APIs imported is solved")
+            return
+        solves = [call for call in self.calls if isinstance(call.func, ast.Attribute) and call.func.attr in SOLVE_METHODS]
+        if not solves:
+            self._error("the model is never solved (no Solve() / solve() call)", constructors[0])
+        if not self._has_objective():
+            self._warning("no objective is set, so the solver only looks for a feasible solution", constructors[0])
+
+    def _pulp_problems(self) -> Set[str]:
+        problems = set()
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call) and self._is_constructor(node.value, PULP_PROBLEM):
+                for target in node.targets:
+                    problems |= _target_names(target)
+        return problems
+
+    def _has_objective(self) -> bool:
+        if any(isinstance(call.func, ast.Attribute) and call.func.attr in OBJECTIVE_METHODS for call in self.calls):
+            return True
+        problems = self._pulp_problems()
+        for node in ast.walk(self.tree):
+            # prob += expression (not a comparison) or prob.objective = expression sets a PuLP objective
+            if isinstance(node, ast.AugAssign) and _root_name(node.target) in problems:
+                value = node.value.elts[0] if isinstance(node.value, ast.Tuple) and node.value.elts else node.value
+                if not isinstance(value, ast.Compare):
+                    return True
+            if isinstance(node, ast.Assign) and any(isinstance(t, ast.Attribute) and t.attr == "objective" for t in node.targets):
+                return True
+        return False
+
+    def _check_reads_before_solve(self):
+        scopes = [self.tree.body] + [node.body for node in ast.walk(self.tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        for body in scopes:
+            nodes = list(_scope_nodes(body))
+            solve_lines = [
+                node.lineno for node in nodes
+                if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in SOLVE_METHODS
+            ]
+            if not solve_lines:
+                continue
+            first_solve = min(solve_lines)
+            for node in nodes:
+                read = (
+                    isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in SOLUTION_READS
+                ) or (isinstance(node, ast.Attribute) and node.attr == "varValue" and isinstance(node.ctx, ast.Load))
+                if read and node.lineno < first_solve:
+                    attr = node.func.attr if isinstance(node, ast.Call) else node.attr
+                    self._error(f"solution value read with {attr} before the model is solved (line {first_solve})", node)
+                    break
+
+    def _creates_variable(self, node: ast.AST) -> bool:
+        return any(
+            isinstance(call, ast.Call)
+            and (
+                (isinstance(call.func, ast.Attribute) and call.func.attr in VARIABLE_METHODS)
+                or self._is_constructor(call, PULP_VARIABLES)
+            )
+            for call in ast.walk(node)
+        )
+
+    def _check_unused_variables(self):
+        created = {}  # name -> node where decision variables are stored in it
+        bindings = []  # (target names, names in the value) of every assignment, loop and comprehension
+        used = set()
+        problems = self._pulp_problems()
+
+        for node in ast.walk(self.tree):
+            if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+                target_nodes = node.targets if isinstance(node, ast.Assign) else [node.target]
+                targets = set().union(*(_target_names(t) for t in target_nodes))
+                bindings.append((targets, _names(node.value)))
+                if any(isinstance(t, (ast.Subscript, ast.Attribute)) for t in target_nodes):
+                    # Stored into a container or an object (d[k] = x, prob.objective = expr)
+                    used |= _read_names(node.value)
+                if self._creates_variable(node.value):
+                    for name in targets:
+                        created.setdefault(name, node)
+            elif isinstance(node, ast.AugAssign):
+                target = _root_name(node.target)
+                if target in problems:
+                    used |= _names(node.value)
+                bindings.append(({target}, _names(node.value)))
+            elif isinstance(node, (ast.For, ast.AsyncFor, ast.comprehension)):
+                bindings.append((_target_names(node.target), _names(node.iter)))
+            elif isinstance(node, ast.Call) and not _is_solution_read(node):
+                if isinstance(node.func, ast.Attribute) and node.func.attr == "append" and node.args and self._creates_variable(node.args[0]):
+                    created.setdefault(_root_name(node.func.value), node)
+                # Any call argument is a use: model methods (Add, SetCoefficient, Minimize, ...), helpers
+                # of the script that may constrain it, containers (vars.append(x)); solution reads are not
+                used |= _call_names(node)
+
+        # A variable is used when it reaches the model through intermediate expressions or containers
+        changed = True
+        while changed:
+            changed = False
+            for targets, values in bindings:
+                if targets & used and not values <= used:
+                    used |= values
+                    changed = True
+
+        for name, node in created.items():
+            if name is not None and name not in used:
+                self._warning(f"decision variable '{name}' is created but never used in a constraint or the objective", node)
+
+
+def analyze_code(tree: ast.Module) -> List[Finding]:
+    """
+    Static checks of a generated optimization script, errors first.
+
+    Import aliases are resolved so the solver construction (pywraplp, CP-SAT, PuLP) and the Solve()
+    call are found however the libraries were imported. Errors are failures the script would
+    certainly hit: a missing solver import, undefined names, no solver or model created (only when
+    every solver module imported is pywraplp, cp_model or pulp, a warning otherwise), a model that
+    is never solved, solution values read before the solve. Warnings flag likely modelling bugs:
+    decision variables never used in a constraint or the objective, and no objective.
+    """
+    return _Analyzer(tree).run()
@@ -1,81 +1,96 @@
 import ast
-import subprocess
-import tempfile
+import asyncio
+import re
 import os
+from functools import lru_cache
 
+import xxhash
 from langchain_core.tools import tool
 
+from src.agent.tools.exec_cache import normalize_code
+from src.agent.tools.execution import execute_code
+from src.agent.tools.static_analysis import Finding, analyze_code
 
-# Tool: code_validator (validates the generated code)
-@tool
-def code_validator(code: str) -> str:
-    """Validates Python code for syntax errors and basic issues."""
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_OBJECTIVE_PATTERNS = [
+    re.compile(r"objective[^:=\n]*[:=]\s*(" + _NUMBER + ")", re.IGNORECASE),  # "Objective value: 20", "'objective': 20.0"
+    re.compile(r"objective\D*?(" + _NUMBER + ")", re.IGNORECASE),
+]
+
+def extract_objective_value(execution_result: str):
+    """Returns the first objective value printed by the generated code, or None if none is found."""
+    for pattern in _OBJECTIVE_PATTERNS:
+        match = pattern.search(execution_result or "")
+        if match:
+            return float(match.group(1))
+    return None
+
+@lru_cache(maxsize=256)
+def extract_code(code: str) -> str:
+    """Extracts the Python code from a markdown reply (the first fenced block), or returns it unchanged."""
+    if "```python" in code:
+        return code.split("```python")[1].split("```")[0].strip()
+    elif "```" in code:
+        return code.split("```")[1].split("```")[0].strip()
+    return code
+
+def code_artifact(code_result: str) -> dict:
+    """
+    Canonical form of the generated code, computed once per code_result and kept in the state so
+    validation, execution and saving all use the same extracted source: the source itself and a
+    hash of its normalized AST (None when it does not parse).
+    """
+    source = extract_code(code_result)
+    normalized = normalize_code(source)
+    return {
+        "source": source,
+        "ast_hash": xxhash.xxh3_128_hexdigest(normalized.encode("utf-8")) if normalized is not None else None,
+    }
+
+def validate_code(code: str) -> str:
+    """
+    Validates extracted Python code with a static analysis pass (see static_analysis.analyze_code).
+
+    Returns "ERROR: ..." listing the failures the code would certainly hit, so it goes back to the
+    code expert without a critic call or an execution, "WARNING: ..." listing likely problems, or
+    "VALID: ...".
+    """
     try:
-        # Extract code from markdown if present
-        if "```python" in code:
-            code = code.split("```python")[1].split("```")[0].strip()
-        elif "```" in code:
-            code = code.split("```")[1].split("```")[0].strip()
-        
-        # Parse the code to check for syntax errors
-        ast.parse(code)
-        
-        # Basic checks
-        if (
-            ("import ortools" not in code and "from ortools" not in code) and
-            ("import pulp" not in code and "from pulp" not in code)
-        ):
-            return "ERROR: Code must import either OR-Tools or PuLP library"
-        
-        if "def main()" not in code and "if __name__" not in code:
-            return "WARNING: Code should have a main function or proper entry point"
-        
-        return "VALID: Code passed basic validation checks"
-        
+        tree = ast.parse(code)
     except SyntaxError as e:
         return f"ERROR: Syntax error - {str(e)}"
     except Exception as e:
         return f"ERROR: Validation error - {str(e)}"
 
+    findings = analyze_code(tree)
+    if not any(isinstance(node, ast.FunctionDef) and node.name == "main" for node in tree.body) and "if __name__" not in code:
+        findings.append(Finding("warning", "Code should have a main function or proper entry point"))
+    errors = [f"- {finding}" for finding in findings if finding.severity == "error"]
+    warnings = [f"- {finding}" for finding in findings if finding.severity == "warning"]
+    if errors:
+        return "\n".join(["ERROR: Static analysis found problems that make the code fail:", *errors, *warnings])
+    if warnings:
+        return "\n".join(["WARNING: Static analysis found possible problems:", *warnings])
+    return "VALID: Code passed static analysis checks"
+
+# Tool: code_validator (validates the generated code)
+@tool
+def code_validator(code: str) -> str:
+    """Validates Python code for syntax errors and basic issues."""
+    return validate_code(extract_code(code))
+
 # Tool: code_executor (executes code in sandbox)
 @tool
 def code_executor(code: str) -> str:
     """Executes Python code in a sandbox environment and returns the output."""
-    try:
-        # Extract code from markdown if present
-        if "```python" in code:
-            code = code.split("```python")[1].split("```")[0].strip()
-        elif "```" in code:
-            code = code.split("```")[1].split("```")[0].strip()
-        
-        #print("Code to execute:\n\n", code, "\n", "--"*60)
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
-        
-        try:
-            # Execute the code
-            result = subprocess.run(
-                ['python', temp_file],
-                capture_output=True,
-                text=True,
-                timeout=30  # 30 second timeout
-            )
-            
-            if result.returncode == 0:
-                return f"SUCCESS:\n{result.stdout}"
-            else:
-                return f"ERROR:\n{result.stderr}"
-                
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file)
-            
-    except subprocess.TimeoutExpired:
-        return "ERROR: Code execution timed out (30 seconds)"
-    except Exception as e:
-        return f"ERROR: Execution error - {str(e)}"
+    return execute_code(extract_code(code)).to_text()
+
+# Tool: acode_executor (async variant of code_executor, does not block the event loop)
+@tool
+async def acode_executor(code: str) -> str:
+    """Executes Python code in a sandbox environment without blocking the event loop and returns the output."""
+    return (await asyncio.to_thread(execute_code, extract_code(code))).to_text()
 
 # Tool: save_model_files (saves the model code and results)
 @tool
@@ -94,12 +109,7 @@ def save_model_files(description: str, model_name: str, code: str, math_formulat
         os.makedirs(problem_dir, exist_ok=True)
         
         # Extract clean code
-        if "```python" in code:
-            clean_code = code.split("```python")[1].split("```")[0].strip()
-        elif "```" in code:
-            clean_code = code.split("```")[1].split("```")[0].strip()
-        else:
-            clean_code = code
+        clean_code = extract_code(code)
         
         # Create the Python file with mathematical formulation as comments
         py_file_path = os.path.join(problem_dir, f"{model_name}.py")
@@ -0,0 +1,195 @@
+import ast
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import List
+
+from src.agent.tools.cores import CoreAllocator
+from src.agent.tools.exec_cache import ExecutionCache
+from src.agent.tools.execution import ExecutionLimits, ExecutionResult, best_solve, execute_code
+from src.agent.tools.static_analysis import SOLVE_METHODS
+from src.agent.tools.worker_pool import WorkerPool
+
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    return (
+        isinstance(node, ast.If)
+        and isinstance(node.test, ast.Compare)
+        and isinstance(node.test.left, ast.Name)
+        and node.test.left.id == "__name__"
+    )
+
+
+def _solves(func: ast.FunctionDef) -> bool:
+    return any(
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in SOLVE_METHODS
+        for node in ast.walk(func)
+    )
+
+
+def _independent(func: ast.FunctionDef) -> bool:
+    """The function takes no required arguments and does not write module globals."""
+    args = func.args
+    required = len(args.posonlyargs) + len(args.args) - len(args.defaults)
+    required += sum(1 for default in args.kw_defaults if default is None)
+    return required == 0 and not any(isinstance(node, (ast.Global, ast.Nonlocal)) for node in ast.walk(func))
+
+
+def find_variants(source: str) -> List[str]:
+    """
+    Names of the independent model-building functions that `main()` calls, in call order.
+
+    A variant is a top-level function, other than main, that solves a model, takes no required
+    arguments and writes no globals, and that main only calls without arguments (anywhere in its
+    body, so main may print, compare or pass the results). The script must only run main() under
+    an `if __name__ == "__main__"` guard and make no other top-level calls (so its functions can be
+    imported and called on their own). Returns an empty list unless at least two variants are found.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return []
+
+    functions = {node.name: node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+    main = functions.get("main")
+    if main is None or not any(_is_main_guard(node) for node in tree.body):
+        return []
+    # Top-level calls outside the guard would run again in every variant process
+    if any(isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) for node in tree.body):
+        return []
+
+    calls = sorted(
+        (node for node in ast.walk(main) if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)),
+        key=lambda node: (node.lineno, node.col_offset),
+    )
+    with_arguments = {call.func.id for call in calls if call.args or call.keywords}
+    variants = []
+    for call in calls:
+        name = call.func.id
+        func = functions.get(name)
+        if (
+            func is None
+            or name == "main"
+            or name in variants
+            or name in with_arguments
+            or isinstance(func, ast.AsyncFunctionDef)
+            or not _solves(func)
+            or not _independent(func)
+        ):
+            continue
+        variants.append(name)
+    return variants if len(variants) >= 2 else []
+
+
+# Replaces each variant, before main() runs, with a stub that replays the output of its own run and
+# returns its result (unpickled again on every call, as a fresh object)
+_STUBS = """
+import base64 as _variant_base64, pickle as _variant_pickle, sys as _variant_sys
+# Classes of the script were pickled from the "generated_model" module of the entry runs
+_variant_sys.modules.setdefault("generated_model", _variant_sys.modules[__name__])
+
+
+def _variant_stub(stdout, stderr, returned):
+    def stub(*args, **kwargs):
+        _variant_sys.stdout.write(stdout)
+        _variant_sys.stderr.write(stderr)
+        return _variant_pickle.loads(_variant_base64.b64decode(returned))
+    return stub
+
+"""
+
+
+def stub_variants(source: str, variants: List[str], results: List[ExecutionResult]) -> str:
+    """The script with every variant replaced by a stub returning the result of its run, just before the main guard."""
+    tree = ast.parse(source)
+    guard = next(node for node in tree.body if _is_main_guard(node))
+    lines = source.splitlines(keepends=True)
+    stubs = _STUBS + "".join(
+        f"{name} = _variant_stub({result.stdout!r}, {result.stderr!r}, {result.returned!r})\n"
+        for name, result in zip(variants, results)
+    )
+    return "".join(lines[:guard.lineno - 1]) + stubs + "\n\n" + "".join(lines[guard.lineno - 1:])
+
+
+def _variant_summary(name: str, result: ExecutionResult) -> dict:
+    solve = best_solve(result.solves)
+    statuses = [s.get("status") for s in result.solves]
+    return {
+        "name": name,
+        "success": result.success,
+        "status": solve["status"] if solve is not None else (statuses[-1] if statuses else None),
+        "objective": solve.get("objective") if solve is not None else None,
+        "wall_time": result.wall_time,
+    }
+
+
+def _combine(variants: List[str], results: List[ExecutionResult], limits: ExecutionLimits) -> ExecutionResult:
+    """Merges the variant runs into one result: it succeeds when any variant succeeded."""
+    succeeded = [r for r in results if r.success]
+    stdout, stderr, solves = [], [], []
+    for name, result in zip(variants, results):
+        stdout.append(f"===== Variant {name}() =====\n{result.to_text()}")
+        if not result.success:
+            stderr.append(f"===== Variant {name}() =====\n{result.stderr}")
+        solves.extend({**solve, "variant": name} for solve in result.solves)
+    reference = succeeded[0] if succeeded else results[0]
+    return ExecutionResult(
+        returncode=reference.returncode,
+        stdout="\n".join(stdout),
+        stderr="\n".join(stderr),
+        timed_out=all(r.timed_out for r in results),
+        stopped_on=None if succeeded else reference.stopped_on,
+        wall_time=max(r.wall_time for r in results),
+        cpu_time=sum(r.cpu_time for r in results),
+        peak_rss_mb=max(r.peak_rss_mb for r in results),
+        stdout_bytes=sum(r.stdout_bytes for r in results),
+        stderr_bytes=sum(r.stderr_bytes for r in results),
+        truncated=any(r.truncated for r in results),
+        limit_exceeded=None if succeeded else reference.limit_exceeded,
+        error=None if succeeded else reference.error,
+        solves=solves,
+        cached=all(r.cached for r in results),
+        variants=[_variant_summary(name, result) for name, result in zip(variants, results)],
+        threads=sum(r.threads for r in results) if all(r.threads for r in results) else None,
+        limits=limits,
+    )
+
+
+def _with_main(main: ExecutionResult, variants: List[str], results: List[ExecutionResult]) -> ExecutionResult:
+    """The run of the stubbed main() with the variant runs' solver records, summaries and resource usage folded in."""
+    return replace(
+        main,
+        wall_time=max(r.wall_time for r in results) + main.wall_time,
+        cpu_time=main.cpu_time + sum(r.cpu_time for r in results),
+        peak_rss_mb=max(main.peak_rss_mb, *(r.peak_rss_mb for r in results)),
+        solves=[{**solve, "variant": name} for name, result in zip(variants, results) for solve in result.solves] + main.solves,
+        cached=main.cached and all(r.cached for r in results),
+        variants=[_variant_summary(name, result) for name, result in zip(variants, results)],
+    )
+
+
+def execute_variants(source: str, limits: ExecutionLimits = None, pool: WorkerPool = None, cache: ExecutionCache = None, cores: CoreAllocator = None) -> ExecutionResult:
+    """
+    Executes a generated script, running its formulation variants concurrently when it has several.
+
+    Each variant found by find_variants is called on its own in a separate process (one worker of
+    `pool` each when it is large enough), with the full time budget, instead of one after the other
+    inside main(). main() then runs with every variant replaced by a stub that replays the variant's
+    output and returns its result (see stub_variants), so the output is the one of a normal run.
+    Every solver record is tagged with its variant and `variants` summarizes each one's status and
+    objective. When a variant raises or returns something that cannot be pickled, the script runs
+    normally instead; when one exceeds a limit, the result has one section per variant and succeeds
+    if any variant did. Scripts with fewer than two variants run unchanged.
+    """
+    limits = limits or ExecutionLimits()
+    variants = find_variants(source)
+    if not variants:
+        return execute_code(source, limits, pool, cache, cores=cores)
+
+    with ThreadPoolExecutor(max_workers=len(variants)) as executor:
+        results = list(executor.map(lambda name: execute_code(source, limits, pool, cache, entry=name, cores=cores), variants))
+    if any(r.limit_exceeded is not None or r.error is not None for r in results):
+        return _combine(variants, results, limits)
+    if not all(r.success and r.returned is not None for r in results):
+        return execute_code(source, limits, pool, cache, cores=cores)
+    main = execute_code(stub_variants(source, variants, results), limits, pool, cache, cores=cores)
+    return _with_main(main, variants, results)
@@ -0,0 +1,172 @@
+from typing import List, Optional
+
+import numpy as np
+
+# Absolute tolerance, scaled by max(1, |bound|), on constraint rows, variable bounds and the objective
+FEASIBILITY_TOLERANCE = 1e-6
+INTEGRALITY_TOLERANCE = 1e-5
+# The printed objective may be rounded by the script's formatting
+PRINTED_OBJECTIVE_TOLERANCE = 1e-4
+MAX_LISTED_VIOLATIONS = 5
+
+
+def _signed(x: np.ndarray, refs: np.ndarray) -> np.ndarray:
+    """Values of variable references: -i-1 stands for -x[i]."""
+    return np.where(refs >= 0, x[np.where(refs >= 0, refs, 0)], -x[np.where(refs < 0, -refs - 1, 0)])
+
+
+def _expression(x: np.ndarray, vars: list, coeffs: list, offset: float = 0.0) -> float:
+    refs = np.asarray(vars, dtype=np.int64)
+    return float(np.dot(np.asarray(coeffs, dtype=float), _signed(x, refs)) + offset) if len(refs) else float(offset)
+
+
+def _active(x: np.ndarray, enforcement: Optional[list]) -> bool:
+    """All enforcement literals are true (a literal -i-1 is the negation of x[i])."""
+    return all((x[l] if l >= 0 else 1 - x[-l - 1]) > 0.5 for l in enforcement or [])
+
+
+def _domain_violation(value: float, domain: list, tolerance: float) -> float:
+    """Distance from `value` to the nearest interval of the flat [lo, hi, lo, hi, ...] domain, 0 within tolerance."""
+    distance = np.inf
+    for lo, hi in zip(domain[::2], domain[1::2]):
+        if lo is not None and value < lo:
+            gap, bound = lo - value, lo
+        elif hi is not None and value > hi:
+            gap, bound = value - hi, hi
+        else:
+            return 0.0
+        if gap <= tolerance * max(1.0, abs(bound)):
+            return 0.0
+        distance = min(distance, gap)
+    return float(distance)
+
+
+def _linear_violations(model: dict, x: np.ndarray, tolerance: float) -> List[dict]:
+    """Rows outside their domain, all simple rows being evaluated at once."""
+    rows = [c for c in model["constraints"] if c.get("kind", "linear") == "linear" and _active(x, c.get("enforcement"))]
+    if not rows:
+        return []
+    lengths = np.array([len(c["vars"]) for c in rows])
+    refs = np.concatenate([np.asarray(c["vars"], dtype=np.int64) for c in rows])
+    coeffs = np.concatenate([np.asarray(c["coeffs"], dtype=float) for c in rows])
+    products = coeffs * _signed(x, refs) if len(refs) else np.zeros(0)
+    # Sum of the products of each row (rows may be empty)
+    ends = np.cumsum(lengths)
+    sums = np.concatenate([[0.0], np.cumsum(products)])
+    activity = sums[ends] - sums[ends - lengths] + np.array([c.get("offset", 0.0) for c in rows])
+
+    violations = []
+    for row, value in zip(rows, activity):
+        violation = _domain_violation(float(value), row["domain"], tolerance)
+        if violation > 0:
+            violations.append({"constraint": row["name"], "value": float(value), "domain": row["domain"], "violation": violation})
+    return violations
+
+
+def _all_different_violations(model: dict, x: np.ndarray) -> List[dict]:
+    violations = []
+    for row in model["constraints"]:
+        if row.get("kind") != "all_different" or not _active(x, row.get("enforcement")):
+            continue
+        values = np.round([_expression(x, e["vars"], e["coeffs"], e.get("offset", 0.0)) for e in row["exprs"]])
+        repeated = len(values) - len(np.unique(values))
+        if repeated:
+            violations.append({"constraint": row["name"], "value": values.tolist(), "domain": "all different", "violation": float(repeated)})
+    return violations
+
+
+def _variable_violations(model: dict, x: np.ndarray, tolerance: float) -> List[dict]:
+    variables = model["variables"]
+    lb = np.array([v["lb"] if v["lb"] is not None else -np.inf for v in variables], dtype=float)
+    ub = np.array([v["ub"] if v["ub"] is not None else np.inf for v in variables], dtype=float)
+    integer = np.array([bool(v["integer"]) for v in variables])
+    below = np.where(np.isfinite(lb), lb - x, 0.0)
+    above = np.where(np.isfinite(ub), x - ub, 0.0)
+    scale = np.maximum(1.0, np.abs(np.where(below > 0, lb, np.where(above > 0, ub, 0.0))))
+    bound_gap = np.maximum(np.maximum(below, above), 0.0)
+    fraction = np.where(integer, np.abs(x - np.round(x)), 0.0)
+
+    violations = []
+    for i in np.flatnonzero(bound_gap > tolerance * scale):
+        violations.append({"constraint": f"bounds of {variables[i]['name']}", "value": float(x[i]), "domain": [variables[i]["lb"], variables[i]["ub"]], "violation": float(bound_gap[i])})
+    for i in np.flatnonzero(fraction > INTEGRALITY_TOLERANCE):
+        violations.append({"constraint": f"integrality of {variables[i]['name']}", "value": float(x[i]), "domain": "integer", "violation": float(fraction[i])})
+    return violations
+
+
+def verify_model(model: dict, objective: Optional[float] = None, tolerance: float = FEASIBILITY_TOLERANCE) -> dict:
+    """
+    Re-evaluates every constraint, variable bound and integrality requirement of a model exported by
+    the solver harness (see solver_harness._export_linear) at its solution, and recomputes the
+    objective. The solution is `feasible` when nothing is violated beyond the tolerances and
+    `verified` when, in addition, every constraint could be checked and the recomputed objective
+    matches the solver's `objective`.
+    """
+    x = np.asarray([v if v is not None else np.nan for v in model["values"]], dtype=float)
+    if len(x) != len(model["variables"]) or not np.all(np.isfinite(x)):
+        return {"verified": False, "feasible": None, "reason": "the solution vector is incomplete"}
+
+    violations = (
+        _variable_violations(model, x, tolerance)
+        + _linear_violations(model, x, tolerance)
+        + _all_different_violations(model, x)
+    )
+    terms = model["objective"]
+    recomputed = terms.get("scale", 1.0) * _expression(x, terms["vars"], terms["coeffs"], terms.get("offset", 0.0))
+    objective_matches = objective is None or abs(recomputed - objective) <= tolerance * max(1.0, abs(objective))
+
+    report = {
+        "feasible": not violations,
+        "num_constraints": len(model["constraints"]),
+        "unchecked": model.get("unchecked", 0),
+        "max_violation": max((v["violation"] for v in violations), default=0.0),
+        "violations": sorted(violations, key=lambda v: -v["violation"])[:MAX_LISTED_VIOLATIONS],
+        "num_violations": len(violations),
+        "objective": objective,
+        "recomputed_objective": recomputed,
+        "objective_matches": objective_matches,
+        "tolerance": tolerance,
+    }
+    if violations:
+        reason = f"{len(violations)} violated constraints or bounds (max violation {report['max_violation']:.3g})"
+    elif not objective_matches:
+        reason = f"the recomputed objective {recomputed:.6g} differs from the solver's {objective:.6g}"
+    elif report["unchecked"]:
+        reason = f"{report['unchecked']} constraints of unsupported kinds could not be checked"
+    else:
+        reason = f"all {len(model['constraints'])} constraint rows hold within {tolerance:g}"
+    report["verified"] = not violations and objective_matches and not report["unchecked"]
+    report["reason"] = reason
+    return report
+
+
+def verify_solve(solve: dict) -> dict:
+    """Report of verify_model for a solved record of the solver harness, or why it could not be checked."""
+    if not solve.get("model"):
+        return {"verified": False, "feasible": None, "reason": "the model was not exported"}
+    return verify_model(solve["model"], solve.get("objective"))
+
+
+def verify_solution(solves: List[dict], printed_objective: Optional[float] = None) -> dict:
+    """
+    Verifies every solved model of an execution (the solver records of ExecutionResult.solves,
+    whose exported model was replaced by its verify_solve report right after the execution).
+
+    The run is `verified` when at least one solve found a solution, each solution was verified by
+    verify_model, and, for a single solve, the objective the script printed matches the solver's.
+    A solve without an exported model (too large, unsupported library) leaves the run unverified.
+    """
+    solved = [solve for solve in solves or [] if "verification" in solve]
+    if not solved:
+        return {"verified": False, "reason": "no solver call returned a solution", "solves": []}
+
+    reports = [{"library": solve.get("library"), "status": solve.get("status"), **solve["verification"]} for solve in solved]
+    unverified = [r for r in reports if not r["verified"]]
+    if unverified:
+        return {"verified": False, "reason": f"{unverified[0]['library']}: {unverified[0]['reason']}", "solves": reports}
+    if len(solved) == 1 and printed_objective is not None:
+        objective = solved[0].get("objective")
+        if objective is not None and abs(printed_objective - objective) > PRINTED_OBJECTIVE_TOLERANCE * max(1.0, abs(objective)):
+            reason = f"the printed objective {printed_objective:g} differs from the solver's {objective:g}"
+            return {"verified": False, "reason": reason, "solves": reports}
+    return {"verified": True, "reason": "; ".join(f"{r['library']}: {r['reason']}" for r in reports), "solves": reports}
@@ -0,0 +1,145 @@
+import asyncio
+import atexit
+import os
+import queue
+import subprocess
+import threading
+from typing import Sequence
+
+from src.agent.tools.exec_worker import read_message, write_message
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exec_worker.py")
+
+# Libraries generated models import, loaded once per worker
+DEFAULT_PRELOAD = ("ortools.linear_solver.pywraplp", "ortools.sat.python.cp_model", "pulp")
+
+
+class WorkerError(RuntimeError):
+    """A worker process died or answered with a malformed message."""
+
+
+class _Worker:
+    def __init__(self, python: str, preload: Sequence[str]):
+        self.process = subprocess.Popen([python, WORKER_SCRIPT, *preload], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.request_fd = self.process.stdin.fileno()
+        self.reply_fd = self.process.stdout.fileno()
+
+    def wait_ready(self) -> dict:
+        return read_message(self.reply_fd)
+
+    def execute(self, code: str, timeout: float, **limits) -> dict:
+        write_message(self.request_fd, {"code": code, "timeout": timeout, **limits})
+        return read_message(self.reply_fd)
+
+    def close(self):
+        self.process.stdin.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class WorkerPool:
+    """
+    Pool of warm interpreters that execute generated code.
+
+    Every worker is a long-lived `python` process that has already imported the solver libraries
+    in `preload` (OR-Tools and PuLP by default) and forks a fresh child per submitted script, so
+    each execution still gets its own process but skips the interpreter start and library imports
+    (hundreds of milliseconds) that a cold `python script.py` pays on every attempt.
+
+    A worker runs one script at a time; `size` workers are started on first use and a worker that
+    dies is replaced. Share one pool between all agents of a process and close it (or use it as a
+    context manager) when done.
+    """
+
+    def __init__(self, size: int = 2, python: str = "python", preload: Sequence[str] = DEFAULT_PRELOAD):
+        self.size = size
+        self.python = python
+        self.preload = tuple(preload)
+        self.preloaded = ()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def start(self):
+        """Starts the workers and waits until their libraries are imported."""
+        with self._lock:
+            if self._closed:
+                raise WorkerError("WorkerPool is closed")
+            if self._workers:
+                return
+            self._workers = [_Worker(self.python, self.preload) for _ in range(self.size)]
+            for worker in self._workers:
+                self.preloaded = tuple(worker.wait_ready()["preloaded"])
+                self._idle.put(worker)
+        missing = set(self.preload) - set(self.preloaded)
+        if missing:
+            print(f"⚠️ [DEBUG] WorkerPool: could not preload {sorted(missing)}")
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.process.kill()
+        worker.close()
+        replacement = _Worker(self.python, self.preload)
+        replacement.wait_ready()
+        with self._lock:
+            self._workers[self._workers.index(worker)] = replacement
+        return replacement
+
+    def run(self, code: str, timeout: float = 30, entry: str = None, **limits) -> dict:
+        """
+        Executes `code` as a __main__ script in a forked child of an idle worker.
+
+        `limits` (memory_mb, cpu_seconds, max_output_bytes, kill_output_bytes, kill_patterns, ...)
+        are enforced on the child, which is killed after `timeout` seconds. With `entry`, only
+        that function of the script is called.
+
+        Returns:
+            dict: returncode, stdout, stderr, timed_out, stopped_on, wall_time, cpu_time, peak_rss_mb,
+            stdout_bytes, stderr_bytes, truncated (the middle of a stream beyond max_output_bytes was
+            omitted) and solves.
+        """
+        self.start()
+        worker = self._idle.get()
+        try:
+            return worker.execute(code, timeout, entry=entry, **limits)
+        except (EOFError, OSError, ValueError) as e:
+            worker = self._replace(worker)
+            raise WorkerError(f"Execution worker died: {e}") from e
+        finally:
+            self._idle.put(worker)
+
+    async def arun(self, code: str, timeout: float = 30, entry: str = None, **limits) -> dict:
+        """Async variant of run, waits for the worker in a thread."""
+        return await asyncio.to_thread(self.run, code, timeout, entry, **limits)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_once(code: str, python: str = "python", timeout: float = 30, entry: str = None, **limits) -> dict:
+    """Executes `code` like WorkerPool.run, in a fresh worker that preloads nothing (cold start)."""
+    worker = _Worker(python, ())
+    try:
+        worker.wait_ready()
+        return worker.execute(code, timeout, entry=entry, **limits)
+    except (EOFError, OSError, ValueError) as e:
+        worker.process.kill()
+        raise WorkerError(f"Execution worker died: {e}") from e
+    finally:
+        worker.close()
@@ -49,7 +49,8 @@ if "running" not in st.session_state:
     st.session_state.running = False
 
 def ensure_agent():
-    if st.session_state.agent is None:
+    # Rebuild the agent when the selected model changes so the sidebar choice takes effect
+    if st.session_state.agent is None or st.session_state.get("agent_model") != model_name:
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             st.error("Configurá la OpenAI API Key en la barra lateral.")
@@ -61,12 +62,62 @@ def ensure_agent():
             except ModuleNotFoundError:
                 from agent.agent import build_agent
             st.session_state.agent = build_agent(api_key=api_key, model=model_name)
+            st.session_state.agent_model = model_name
         except Exception as e:
             st.error(f"Error creando el agente: {e}")
             return None
     return st.session_state.agent
 
 
+# Node name -> (state field shown in the chat, title)
+STEP_FIELDS = {
+    "expert_math_agent": ("math_result", "📐 Formulación matemática"),
+    "expert_code_agent": ("code_result", "💻 Implementación (código)"),
+    "code_validation_tool": ("validation_result", "🔍 Validación de código"),
+    "code_critic_agent": ("code_feedback", "🧐 Crítica del código"),
+    "code_exec_tool": ("execution_result", "🚀 Ejecución"),
+    "reflection_agent": ("reflection_status", "🪞 Reflexión"),
+}
+
+def run_agent_streaming(agent, initial_state):
+    """
+    Runs the agent with graph streaming. LLM token deltas are rendered live in a placeholder per node
+    and replaced by the node's final output once its state update arrives. Returns the final state.
+    """
+    final_state = dict(initial_state)
+    live = {}  # node -> [placeholder, text streamed so far]
+    for mode, chunk in agent.stream(initial_state, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message_chunk, metadata = chunk
+            node = metadata.get("langgraph_node")
+            if node not in STEP_FIELDS or not isinstance(message_chunk.content, str) or not message_chunk.content:
+                continue
+            if node not in live:
+                with st.chat_message("assistant"):
+                    live[node] = [st.empty(), ""]
+            live[node][1] += message_chunk.content
+            live[node][0].markdown(f"{STEP_FIELDS[node][1]}:\n\n{live[node][1]}▌")
+        else:
+            for node, update in chunk.items():
+                if not update:
+                    continue
+                final_state.update(update)
+                if node not in STEP_FIELDS:
+                    continue
+                field, title = STEP_FIELDS[node]
+                value = update.get(field)
+                if not value:
+                    continue
+                content = f"{title}:\n\n{value}"
+                st.session_state.messages.append({"role": "assistant", "content": content})
+                placeholder = live.pop(node, [None])[0]
+                if placeholder is None:
+                    with st.chat_message("assistant"):
+                        placeholder = st.empty()
+                placeholder.markdown(content)
+    return final_state
+
+
 submitted = False
 if not st.session_state.running:
     with st.form("problem_form"):
@@ -106,26 +157,13 @@ if submitted:
             "execution_error": False,
         }
 
-        # Execute agent (non-streaming invocation). We'll display key state fields as messages.
+        with st.chat_message("user"):
+            st.markdown(problem_statement.strip())
+
+        # Execute agent streaming node updates and LLM tokens, so every step shows up as soon as it is produced.
         try:
             with st.spinner("RORA is thinking…"):
-                final_state = agent.invoke(initial_state)
-
-            # Collect intermediate results if present and append to messages
-            for key in [
-                ("math_result", "📐 Formulación matemática"),
-                ("code_result", "💻 Implementación (código)"),
-                ("validation_result", "🔍 Validación de código"),
-                ("execution_result", "🚀 Ejecución"),
-                ("reflection_status", "🪞 Reflexión"),
-            ]:
-                field, title = key
-                value = final_state.get(field)
-                if value:
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": f"{title}:\n\n{value}",
-                    })
+                run_agent_streaming(agent, initial_state)
 
         except Exception as e:
             st.session_state.messages.append({
@@ -135,6 +173,9 @@ if submitted:
         finally:
             st.session_state.running = False
 
+        # Redraw the page from the stored conversation (live placeholders are discarded)
+        st.rerun()
+
 
 # --- Render conversation
 for message in st.session_state.messages:
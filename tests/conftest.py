@@ -0,0 +1,18 @@
+import sys
+
+import pytest
+
+from src.agent.tools.execution import ExecutionLimits
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in a temporary directory, where agents save their results."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def limits():
+    """Execution limits running generated code with this interpreter."""
+    return ExecutionLimits(timeout=60, python=sys.executable)
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, Dict, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+PULP_SCRIPT = '''```python
+import pulp
+
+def main():
+    prob = pulp.LpProblem("p", pulp.LpMaximize)
+    x = pulp.LpVariable("x", 0, 3)
+    prob += x
+    prob += x <= 3
+    prob.solve(pulp.PULP_CBC_CMD(msg=0))
+    print("Objective value:", pulp.value(prob.objective))
+
+if __name__ == "__main__":
+    main()
+```'''
+
+FAILING_SCRIPT = PULP_SCRIPT.replace('    print("Objective value:"', '    raise RuntimeError("solver crashed")\n    print("Objective value:"')
+
+# A phrase of each node's prompt template, see src/agent/prompts
+ROLE_MARKERS = {
+    "repair": "A script you wrote for an optimization problem failed",
+    "code": "Your task is to implement the optimization problem",
+    "math": "translate the real-world optimization problem",
+    "critic": "expert code critic",
+    "reflection": "Operations Research Expert",
+}
+
+DEFAULT_REPLIES = {"math": "math formulation", "code": PULP_SCRIPT, "critic": "OK", "reflection": "OK"}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model answering each agent node from a script: `replies` maps a role (ROLE_MARKERS) to a
+    reply or a list of replies used in turn (the last one repeats). The roles called, in order,
+    are kept in `calls`.
+    """
+
+    replies: Dict[str, Any] = {}
+
+    _calls: List[str] = PrivateAttr(default_factory=list)
+    _positions: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def calls(self) -> List[str]:
+        return self._calls
+
+    def _reply(self, messages) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        role = next((role for role, marker in ROLE_MARKERS.items() if marker in prompt), "reflection")
+        self._calls.append(role)
+        replies = {**DEFAULT_REPLIES, **self.replies}.get(role, "OK")
+        if isinstance(replies, list):
+            position = self._positions.get(role, 0)
+            self._positions[role] = position + 1
+            replies = replies[min(position, len(replies) - 1)]
+        return replies
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(0)
+        return self._generate(messages)
+
+
+def initial_state(problem: str = "Maximize x with 0 <= x <= 3.", name: str = "toy") -> dict:
+    return {"problem_statement": problem, "problem_name": name, "expected_output": "", "coherent": True, "execution_error": False}
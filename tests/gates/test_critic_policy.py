@@ -0,0 +1,57 @@
+import pytest
+
+from src.agent.agent import build_agent
+from src.agent.gates.critic_policy import CriticPolicy
+from tests.fakes import PULP_SCRIPT, ScriptedChatModel, initial_state
+
+
+def _state(problem: str = "Maximize x.", code: str = PULP_SCRIPT, **state) -> dict:
+    return {"problem_statement": problem, "math_result": "formulation", "code_result": code, "validation_result": "VALID", **state}
+
+
+def test_first_script_of_a_problem_is_reviewed():
+    decision = CriticPolicy().decide(_state())
+    assert not decision["skip"]
+    assert decision["confidence"] == pytest.approx(0.6)
+
+
+def test_accepted_script_is_a_reference_for_the_same_problem_only():
+    policy = CriticPolicy()
+    policy.record_acceptance(_state())
+    assert policy.decide(_state(math_result="another formulation of the same problem"))["skip"]
+    assert not policy.decide(_state(problem="Minimize y."))["skip"]
+
+
+def test_warnings_failures_and_rejections_prevent_skipping():
+    policy = CriticPolicy()
+    policy.record_acceptance(_state())
+    assert not policy.decide(_state(validation_result="WARNING: Static analysis found possible problems:\n- x unused"))["skip"]
+    assert not policy.decide(_state(failure_counts={"execution_error": 1, "code_critic": 1}))["skip"]
+
+    decision = policy.decide(_state())
+    policy.record_review(decision, approved=False)
+    assert not policy.decide(_state())["skip"]
+
+
+def test_executions_are_paired_with_decisions():
+    policy = CriticPolicy()
+    policy.record_acceptance(_state())
+    policy.record_execution(_state(), "execution_error")  # outcome first, as with speculative execution
+    policy.decide(_state())
+    stats = policy.stats()
+    assert (stats["skipped"], stats["skipped_executions"], stats["skipped_failure_rate"]) == (1, 1, 1.0)
+
+
+def test_critic_is_skipped_on_a_later_run_of_a_solved_problem(workdir, limits):
+    policy = CriticPolicy()
+    llm = ScriptedChatModel(replies={"math": ["formulation A", "formulation B"]})
+    agent = build_agent(llm=llm, critic_policy=policy, execution_limits=limits)
+
+    first = agent.invoke(initial_state())
+    assert first["coherent"] and llm.calls.count("critic") == 1
+
+    second = agent.invoke(initial_state())
+    assert second["coherent"]
+    assert llm.calls.count("critic") == 1  # no critic call in the second run
+    assert second["code_feedback"].startswith("OK - critic skipped")
+    assert policy.stats()["skipped"] == 1
@@ -0,0 +1,54 @@
+from src.agent.gates.retries import (
+    RetryBudget, execution_failure, failure_update, llm_usage, record_failure, should_retry, validation_failure,
+)
+
+
+def _failed(times: int, failure: str = "execution_error", **state) -> dict:
+    return {"global_retries": times, "failure_counts": {failure: times}, **state}
+
+
+def test_default_budget_retries_four_failures_in_total():
+    budget = RetryBudget()
+    assert all(should_retry(_failed(n), "execution_error", budget) for n in range(1, 5))
+    assert not should_retry(_failed(5), "execution_error", budget)
+
+
+def test_default_budget_has_no_per_type_or_llm_call_cap():
+    budget = RetryBudget()
+    calls = [{"input_tokens": 1000, "output_tokens": 1000}] * 100
+    assert should_retry(_failed(4, "infeasible_solution", llm_calls=calls), "infeasible_solution", budget)
+
+
+def test_per_failure_budget():
+    budget = RetryBudget(max_retries_per_failure={"infeasible_solution": 2})
+    assert should_retry(_failed(2, "infeasible_solution"), "infeasible_solution", budget)
+    assert not should_retry(_failed(3, "infeasible_solution"), "infeasible_solution", budget)
+    # other failure types are only bounded by max_retries
+    assert should_retry(_failed(3, "code_critic"), "code_critic", budget)
+
+
+def test_llm_call_and_token_caps():
+    calls = [{"input_tokens": 100, "output_tokens": 50}] * 3
+    assert llm_usage({"llm_calls": calls}) == (3, 450)
+    assert not should_retry(_failed(1, llm_calls=calls), "execution_error", RetryBudget(max_llm_calls=3))
+    assert not should_retry(_failed(1, llm_calls=calls), "execution_error", RetryBudget(max_tokens=450))
+    assert should_retry(_failed(1, llm_calls=calls), "execution_error", RetryBudget(max_llm_calls=4, max_tokens=451))
+
+
+def test_record_failure_adds_the_failure_found_after_the_update():
+    assert record_failure({}, {"validation_result": "ERROR: no solver"}, validation_failure) == {
+        "validation_result": "ERROR: no solver",
+        "last_failure_reason": "validation_error",
+        "global_retries": 1,
+        "failure_counts": {"validation_error": 1},
+    }
+    assert record_failure({}, {"validation_result": "WARNING: unused x"}, validation_failure) == {"validation_result": "WARNING: unused x"}
+    assert failure_update(None) == {}
+
+
+def test_execution_failure_uses_solver_statuses_before_the_output():
+    state = {"execution_error": False, "execution_result": "SUCCESS: infeasible constraints dropped"}
+    assert execution_failure({**state, "solver_results": [{"status": "optimal"}]}) is None
+    assert execution_failure({**state, "solver_results": [{"status": "infeasible"}]}) == "infeasible_solution"
+    assert execution_failure(state) == "infeasible_solution"
+    assert execution_failure({**state, "execution_error": True}) == "execution_error"
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from src.agent.llm.cache import CACHE_HIT, DiskLLMCache, LLMCacheMiss, _model_key
+from src.agent.lru_store import LRUStore
+from tests.fakes import ScriptedChatModel
+
+
+def _llm(tmp_path, mode="read_through", reply="OK"):
+    return ScriptedChatModel(replies={"reflection": reply}, cache=DiskLLMCache(str(tmp_path / "cache.sqlite"), mode=mode))
+
+
+def test_read_through_calls_the_model_once(tmp_path):
+    llm = _llm(tmp_path)
+    first, second = llm.invoke("Is it coherent?"), llm.invoke("Is it coherent?")
+
+    assert first.content == second.content == "OK"
+    assert llm.calls == ["reflection"]
+    assert CACHE_HIT not in first.response_metadata and second.response_metadata[CACHE_HIT]
+    assert llm.cache.stats()["hits"] == 1
+
+
+def test_record_only_always_calls_the_model(tmp_path):
+    llm = _llm(tmp_path, mode="record_only", reply=["first", "second"])
+    assert [llm.invoke("prompt").content for _ in range(2)] == ["first", "second"]
+
+    replay = _llm(tmp_path, mode="replay_only")
+    assert replay.invoke("prompt").content == "second"
+    assert replay.calls == []
+
+
+def test_replay_only_raises_on_a_miss_and_stores_nothing(tmp_path):
+    _llm(tmp_path).invoke("recorded prompt")
+    replay = _llm(tmp_path, mode="replay_only")
+
+    assert replay.invoke("recorded prompt").content == "OK"
+    with pytest.raises(LLMCacheMiss):
+        replay.invoke("another prompt")
+    assert replay.calls == []
+    assert replay.cache.stats()["entries"] == 1
+
+
+def test_transport_settings_do_not_change_the_key():
+    def llm_string(**kwargs):
+        return json.dumps({"name": "ChatOpenAI", "kwargs": {"model_name": "gpt-4o", **kwargs}}) + "---[('stop', None)]"
+
+    assert _model_key(llm_string(openai_api_key="a", max_retries=2)) == _model_key(llm_string(openai_api_key="b"))
+    assert _model_key(llm_string(temperature=0)) != _model_key(llm_string(temperature=1))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = LRUStore(str(tmp_path / "store.sqlite"), "entries", max_bytes=10)
+    store.put("a", "xxxx")
+    store.put("b", "xxxx")
+    store.get("a")
+    store.put("c", "xxxx")
+
+    assert store.get("b") is None and store.get("a") == store.get("c") == "xxxx"
+    assert store.stats()["evictions"] == 1
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        DiskLLMCache(str(tmp_path / "cache.sqlite"), mode="write_back")
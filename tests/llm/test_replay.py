@@ -0,0 +1,32 @@
+from src.agent.agent import build_agent
+from src.agent.llm.replay import ReplayChatModel
+from src.agent.nodes.experts import _code_prompt, _repair_prompt
+from tests.fakes import FAILING_SCRIPT, PULP_SCRIPT, initial_state
+
+PROBLEM = "Maximize x with 0 <= x <= 3."
+
+
+def _recordings(code):
+    return {PROBLEM: {"name": "toy", "math": ["formulation"], "code": code, "critic": ["OK"], "reflection": ["OK"]}}
+
+
+def test_repair_prompts_have_their_own_role():
+    state = {
+        **initial_state(PROBLEM),
+        "math_result": "formulation",
+        "code_result": FAILING_SCRIPT,
+        "execution_result": "ERROR:\nRuntimeError: solver crashed",
+        "last_failure_reason": "execution_error",
+    }
+    assert ReplayChatModel._role(_code_prompt(state)[0]) == "code"
+    assert ReplayChatModel._role(_repair_prompt(state)[0]) == "repair"
+
+
+def test_replay_with_diff_repair(workdir, limits):
+    llm = ReplayChatModel(recordings=_recordings([FAILING_SCRIPT, PULP_SCRIPT]))
+    final = build_agent(llm=llm, diff_repair=True, execution_limits=limits).invoke(initial_state(PROBLEM))
+
+    assert final["coherent"]
+    assert [call["node"] for call in final["llm_calls"] if "code" in call["node"]] == ["expert_code_agent", "code_critic_agent", "code_repair_agent", "code_critic_agent"]
+    assert final["code_result"] == PULP_SCRIPT  # the next recorded script replaces the failing one
+    assert final["failure_counts"] == {"execution_error": 1}
@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from src.agent.llm import scheduler as scheduler_module
+from src.agent.llm.cache import CACHE_HIT
+from src.agent.llm.scheduler import RateLimit, RequestScheduler, _Bucket
+
+LIMIT = RateLimit(requests_per_minute=10, tokens_per_minute=10_000)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+
+class FlakyLLM:
+    """Raises a 429 on the first `failures` calls, then answers `reply`."""
+
+    model_name = "gpt-test"
+    max_tokens = 100
+
+    def __init__(self, failures=0, reply=None):
+        self.failures = failures
+        self.reply = reply or AIMessage(content="OK")
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RateLimitError()
+        return self.reply
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    # One token per prompt character and no backoff sleeps
+    monkeypatch.setattr(scheduler_module, "count_tokens", len)
+    monkeypatch.setattr(scheduler_module, "wait_exponential_jitter", lambda **kwargs: lambda retry_state: 0)
+
+
+def _bucket(scheduler):
+    return scheduler._buckets["gpt-test"]
+
+
+def test_usage_is_reserved_and_corrected():
+    scheduler = RequestScheduler({"gpt-test": LIMIT})
+    reply = AIMessage(content="OK", usage_metadata={"input_tokens": 40, "output_tokens": 10, "total_tokens": 50})
+    scheduler.invoke(FlakyLLM(reply=reply), "x" * 400)
+
+    assert _bucket(scheduler).requests == pytest.approx(9, abs=0.01)
+    assert _bucket(scheduler).tokens == pytest.approx(10_000 - 50, abs=1)
+
+
+def test_cache_hits_give_their_reservation_back():
+    scheduler = RequestScheduler({"gpt-test": LIMIT})
+    scheduler.invoke(FlakyLLM(reply=AIMessage(content="OK", response_metadata={CACHE_HIT: True})), "x" * 400)
+
+    assert _bucket(scheduler).requests == pytest.approx(10)
+    assert _bucket(scheduler).tokens == pytest.approx(10_000)
+
+
+def test_rate_limits_are_retried_refunded_and_slow_the_model_down():
+    scheduler = RequestScheduler({"gpt-test": LIMIT})
+    llm = FlakyLLM(failures=2)
+
+    assert scheduler.invoke(llm, "prompt").content == "OK"
+    assert llm.calls == 3 and scheduler.rate_limited == 2
+    assert _bucket(scheduler).requests == pytest.approx(9, abs=0.01)  # only the answered call is charged
+    assert _bucket(scheduler).rate_factor == pytest.approx(0.25 + 0.05)
+
+
+def test_async_calls_are_retried():
+    scheduler = RequestScheduler({"gpt-test": LIMIT})
+    llm = FlakyLLM(failures=1)
+
+    assert asyncio.run(scheduler.ainvoke(llm, "prompt")).content == "OK"
+    assert llm.calls == 2 and scheduler.rate_limited == 1
+
+
+def test_rate_limit_is_raised_after_max_attempts():
+    scheduler = RequestScheduler({"gpt-test": LIMIT}, max_attempts=3)
+    llm = FlakyLLM(failures=5)
+
+    with pytest.raises(RateLimitError):
+        scheduler.invoke(llm, "prompt")
+    assert llm.calls == 3
+    assert _bucket(scheduler).requests == pytest.approx(10, abs=0.01)
+
+
+def test_retry_after_is_honored():
+    wait = RequestScheduler({"gpt-test": LIMIT})._retry_kwargs("gpt-test")["wait"]
+    retry_state = SimpleNamespace(attempt_number=1, outcome=SimpleNamespace(exception=lambda: RateLimitError(retry_after="7")))
+    assert wait(retry_state) == 7
+
+
+def test_empty_bucket_reports_the_wait():
+    bucket = _Bucket(RateLimit(requests_per_minute=2, tokens_per_minute=1000))
+    assert bucket.try_take(500) == 0 and bucket.try_take(500) == 0
+    assert bucket.try_take(500) == pytest.approx(30, rel=0.01)  # half a minute until the next request
+
+
+def test_models_without_a_limit_are_not_throttled():
+    scheduler = RequestScheduler({})
+    assert scheduler.invoke(FlakyLLM(), "prompt").content == "OK"
+    assert scheduler._buckets == {}
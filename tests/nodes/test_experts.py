@@ -0,0 +1,35 @@
+from src.agent.agent import build_agent
+from tests.fakes import FAILING_SCRIPT, PULP_SCRIPT, ScriptedChatModel, initial_state
+
+REPAIR_DIFF = '''```diff
+@@ -9,3 +9,2 @@
+     prob.solve(pulp.PULP_CBC_CMD(msg=0))
+-    raise RuntimeError("solver crashed")
+     print("Objective value:", pulp.value(prob.objective))
+```'''
+
+
+def test_failing_script_is_repaired_with_a_diff(workdir, limits):
+    llm = ScriptedChatModel(replies={"code": FAILING_SCRIPT, "repair": REPAIR_DIFF})
+    final = build_agent(llm=llm, diff_repair=True, execution_limits=limits).invoke(initial_state())
+
+    assert final["coherent"]
+    assert llm.calls.count("code") == 1 and llm.calls.count("repair") == 1
+    assert final["code_artifact"]["source"].strip() == PULP_SCRIPT.removeprefix("```python").removesuffix("```").strip()
+
+
+def test_unusable_repair_falls_back_to_a_rewrite(workdir, limits):
+    llm = ScriptedChatModel(replies={"code": [FAILING_SCRIPT, PULP_SCRIPT], "repair": "I cannot fix this script."})
+    final = build_agent(llm=llm, diff_repair=True, execution_limits=limits).invoke(initial_state())
+
+    assert final["coherent"]
+    assert llm.calls.count("code") == 2 and llm.calls.count("repair") == 1
+    assert [call["node"] for call in final["llm_calls"]].count("code_repair_agent") == 1
+
+
+def test_repairs_are_off_by_default(workdir, limits):
+    llm = ScriptedChatModel(replies={"code": [FAILING_SCRIPT, PULP_SCRIPT]})
+    final = build_agent(llm=llm, execution_limits=limits).invoke(initial_state())
+
+    assert final["coherent"]
+    assert "repair" not in llm.calls
@@ -0,0 +1,53 @@
+from src.agent.agent import build_agent
+from src.agent.nodes.fanout_nodes import CANDIDATE_FIELDS, FAILURE_FIELDS, select_candidate_node
+from tests.fakes import FAILING_SCRIPT, ScriptedChatModel, initial_state
+
+
+def _candidate(candidate_id, accepted=False, objective=None, **fields):
+    # The summary formulation_candidate_node returns for a branch
+    return {**dict.fromkeys(CANDIDATE_FIELDS + FAILURE_FIELDS), "candidate_id": candidate_id, "accepted": accepted, "objective": objective, "llm_calls": [], "execution_metrics": [], **fields}
+
+
+def test_failures_of_all_branches_are_kept_when_every_branch_fails():
+    state = {
+        "global_retries": 1,
+        "failure_counts": {"math_critic": 1},
+        "candidates": [
+            _candidate(0, global_retries=5, failure_counts={"math_critic": 1, "execution_error": 4}, last_failure_reason="execution_error"),
+            _candidate(1, global_retries=3, failure_counts={"math_critic": 3}, last_failure_reason="math_critic"),
+            _candidate(2, error="branch crashed"),
+            _candidate(3, global_retries=5, failure_counts={"math_critic": 1, "execution_error": 4}, last_failure_reason="execution_error"),
+        ],
+    }
+    update = select_candidate_node(state)
+    assert update["coherent"] is False
+    assert update["global_retries"] == 4 + 2 + 4  # added to the parent's 1 by the reducer
+    assert update["failure_counts"] == {"execution_error": 8, "math_critic": 2}
+    assert update["last_failure_reason"] == "execution_error"
+
+
+def test_winner_fields_and_verification_are_copied():
+    verification = {"verified": True, "reason": "all constraints hold"}
+    state = {
+        "candidates": [
+            _candidate(0, accepted=True, objective=3.0, coherent=True, verification=verification, global_retries=1, failure_counts={"code_critic": 1}),
+            _candidate(1, accepted=True, objective=4.0, coherent=True),
+            _candidate(2, accepted=True, objective=3.0000001, coherent=True),
+        ],
+    }
+    update = select_candidate_node(state)
+    assert update["candidate_id"] == 0
+    assert update["verification"] == verification
+    assert (update["global_retries"], update["failure_counts"]) == (1, {"code_critic": 1})
+
+
+def test_fanout_aborts_with_the_branches_failures(workdir, limits):
+    llm = ScriptedChatModel(replies={"code": FAILING_SCRIPT})
+    agent = build_agent(llm=llm, fanout=2, execution_limits=limits)
+    final = agent.invoke(initial_state())
+
+    assert not final["coherent"]
+    assert final.get("candidate_id") is None
+    assert final["last_failure_reason"] == "execution_error"
+    assert final["global_retries"] == sum(final["failure_counts"].values()) == 2 * 5
+    assert all(not c["accepted"] for c in final["candidates"])
@@ -0,0 +1,30 @@
+import pytest
+import tiktoken
+
+from src.agent.prompts import budget
+from src.agent.prompts.budget import PromptBudget, count_tokens, fit_context
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """tiktoken cannot download its encodings."""
+    def unavailable(name):
+        raise OSError(f"cannot download {name}")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", unavailable)
+    budget._encoding.cache_clear()
+    yield
+    budget._encoding.cache_clear()
+
+
+def test_count_tokens_falls_back_to_the_text_length_offline(offline):
+    with pytest.warns(UserWarning, match="unavailable"):
+        assert count_tokens("x" * 100) == 25
+
+
+def test_fit_context_shortens_fields_offline(offline):
+    with pytest.warns(UserWarning):
+        values, report = fit_context("Code: [[code_result]]", {"code_result": "y" * 20_000}, PromptBudget(max_tokens=2000))
+    assert report["tokens_before"] > 2000
+    assert not report["over_budget"]
+    assert "tokens omitted" in values["code_result"]
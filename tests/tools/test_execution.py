@@ -0,0 +1,87 @@
+import sys
+from dataclasses import replace
+
+import pytest
+
+from src.agent.tools.execution import ExecutionLimits, execute_code
+from src.agent.tools.worker_pool import WorkerPool
+
+
+def test_successful_run_is_measured(limits):
+    result = execute_code("print('Objective value: 3')", limits)
+
+    assert result.success and result.to_text() == "SUCCESS:\nObjective value: 3\n"
+    assert result.limit_exceeded is None and not result.truncated
+    assert result.peak_rss_mb > 0 and result.cpu_time >= 0 and result.wall_time > 0
+    assert "stdout" not in result.metrics() and result.metrics()["success"]
+
+
+def test_script_errors_are_reported(limits):
+    result = execute_code("raise ValueError('bad data')", limits)
+
+    assert result.returncode == 1 and not result.success and result.limit_exceeded is None
+    assert result.to_text().startswith("ERROR:\nTraceback") and "ValueError: bad data" in result.stderr
+
+
+def test_timeout_kills_the_script(limits):
+    result = execute_code("import time\ntime.sleep(30)", replace(limits, timeout=1))
+
+    assert result.limit_exceeded == "timeout" and result.timed_out
+    assert result.wall_time < 10
+    assert result.to_text() == "ERROR: Code execution timed out (1 seconds)"
+
+
+def test_cpu_limit(limits):
+    result = execute_code("while True:\n    pass", replace(limits, cpu_seconds=1))
+
+    assert result.limit_exceeded == "cpu"
+    assert result.to_text().startswith("ERROR: Code execution exceeded the CPU time limit (1 seconds)")
+
+
+def test_memory_limit_is_opt_in(limits):
+    allocate = "data = bytearray(300 * 1024 * 1024)\nprint(len(data))"
+    assert execute_code(allocate, limits).success
+
+    result = execute_code(allocate, replace(limits, memory_mb=100))
+    assert result.limit_exceeded == "memory" and "MemoryError" in result.stderr
+    assert result.to_text().startswith("ERROR: Code execution exceeded the memory limit (100 MB)")
+
+
+def test_output_is_capped_keeping_head_and_tail(limits):
+    result = execute_code("for i in range(10000):\n    print(f'line {i}')", replace(limits, max_output_bytes=1000))
+
+    assert result.success and result.truncated
+    assert result.stdout.startswith("line 0\n") and result.stdout.endswith("line 9999\n")
+    assert "bytes of output omitted" in result.stdout
+    assert result.stdout_bytes > 90_000 and len(result.stdout) < 2000
+
+
+def test_runaway_output_and_kill_patterns_stop_the_script(limits):
+    flood = "while True:\n    print('x' * 1000)"
+    result = execute_code(flood, replace(limits, kill_output_bytes=100_000, max_output_bytes=1000))
+    assert result.limit_exceeded == "output" and result.stopped_on == "output_cap"
+
+    nag = "import time\nprint('Iteration limit reached', flush=True)\ntime.sleep(30)"
+    result = execute_code(nag, replace(limits, kill_patterns=(r"Iteration limit",)))
+    assert result.limit_exceeded == "pattern" and result.wall_time < 10
+    assert result.to_text().startswith("ERROR: Code execution stopped because its output matched 'Iteration limit'")
+
+
+def test_pool_workers_apply_the_same_limits(limits):
+    with WorkerPool(size=1, python=sys.executable, preload=()) as pool:
+        assert execute_code("print('ok')", limits, pool).stdout == "ok\n"
+        assert execute_code("import time\ntime.sleep(30)", replace(limits, timeout=1), pool).limit_exceeded == "timeout"
+        # The worker survives a killed child
+        assert execute_code("print('again')", limits, pool).success
+
+
+def test_missing_interpreter_is_an_executor_error():
+    result = execute_code("print(1)", ExecutionLimits(python="/nonexistent/python"))
+
+    assert result.error is not None and not result.success
+    assert result.to_text().startswith("ERROR: Execution error")
+
+
+@pytest.mark.parametrize("code", ["import sys\nsys.exit(0)", "import sys\nsys.exit()"])
+def test_clean_exit_is_success(code, limits):
+    assert execute_code(code, limits).success
@@ -0,0 +1,87 @@
+import pytest
+
+from src.agent.tools.repair import PatchError, apply_unified_diff, extract_diff, trim_traceback
+
+SOURCE = """import pulp
+
+
+def main():
+    prob = pulp.LpProblem("p", pulp.LpMaximize)
+    x = pulp.LpVariable("x", 0, 3)
+    prob += x
+    prob.solve()
+    print(pulp.value(prob.objectve))
+
+
+if __name__ == "__main__":
+    main()
+"""
+
+FIX = """@@ -8,3 +8,3 @@
+     prob.solve()
+-    print(pulp.value(prob.objectve))
++    print(pulp.value(prob.objective))
+ 
+"""
+
+
+def test_traceback_keeps_the_script_frames():
+    output = """ERROR:
+Traceback (most recent call last):
+  File "generated_model.py", line 13, in <module>
+    main()
+  File "generated_model.py", line 9, in main
+    print(pulp.value(prob.objectve))
+  File "/usr/lib/python3/site-packages/pulp/pulp.py", line 10, in __getattr__
+    raise AttributeError(name)
+  File "/usr/lib/python3/site-packages/pulp/pulp.py", line 20, in inner
+    return None
+AttributeError: objectve"""
+    trimmed = trim_traceback(output)
+    assert trimmed.splitlines() == [
+        "Traceback (most recent call last):",
+        '  File "generated_model.py", line 13, in <module>',
+        "    main()",
+        '  File "generated_model.py", line 9, in main',
+        "    print(pulp.value(prob.objectve))",
+        "  [... 2 library frames omitted ...]",
+        "AttributeError: objectve",
+    ]
+
+
+def test_output_without_traceback_keeps_its_last_lines():
+    assert trim_traceback("\n".join(map(str, range(100))), max_lines=3) == "97\n98\n99"
+
+
+def test_diff_is_extracted_from_a_block_or_bare_hunks():
+    assert extract_diff(f"Here is the fix:\n```diff\n{FIX}```") == FIX
+    assert extract_diff(FIX) == FIX
+    assert extract_diff("```python\nprint(1)\n```") is None
+
+
+def test_diff_applies_by_content():
+    fixed = apply_unified_diff(SOURCE, FIX)
+    assert fixed == SOURCE.replace("objectve", "objective")
+    # Wrong line numbers and indentation are tolerated
+    shifted = FIX.replace("@@ -8,3 +8,3 @@", "@@ -2,3 +2,3 @@").replace("\n     ", "\n   ").replace("\n-    ", "\n-  ").replace("\n+    ", "\n+  ")
+    assert apply_unified_diff(SOURCE, shifted) == fixed
+
+
+def test_diff_with_several_hunks():
+    diff = """@@ -6,1 +6,1 @@
+-    x = pulp.LpVariable("x", 0, 3)
++    x = pulp.LpVariable("x", 0, 4)
+@@ -9,1 +9,2 @@
+-    print(pulp.value(prob.objectve))
++    print(pulp.value(prob.objective))
++    print(x.varValue)
+"""
+    fixed = apply_unified_diff(SOURCE, diff)
+    assert '"x", 0, 4' in fixed and "print(x.varValue)" in fixed and "objectve" not in fixed
+
+
+def test_diff_that_does_not_match_is_rejected():
+    with pytest.raises(PatchError, match="does not match"):
+        apply_unified_diff(SOURCE, FIX.replace("prob.solve()", "prob.solve(solver)"))
+    with pytest.raises(PatchError, match="no changes"):
+        apply_unified_diff(SOURCE, "@@ -8,1 +8,1 @@\n     prob.solve()\n")
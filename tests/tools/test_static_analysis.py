@@ -0,0 +1,73 @@
+import ast
+from pathlib import Path
+
+import pytest
+
+from src.agent.tools.static_analysis import analyze_code
+
+RECORDED = Path(__file__).resolve().parents[2] / "outputs"
+
+
+def findings(source: str):
+    return [(f.severity, f.message) for f in analyze_code(ast.parse(source))]
+
+
+def unused(source: str):
+    return [message for severity, message in findings(source) if "never used" in message]
+
+
+LINEAR = """
+from ortools.linear_solver import pywraplp
+solver = pywraplp.Solver.CreateSolver("SCIP")
+{body}
+solver.Solve()
+"""
+
+
+@pytest.mark.parametrize("body", [
+    # appended to a list that reaches the objective
+    "xs = []\nfor i in range(2):\n    var = solver.NumVar(0, 1, f'x{i}')\n    xs.append(var)\nsolver.Maximize(sum(xs))",
+    # stored in a dict
+    "xs = {}\nvar = solver.NumVar(0, 1, 'x')\nxs['a'] = var\nsolver.Maximize(xs['a'])",
+    # handed to a function
+    "def constrain(v):\n    solver.Add(v <= 1)\nvar = solver.NumVar(0, 1, 'x')\nconstrain(var)\nsolver.Maximize(var)",
+    # collected into terms that reach a constraint
+    "var = solver.NumVar(0, 1, 'x')\nterms = []\nterms.append(2 * var)\nsolver.Add(sum(terms) <= 1)\nsolver.Maximize(var)",
+])
+def test_variables_read_through_containers_and_calls_are_used(body):
+    assert unused(LINEAR.format(body=body)) == []
+
+
+def test_variable_only_read_after_the_solve_is_unused():
+    source = LINEAR.format(body="x = solver.NumVar(0, 1, 'x')\ny = solver.NumVar(0, 1, 'y')\nsolver.Maximize(y)")
+    source += "print(x.solution_value(), solver.Objective().Value())\n"
+    assert unused(source) == ["decision variable 'x' is created but never used in a constraint or the objective"]
+
+
+@pytest.mark.parametrize("script", [
+    "nlp4lp_results/35_nlp4lp_35/35_nlp4lp_35.py",
+    "text2zinc_results/109_Custom_Tees_Advertising_Campaign/109_Custom_Tees_Advertising_Campaign.py",
+    "text2zinc_results/87_Minimal_Weekly_Staffing_Cost/87_Minimal_Weekly_Staffing_Cost.py",
+])
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")  # invalid escapes in the scripts' docstrings
+def test_recorded_scripts_have_no_false_warnings(script):
+    assert findings((RECORDED / script).read_text()) == []
+
+
+def test_missing_solver_is_an_error_only_for_understood_libraries():
+    assert findings("import pulp\nprint(1)\n") == [
+        ("error", "no solver or model is created (pywraplp.Solver.CreateSolver, cp_model.CpModel or pulp.LpProblem)"),
+    ]
+    model_builder = (
+        "from ortools.linear_solver.python import model_builder as mb\n"
+        "m = mb.Model()\nx = m.new_num_var(0, 1, 'x')\nm.maximize(x)\nmb.Solver('scip').solve(m)\n"
+    )
+    assert [severity for severity, _ in findings(model_builder)] == ["warning"]
+
+
+def test_local_alias_of_the_solver_class():
+    source = (
+        "from ortools.linear_solver import pywraplp\nSolver = pywraplp.Solver\ns = Solver.CreateSolver('SCIP')\n"
+        "x = s.NumVar(0, 1, 'x')\ns.Maximize(x)\ns.Solve()\nprint(x.solution_value())\n"
+    )
+    assert findings(source) == []
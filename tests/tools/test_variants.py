@@ -0,0 +1,91 @@
+import time
+from pathlib import Path
+
+from src.agent.tools.execution import execute_code
+from src.agent.tools.variants import execute_variants, find_variants
+
+RECORDED = Path(__file__).parents[2] / "outputs/nlp4lp_results/169_nlp4lp_169/169_nlp4lp_169.py"
+
+SLEEPING_VARIANTS = '''
+import time
+import pulp
+
+
+def solve(bound):
+    prob = pulp.LpProblem("p", pulp.LpMaximize)
+    x = pulp.LpVariable("x", 0, bound)
+    prob += x
+    prob.solve(pulp.PULP_CBC_CMD(msg=0))
+    time.sleep(2)
+    return pulp.value(prob.objective)
+
+
+def small():
+    prob = pulp.LpProblem("small", pulp.LpMaximize)
+    x = pulp.LpVariable("x", 0, 2)
+    prob += x
+    prob.solve(pulp.PULP_CBC_CMD(msg=0))
+    time.sleep(2)
+    print("small solved")
+    return {"objective": pulp.value(prob.objective)}
+
+
+def large():
+    prob = pulp.LpProblem("large", pulp.LpMaximize)
+    x = pulp.LpVariable("x", 0, 5)
+    prob += x
+    prob.solve(pulp.PULP_CBC_CMD(msg=0))
+    time.sleep(2)
+    print("large solved")
+    return {"objective": pulp.value(prob.objective)}
+
+
+def main():
+    print("Variants:")
+    results = [small(), large()]
+    print("Best:", max(r["objective"] for r in results))
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+def test_recorded_script_variants_are_found():
+    assert find_variants(RECORDED.read_text()) == ["solve_with_linear_solver", "solve_with_cp_model"]
+
+
+def test_variants_need_argument_free_calls_and_a_main_guard():
+    assert find_variants(SLEEPING_VARIANTS.replace("large()]", "large(), solve(3)]")) == ["small", "large"]
+    assert find_variants(SLEEPING_VARIANTS.replace("small()", "small(1)")) == []
+    assert find_variants(SLEEPING_VARIANTS.replace('if __name__ == "__main__":\n    main()', "main()")) == []
+
+
+def test_recorded_script_keeps_main_output(limits):
+    source = RECORDED.read_text()
+    result = execute_variants(source, limits)
+
+    assert result.success
+    assert result.stdout == execute_code(source, limits).stdout
+    assert [v["name"] for v in result.variants] == ["solve_with_linear_solver", "solve_with_cp_model"]
+    assert all(v["status"] == "optimal" and v["objective"] == 89 for v in result.variants)
+    assert [s["variant"] for s in result.solves] == ["solve_with_linear_solver", "solve_with_cp_model"]
+
+
+def test_variants_run_in_parallel(limits):
+    start = time.monotonic()
+    result = execute_variants(SLEEPING_VARIANTS, limits)
+    elapsed = time.monotonic() - start
+
+    assert result.stdout == "Variants:\nsmall solved\nlarge solved\nBest: 5.0\n"
+    assert [v["objective"] for v in result.variants] == [2.0, 5.0]
+    assert elapsed < sum(v["wall_time"] for v in result.variants)  # the variants ran at the same time
+
+
+def test_failing_variant_runs_the_script_normally(limits):
+    source = SLEEPING_VARIANTS.replace('print("large solved")', 'raise ValueError("no solution")')
+    result = execute_variants(source, limits)
+
+    assert not result.success
+    assert not result.variants
+    assert "ValueError: no solution" in result.stderr
@@ -0,0 +1,87 @@
+from src.agent.agent import build_agent
+from src.agent.tools.execution import execute_code
+from src.agent.tools.verifier import verify_model, verify_solution, verify_solve
+from tests.fakes import PULP_SCRIPT, ScriptedChatModel, initial_state
+
+ORTOOLS_SCRIPT = """
+from ortools.linear_solver import pywraplp
+
+solver = pywraplp.Solver.CreateSolver("CBC")
+x = solver.IntVar(0, 10, "x")
+y = solver.IntVar(0, 10, "y")
+solver.Add(x + 2 * y <= 14)
+solver.Add(3 * x - y >= 0)
+solver.Maximize(3 * x + 4 * y)
+solver.Solve()
+print("Objective value:", solver.Objective().Value())
+"""
+
+
+def _model(values, objective_coeffs=(3, 4)):
+    """max 3x + 4y  s.t.  x + 2y <= 14,  3x - y >= 0,  x, y integer in [0, 10]."""
+    return {
+        "variables": [{"name": "x", "lb": 0, "ub": 10, "integer": True}, {"name": "y", "lb": 0, "ub": 10, "integer": True}],
+        "values": values,
+        "constraints": [
+            {"name": "capacity", "vars": [0, 1], "coeffs": [1, 2], "domain": [None, 14]},
+            {"name": "ratio", "vars": [0, 1], "coeffs": [3, -1], "domain": [0, None]},
+        ],
+        "objective": {"vars": [0, 1], "coeffs": list(objective_coeffs), "offset": 0.0, "scale": 1.0},
+        "unchecked": 0,
+    }
+
+
+def test_optimal_solution_is_verified():
+    report = verify_model(_model([10, 2]), objective=38)
+    assert report["verified"] and report["feasible"]
+    assert report["recomputed_objective"] == 38 and report["reason"] == "all 2 constraint rows hold within 1e-06"
+
+
+def test_violations_are_listed_worst_first():
+    report = verify_model(_model([12, 1.5]), objective=42)
+    assert not report["verified"] and not report["feasible"]
+    assert [v["constraint"] for v in report["violations"]] == ["bounds of x", "capacity", "integrality of y"]
+    assert report["num_violations"] == 3 and report["max_violation"] == 2
+
+
+def test_objective_mismatch_and_unchecked_rows_are_not_verified():
+    report = verify_model(_model([10, 2]), objective=40)
+    assert report["feasible"] and not report["verified"]
+    assert "differs from the solver's" in report["reason"]
+
+    report = verify_model({**_model([10, 2]), "unchecked": 1}, objective=38)
+    assert report["feasible"] and not report["verified"]
+
+
+def test_incomplete_or_missing_models():
+    assert verify_model(_model([10, None]))["feasible"] is None
+    assert verify_solve({"status": "optimal", "objective": 38})["reason"] == "the model was not exported"
+
+
+def test_solution_status():
+    verified = {"library": "pulp", "status": "optimal", "objective": 38.0, "verification": verify_model(_model([10, 2]), 38)}
+    assert verify_solution([])["reason"] == "no solver call returned a solution"
+    assert verify_solution([{"library": "pulp", "status": "infeasible"}])["verified"] is False
+    assert verify_solution([verified], printed_objective=38.0)["verified"]
+    assert "printed objective 37" in verify_solution([verified], printed_objective=37.0)["reason"]
+
+    unverified = {**verified, "verification": verify_model(_model([12, 1]), 40)}
+    report = verify_solution([verified, unverified])
+    assert not report["verified"] and report["reason"].startswith("pulp: 1 violated")
+    assert len(report["solves"]) == 2
+
+
+def test_executions_carry_verification_reports(limits):
+    for script in (PULP_SCRIPT.strip("`").removeprefix("python"), ORTOOLS_SCRIPT):
+        (solve,) = execute_code(script, limits).solves
+        assert "model" not in solve
+        assert solve["status"] == "optimal" and solve["verification"]["verified"]
+
+
+def test_verified_solution_skips_the_reflection(workdir, limits):
+    llm = ScriptedChatModel()
+    final = build_agent(llm=llm, verify_solutions=True, execution_limits=limits).invoke(initial_state())
+
+    assert final["coherent"] and final["verification"]["verified"]
+    assert final["reflection_status"].startswith("OK - solution verified against the model")
+    assert "reflection" not in llm.calls